@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import collections
+import datetime
+import json
+import os
+
+"""
+Persistent cache of ItemAnalyzer transaction stats of (style_id, size), so
+that histories that did not change since they were last analyzed need not be
+read and analyzed again.
+
+An entry is keyed by (style_id, size, id of the newest transaction, window):
+transactions are only ever added, so the same newest transaction means the
+same history. window is what the stats were restricted to, "all" or the
+furthest_back time. Least recently used entries are evicted beyond
+max_entries.
+
+Kept in the data folder as analytics_cache.json, a list of [key, stats],
+least recently used first.
+"""
+
+CACHE_FILE_NAME = "analytics_cache.json"
+DATE_FIELDS = ["first_date", "last_date"]
+
+
+def cache_file(parent_folder):
+    return os.path.join(parent_folder, CACHE_FILE_NAME)
+
+
+def to_window(furthest_back):
+    return furthest_back.isoformat() if furthest_back else "all"
+
+
+class AnalyticsCache:
+    def __init__(self, cache_file, max_entries=100000):
+        self.cache_file = cache_file
+        self.max_entries = int(max_entries)
+        # key => stats, least recently used first
+        self.entries = collections.OrderedDict()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        if os.path.isfile(cache_file):
+            with open(cache_file, "r") as infile:
+                for key, stats in json.loads(infile.read()):
+                    self.entries[key] = stats
+        return
+
+    @staticmethod
+    def _key(style_id, size, newest_id, furthest_back):
+        return "{}|{}|{}|{}".format(style_id, size, newest_id, to_window(furthest_back))
+
+    def get(self, style_id, size, newest_id, furthest_back=None):
+        """
+        @return stats as ItemAnalyzer.get_historical_transactions_stats has
+            them, None if not cached
+        """
+        key = self._key(style_id, size, newest_id, furthest_back)
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        self.dirty = True
+        stats = dict(self.entries[key])
+        for field in DATE_FIELDS:
+            stats[field] = datetime.datetime.fromisoformat(stats[field])
+        return stats
+
+    def put(self, style_id, size, newest_id, stats, furthest_back=None):
+        serialized = {}
+        for field, value in stats.items():
+            if field in DATE_FIELDS:
+                serialized[field] = value.isoformat()
+            elif field in ["num_sales", "elapsed_days"]:
+                serialized[field] = int(value)
+            else:
+                serialized[field] = float(value)
+        key = self._key(style_id, size, newest_id, furthest_back)
+        self.entries[key] = serialized
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.dirty = True
+        return
+
+    def save(self):
+        if not self.dirty:
+            return
+        with open(self.cache_file + ".tmp", "w") as outfile:
+            outfile.write(json.dumps(list(self.entries.items())))
+        os.replace(self.cache_file + ".tmp", self.cache_file)
+        self.dirty = False
+        return
+
+    def report(self):
+        print(
+            "analytics cache: {} hits, {} misses, {} entries".format(
+                self.hits, self.misses, len(self.entries)
+            )
+        )
+        return
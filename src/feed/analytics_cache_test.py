@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import datetime
+import os
+import tempfile
+import unittest
+
+from analytics_cache import AnalyticsCache
+from du_analyzer import ItemAnalyzer
+
+
+class TestAnalyticsCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.folder.name, "analytics_cache.json")
+        transactions = [
+            {"price": 120000, "time": "2019-12-10T10:00:00.000Z", "id": "3"},
+            {"price": 110000, "time": "2019-12-05T10:00:00.000Z", "id": "2"},
+            {"price": 100000, "time": "2019-12-01T10:00:00.000Z", "id": "1"},
+        ]
+        self.stats = ItemAnalyzer().get_historical_transactions_stats(
+            ItemAnalyzer.to_ordered_sale_record(transactions)
+        )
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_get_put(self):
+        cache = AnalyticsCache(self.cache_file)
+        self.assertIsNone(cache.get("A-1", "9.5", "3"))
+        cache.put("A-1", "9.5", "3", self.stats)
+        cache.save()
+
+        cache = AnalyticsCache(self.cache_file)
+        self.assertEqual(cache.get("A-1", "9.5", "3"), self.stats)
+        # a newer transaction or another window is another entry
+        self.assertIsNone(cache.get("A-1", "9.5", "4"))
+        self.assertIsNone(cache.get("A-1", "9.5", "3", datetime.datetime(2019, 12, 2)))
+
+    def test_lru(self):
+        cache = AnalyticsCache(self.cache_file, max_entries=2)
+        cache.put("A-1", "9.5", "3", self.stats)
+        cache.put("A-1", "10.0", "3", self.stats)
+        cache.get("A-1", "9.5", "3")
+        cache.put("A-1", "10.5", "3", self.stats)
+        self.assertIsNotNone(cache.get("A-1", "9.5", "3"))
+        self.assertIsNone(cache.get("A-1", "10.0", "3"))
+        self.assertIsNotNone(cache.get("A-1", "10.5", "3"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import os
+
+import numpy as np
+
+from du_analyzer import ItemAnalyzer
+from time_series_serializer import TimeSeriesSerializer, STORAGE_FORMATS
+
+"""
+Du transaction stats of every (style_id, size) of a data folder, computed in
+one batch and written to a single table that the strategy and reports join
+against instead of analyzing histories one at a time.
+
+A row holds the newest transaction id of the history it was computed from,
+ItemAnalyzer.get_historical_transactions_stats, and:
+  recent_sales:  number of sales in the recent_days before the table was built
+  volatility:    stdev of log returns between consecutive sales
+
+Written as csv, or as numpy arrays of each column if the output ends with
+.npz. A row is only used while its newest transaction id is still the newest
+of the (style_id, size).
+
+example usage:
+    ./analytics_table.py --data_folder ../data --output ../data/analytics_table.npz --processes 4
+    ./analytics_table.py --start_from merged.20191225.csv --output stats.csv
+"""
+
+STATS_FIELDS = [
+    "num_sales",
+    "elapsed_days",
+    "sales_per_day",
+    "high",
+    "low",
+    "first",
+    "last",
+    "first_date",
+    "last_date",
+    "avg",
+    "stdev",
+    "recent_sales",
+    "volatility",
+]
+FIELDS = ["style_id", "size", "newest_id"] + STATS_FIELDS
+DATE_FIELDS = ["first_date", "last_date"]
+INT_FIELDS = ["num_sales", "elapsed_days", "recent_sales"]
+
+
+def get_stats(analyzer, transactions, now, recent_days):
+    """
+    @param transactions  du transactions as stored, newest first (to_arrays
+        orders them by time)
+    """
+    times, prices = ItemAnalyzer.to_arrays(transactions)
+    stats = analyzer.get_historical_transactions_stats_from_arrays(times, prices)
+    since = np.datetime64(now - datetime.timedelta(days=recent_days), "us")
+    stats["recent_sales"] = len(times) - int(np.searchsorted(times, since))
+    log_returns = np.diff(np.log(prices))
+    stats["volatility"] = log_returns.std() if len(log_returns) > 0 else 0.0
+    return stats
+
+
+def analyze_styles(data_folder, storage_format, style_ids, now, recent_days):
+    """
+    Stats of every (style_id, size) with du transactions, in a worker process
+    @return list of rows
+    """
+    serializer = TimeSeriesSerializer(data_folder, storage_format)
+    analyzer = ItemAnalyzer()
+    rows = []
+    for style_id in style_ids:
+        try:
+            size_prices = serializer.get(style_id)
+        except FileNotFoundError:
+            continue
+        for size, data in size_prices.items():
+            transactions = data.get("du", {}).get("transactions", [])
+            if len(transactions) == 0:
+                continue
+            row = get_stats(analyzer, transactions, now, recent_days)
+            row.update(
+                {"style_id": style_id, "size": size, "newest_id": transactions[0]["id"]}
+            )
+            rows.append(row)
+    return rows
+
+
+def build(
+    data_folder,
+    storage_format=None,
+    style_ids=None,
+    processes=1,
+    recent_days=30,
+    now=None,
+):
+    """
+    @param style_ids  default all of the data folder
+    @return rows, in style_id order
+    """
+    if style_ids is None:
+        style_ids = TimeSeriesSerializer(data_folder, storage_format).get_style_ids()
+    if now is None:
+        now = datetime.datetime.utcnow()
+    style_ids = sorted(style_ids)
+    processes = max(int(processes), 1)
+    if processes == 1:
+        rows = analyze_styles(data_folder, storage_format, style_ids, now, recent_days)
+    else:
+        # contiguous chunks, several per process to even out uneven histories
+        chunk_size = max(len(style_ids) // (processes * 4), 1)
+        chunks = [
+            style_ids[i : i + chunk_size] for i in range(0, len(style_ids), chunk_size)
+        ]
+        rows = []
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            for chunk_rows in pool.map(
+                analyze_styles,
+                [data_folder] * len(chunks),
+                [storage_format] * len(chunks),
+                chunks,
+                [now] * len(chunks),
+                [recent_days] * len(chunks),
+            ):
+                rows += chunk_rows
+    return rows
+
+
+def write_table(rows, path):
+    if path.endswith(".npz"):
+        columns = {}
+        for field in FIELDS:
+            values = [row[field] for row in rows]
+            if field in DATE_FIELDS:
+                columns[field] = np.array(values, dtype="datetime64[us]")
+            elif field in INT_FIELDS:
+                columns[field] = np.array(values, dtype=np.int64)
+            elif field in ["style_id", "size", "newest_id"]:
+                columns[field] = np.array([str(v) for v in values])
+            else:
+                columns[field] = np.array(values, dtype=np.float64)
+        np.savez(path + ".tmp.npz", **columns)
+        os.replace(path + ".tmp.npz", path)
+    else:
+        with open(path + ".tmp", "w", newline="") as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(
+                    {
+                        field: (
+                            row[field].isoformat()
+                            if field in DATE_FIELDS
+                            else row[field]
+                        )
+                        for field in FIELDS
+                    }
+                )
+        os.replace(path + ".tmp", path)
+    print("wrote stats of {} (style_id, size) to {}".format(len(rows), path))
+    return
+
+
+class AnalyticsTable:
+    def __init__(self, path):
+        self.path = path
+        # (style_id, size) => (newest_id, stats)
+        self.rows = {}
+        if path.endswith(".npz"):
+            with np.load(path) as columns:
+                columns = {field: columns[field] for field in FIELDS}
+            for i in range(len(columns["style_id"])):
+                stats = {}
+                for field in STATS_FIELDS:
+                    value = columns[field][i]
+                    if field in DATE_FIELDS:
+                        value = value.astype(datetime.datetime)
+                    elif field in INT_FIELDS:
+                        value = int(value)
+                    else:
+                        value = float(value)
+                    stats[field] = value
+                key = (str(columns["style_id"][i]), str(columns["size"][i]))
+                self.rows[key] = (str(columns["newest_id"][i]), stats)
+        else:
+            with open(path, "r", newline="") as infile:
+                for row in csv.DictReader(infile):
+                    stats = {}
+                    for field in STATS_FIELDS:
+                        if field in DATE_FIELDS:
+                            stats[field] = datetime.datetime.fromisoformat(row[field])
+                        elif field in INT_FIELDS:
+                            stats[field] = int(row[field])
+                        else:
+                            stats[field] = float(row[field])
+                    self.rows[(row["style_id"], row["size"])] = (
+                        row["newest_id"],
+                        stats,
+                    )
+        return
+
+    def get(self, style_id, size, newest_id):
+        """
+        @return stats of (style_id, size), None if not in the table or
+            computed from an older history than newest_id's
+        """
+        row = self.rows.get((style_id, size))
+        if row is None or row[0] != str(newest_id):
+            return None
+        return dict(row[1])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("""
+        du transaction stats of every (style_id, size) in one table.
+
+        example usage:
+          ./analytics_table.py --data_folder ../data --output ../data/analytics_table.npz --processes 4
+    """)
+    parser.add_argument(
+        "--data_folder", default="../data", help="the data folder to analyze"
+    )
+    parser.add_argument(
+        "--storage_format",
+        help="how time series in data_folder are stored, one of {} (default json)".format(
+            STORAGE_FORMATS
+        ),
+    )
+    parser.add_argument(
+        "--start_from",
+        help="analyze only the styles of this merged static info, default all of data_folder",
+    )
+    parser.add_argument(
+        "--output",
+        default="../data/analytics_table.csv",
+        help="table to write, csv or .npz",
+    )
+    parser.add_argument("--processes", default=1, type=int)
+    parser.add_argument(
+        "--recent_days",
+        default=30,
+        type=int,
+        help="count sales in this many days as recent_sales",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from static_info_serializer import StaticInfoSerializer
+
+    args = parse_args()
+    style_ids = None
+    if args.start_from:
+        style_ids, _ = StaticInfoSerializer().load_static_info_from_csv(args.start_from)
+        style_ids = list(style_ids)
+    rows = build(
+        args.data_folder,
+        args.storage_format,
+        style_ids,
+        args.processes,
+        args.recent_days,
+    )
+    write_table(rows, args.output)
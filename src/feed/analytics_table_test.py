@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import datetime
+import os
+import tempfile
+import unittest
+
+from analytics_table import AnalyticsTable, build, get_stats, write_table
+from du_analyzer import ItemAnalyzer
+from time_series_serializer import TimeSeriesSerializer
+
+
+class TestAnalyticsTable(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.transactions = [
+            {"price": 120000, "time": "2019-12-10T10:00:00.000Z", "id": "3"},
+            {"price": 110000, "time": "2019-12-05T10:00:00.000Z", "id": "2"},
+            {"price": 100000, "time": "2019-12-01T10:00:00.000Z", "id": "1"},
+        ]
+        store = TimeSeriesSerializer(self.folder.name, "json").store
+        store.write(
+            "A-1",
+            "9.5",
+            {
+                "du": {"prices": [], "transactions": self.transactions},
+                "stockx": {"prices": [], "transactions": []},
+            },
+        )
+        store.write(
+            "A-1",
+            "10.0",
+            {
+                "du": {"prices": [], "transactions": []},
+                "stockx": {"prices": [], "transactions": []},
+            },
+        )
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_build_and_join(self):
+        rows = build(self.folder.name, now=datetime.datetime(2019, 12, 11))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["recent_sales"], 3)
+        expected = ItemAnalyzer().get_historical_transactions_stats_from_arrays(
+            *ItemAnalyzer.to_arrays(self.transactions)
+        )
+
+        for name in ["analytics_table.csv", "analytics_table.npz"]:
+            path = os.path.join(self.folder.name, name)
+            write_table(rows, path)
+            table = AnalyticsTable(path)
+            stats = table.get("A-1", "9.5", "3")
+            for field, value in expected.items():
+                self.assertAlmostEqual(stats[field], value)
+            self.assertGreater(stats["volatility"], 0)
+            # a newer history is not in the table
+            self.assertIsNone(table.get("A-1", "9.5", "4"))
+            self.assertIsNone(table.get("A-1", "10.0", "3"))
+
+    def test_unsorted_history(self):
+        # the 2019-12-10 sale stored as if older than the 2019-12-05 one
+        transactions = [
+            self.transactions[1],
+            self.transactions[0],
+            self.transactions[2],
+        ]
+        stats = get_stats(
+            ItemAnalyzer(), transactions, datetime.datetime(2019, 12, 11), 3
+        )
+        self.assertEqual(stats["recent_sales"], 1)
+        self.assertEqual(stats["last"], 1200)
+        self.assertEqual(stats["last_date"], datetime.datetime(2019, 12, 10, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
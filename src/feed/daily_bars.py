@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import pathlib
+
+import numpy as np
+
+from time_series_json import get_new_transactions, parse_times
+
+"""
+Daily open / high / low / close / volume bars of the transactions of every
+(style_id, size, venue), kept next to the time series in the data folder so
+that analytics of long histories need not go through every transaction.
+
+Bars are aggregated incrementally after feed updates: only (style_id, size)
+whose newest transaction changed since their bars were last updated are read,
+and of those, only the days their new transactions fall on are aggregated
+again. The newest transaction of every (style_id, size) is taken from the
+latest snapshot (latest_snapshot.py) where there is one.
+
+Stored in the data folder, next to the time series:
+  {style_id}/daily_bars.{venue}.npz  arrays of the bars of each size, ordered
+      by size then day: size, day, open, high, low, close (prices as stored),
+      volume, turnover (sum of prices), sum_squares (of prices), first_time /
+      last_time (of the open / close transactions)
+  daily_bars.{venue}.json  {style_id: {size: id of the newest transaction in
+      its bars}}
+
+Update after feeding (du_feed.py does so for du), or rebuild, with
+    ./daily_bars.py --mode update --data_folder ../data --venue stockx
+    ./daily_bars.py --mode build --data_folder ../data
+"""
+
+BAR_FIELDS = [
+    "day",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "turnover",
+    "sum_squares",
+    "first_time",
+    "last_time",
+]
+
+
+def aggregate(times, prices):
+    """
+    Daily bars of transactions
+    @param times   datetime64[us] of transactions
+    @param prices  of transactions, as stored
+    @return {field: array} of BAR_FIELDS, by day
+    """
+    order = np.argsort(times, kind="stable")
+    times = times[order]
+    prices = np.asarray(prices, dtype=np.float64)[order]
+    days = times.astype("datetime64[D]")
+    if len(days) == 0:
+        return empty_bars()
+    starts = np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+    ends = np.concatenate((starts[1:], [len(days)])) - 1
+    return {
+        "day": days[starts],
+        "open": prices[starts],
+        "high": np.maximum.reduceat(prices, starts),
+        "low": np.minimum.reduceat(prices, starts),
+        "close": prices[ends],
+        "volume": ends - starts + 1,
+        "turnover": np.add.reduceat(prices, starts),
+        "sum_squares": np.add.reduceat(np.square(prices), starts),
+        "first_time": times[starts],
+        "last_time": times[ends],
+    }
+
+
+def empty_bars():
+    return {
+        "day": np.array([], dtype="datetime64[D]"),
+        "open": np.array([], dtype=np.float64),
+        "high": np.array([], dtype=np.float64),
+        "low": np.array([], dtype=np.float64),
+        "close": np.array([], dtype=np.float64),
+        "volume": np.array([], dtype=np.int64),
+        "turnover": np.array([], dtype=np.float64),
+        "sum_squares": np.array([], dtype=np.float64),
+        "first_time": np.array([], dtype="datetime64[us]"),
+        "last_time": np.array([], dtype="datetime64[us]"),
+    }
+
+
+def update_bars(bars, transactions, watermark_id):
+    """
+    Fold transactions stored after watermark_id into bars. Only the
+    transactions on the days of new ones are parsed and aggregated again.
+    @param bars          of one (style_id, size, venue), None if none yet
+    @param transactions  all stored transactions, newest first
+    @return (bars, number of days aggregated again)
+    """
+    new = (
+        get_new_transactions(transactions, watermark_id)
+        if watermark_id is not None
+        else transactions
+    )
+    if bars is None or len(new) == len(transactions):
+        # nothing aggregated yet, or history rewritten since
+        bars = aggregate(*to_arrays(transactions))
+        return bars, len(bars["day"])
+    if len(new) == 0:
+        return bars, 0
+
+    # stored times are iso8601 in utc, their day is their date prefix
+    touched = {t["time"][:10] for t in new}
+    recomputed = aggregate(
+        *to_arrays([t for t in transactions if t["time"][:10] in touched])
+    )
+    kept = ~np.isin(bars["day"], np.array(sorted(touched), dtype="datetime64[D]"))
+    merged = {
+        field: np.concatenate((bars[field][kept], recomputed[field]))
+        for field in BAR_FIELDS
+    }
+    order = np.argsort(merged["day"], kind="stable")
+    return {field: merged[field][order] for field in BAR_FIELDS}, len(touched)
+
+
+def to_arrays(transactions):
+    times = parse_times([t["time"] for t in transactions])
+    prices = np.array([t["price"] for t in transactions], dtype=np.float64)
+    return times, prices
+
+
+class DailyBars:
+    def __init__(self, parent_folder):
+        self.parent_folder = parent_folder
+        # venue => {style_id: {size: newest transaction id in bars}}
+        self.watermarks = {}
+        return
+
+    def _bars_file(self, style_id, venue):
+        return os.path.join(
+            self.parent_folder, style_id, "daily_bars.{}.npz".format(venue)
+        )
+
+    def _watermarks_file(self, venue):
+        return os.path.join(self.parent_folder, "daily_bars.{}.json".format(venue))
+
+    def get_watermarks(self, venue):
+        if venue not in self.watermarks:
+            path = self._watermarks_file(venue)
+            if os.path.isfile(path):
+                with open(path, "r") as infile:
+                    self.watermarks[venue] = json.loads(infile.read())
+            else:
+                self.watermarks[venue] = {}
+        return self.watermarks[venue]
+
+    def get_all(self, style_id, venue):
+        """
+        @return {size: bars} of style_id on venue, bars as of `aggregate`
+        """
+        path = self._bars_file(style_id, venue)
+        if not os.path.isfile(path):
+            return {}
+        with np.load(path) as columns:
+            sizes = columns["size"]
+            columns = {field: columns[field] for field in BAR_FIELDS}
+        result = {}
+        starts = np.flatnonzero(np.concatenate(([True], sizes[1:] != sizes[:-1])))
+        ends = np.concatenate((starts[1:], [len(sizes)]))
+        for begin, end in zip(starts, ends):
+            result[str(sizes[begin])] = {
+                field: columns[field][begin:end] for field in BAR_FIELDS
+            }
+        return result
+
+    def get(self, style_id, size, venue):
+        """
+        @return bars of (style_id, size) on venue, None if none
+        """
+        return self.get_all(style_id, venue).get(size)
+
+    def _write(self, style_id, venue, all_bars):
+        pathlib.Path(self.parent_folder, style_id).mkdir(parents=True, exist_ok=True)
+        sizes = sorted(all_bars)
+        columns = {
+            "size": np.array(
+                [size for size in sizes for _ in range(len(all_bars[size]["day"]))],
+                dtype=str,
+            )
+        }
+        for field in BAR_FIELDS:
+            if sizes:
+                columns[field] = np.concatenate([all_bars[s][field] for s in sizes])
+            else:
+                columns[field] = empty_bars()[field]
+        path = self._bars_file(style_id, venue)
+        np.savez(path + ".tmp.npz", **columns)
+        os.replace(path + ".tmp.npz", path)
+        return
+
+    def save(self):
+        for venue, watermarks in self.watermarks.items():
+            path = self._watermarks_file(venue)
+            with open(path + ".tmp", "w") as outfile:
+                outfile.write(json.dumps(watermarks))
+            os.replace(path + ".tmp", path)
+        return
+
+    def update(self, serializer, venue, style_ids=None):
+        """
+        Bring the bars of style_ids (default all stored) on venue up to date
+        with what serializer stores.
+        @return number of (style_id, size) updated
+        """
+        if style_ids is None:
+            style_ids = serializer.get_style_ids()
+        watermarks = self.get_watermarks(venue)
+        has_snapshot = venue in serializer.snapshot.get_venues()
+        updated_keys = 0
+        updated_days = 0
+        for style_id in style_ids:
+            if has_snapshot:
+                newest = {
+                    size: entry["transaction"]["id"]
+                    for size, entry in serializer.snapshot.get_venue(venue)
+                    .get(style_id, {})
+                    .items()
+                    if entry["transaction"] is not None
+                }
+            else:
+                newest = {
+                    size: w["id"]
+                    for size, w in serializer.get_transaction_watermarks(
+                        style_id, venue
+                    ).items()
+                }
+            style_watermarks = watermarks.get(style_id, {})
+            changed = [s for s in newest if style_watermarks.get(s) != newest[s]]
+            if not changed:
+                continue
+            all_bars = self.get_all(style_id, venue)
+            for size in changed:
+                transactions = serializer.get_all_transactions(style_id, size, venue)
+                all_bars[size], days = update_bars(
+                    all_bars.get(size), transactions, style_watermarks.get(size)
+                )
+                style_watermarks[size] = transactions[0]["id"]
+                updated_days += days
+            self._write(style_id, venue, all_bars)
+            watermarks[style_id] = style_watermarks
+            updated_keys += len(changed)
+        self.save()
+        print(
+            "daily bars of {} (style_id, size) on {} updated, {} days aggregated".format(
+                updated_keys, venue, updated_days
+            )
+        )
+        return updated_keys
+
+    def build(self, serializer, venues):
+        """
+        Aggregate the bars of everything stored again
+        """
+        for venue in venues:
+            self.watermarks[venue] = {}
+            pattern = "*/daily_bars.{}.npz".format(venue)
+            for path in pathlib.Path(self.parent_folder).glob(pattern):
+                os.remove(path)
+            self.update(serializer, venue)
+        return
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("""
+        daily bars maintenance.
+
+        example usage:
+          ./daily_bars.py --mode update --data_folder ../data --venue stockx
+    """)
+    parser.add_argument("--mode", help="[update|build]")
+    parser.add_argument(
+        "--data_folder", help="the data folder to operate on", default="../data"
+    )
+    parser.add_argument(
+        "--storage_format", help="how time series in data_folder are stored"
+    )
+    parser.add_argument(
+        "--venue",
+        nargs="+",
+        default=["du", "stockx"],
+        help="venues whose transactions to aggregate",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from time_series_serializer import TimeSeriesSerializer
+
+    args = parse_args()
+    serializer = TimeSeriesSerializer(args.data_folder, args.storage_format)
+    bars = DailyBars(args.data_folder)
+    if args.mode == "update":
+        for venue in args.venue:
+            bars.update(serializer, venue)
+    elif args.mode == "build":
+        bars.build(serializer, args.venue)
+    else:
+        raise RuntimeError("Unsupported mode {}".format(args.mode))
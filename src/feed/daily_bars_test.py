@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import datetime
+import tempfile
+import unittest
+
+import numpy as np
+
+from daily_bars import BAR_FIELDS, DailyBars
+from du_analyzer import ItemAnalyzer
+from time_series_serializer import TimeSeriesSerializer
+
+
+def make_transactions(prefix, times, prices):
+    # newest first, as stored
+    return [
+        {"price": p, "time": t, "id": "{}-{}".format(prefix, i)}
+        for i, (t, p) in enumerate(zip(times, prices))
+    ][::-1]
+
+
+class TestDailyBars(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.serializer = TimeSeriesSerializer(self.folder.name, "json")
+        transactions = make_transactions(
+            "a",
+            [
+                "2019-12-01T09:00:00.000Z",
+                "2019-12-01T10:00:00.000Z",
+                "2019-12-01T11:00:00.000Z",
+                "2019-12-03T10:00:00.000Z",
+            ],
+            [110000, 130000, 100000, 120000],
+        )
+        self.update(transactions)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def update(self, transactions):
+        self.serializer.update(
+            "du",
+            datetime.datetime(2019, 12, 10),
+            "A-1",
+            {"9.5": {"list_price": 100000}},
+            {"9.5": transactions},
+        )
+        return DailyBars(self.folder.name).update(self.serializer, "du")
+
+    def test_update(self):
+        bars = DailyBars(self.folder.name).get("A-1", "9.5", "du")
+        self.assertEqual(list(bars["day"].astype(str)), ["2019-12-01", "2019-12-03"])
+        self.assertEqual(list(bars["open"]), [110000, 120000])
+        self.assertEqual(list(bars["high"]), [130000, 120000])
+        self.assertEqual(list(bars["low"]), [100000, 120000])
+        self.assertEqual(list(bars["close"]), [100000, 120000])
+        self.assertEqual(list(bars["volume"]), [3, 1])
+
+        # nothing new
+        self.assertEqual(DailyBars(self.folder.name).update(self.serializer, "du"), 0)
+
+        # a newer sale, and one reported late on an earlier day
+        new = make_transactions(
+            "b",
+            ["2019-12-01T08:00:00.000Z", "2019-12-05T10:00:00.000Z"],
+            [90000, 140000],
+        )
+        self.assertEqual(self.update(new), 1)
+        bars = DailyBars(self.folder.name).get("A-1", "9.5", "du")
+        transactions = self.serializer.get_all_transactions("A-1", "9.5", "du")
+        self.assertEqual(len(transactions), 6)
+        self.assertEqual(list(bars["open"]), [90000, 120000, 140000])
+        self.assertEqual(list(bars["volume"]), [4, 1, 1])
+
+        analyzer = ItemAnalyzer()
+        expected = analyzer.get_historical_transactions_stats_from_arrays(
+            *ItemAnalyzer.to_arrays(transactions)
+        )
+        stats = analyzer.get_historical_transactions_stats_from_bars(bars)
+        self.assertEqual(stats["num_sales"], expected["num_sales"])
+        self.assertEqual(stats["elapsed_days"], expected["elapsed_days"])
+        self.assertEqual(stats["last_date"], expected["last_date"])
+        for field in ["high", "low", "last", "avg", "stdev"]:
+            self.assertAlmostEqual(stats[field], expected[field])
+
+        # the same as aggregating everything again
+        rebuilt = DailyBars(self.folder.name)
+        rebuilt.build(self.serializer, ["du"])
+        for field in BAR_FIELDS:
+            np.testing.assert_array_equal(
+                rebuilt.get("A-1", "9.5", "du")[field], bars[field]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
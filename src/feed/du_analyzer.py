@@ -1,16 +1,21 @@
 #!/usr/bin/env python3
 
 import argparse
+import concurrent.futures
+import csv
+import json
+import os
 import sys
 import datetime
 
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 import numpy as np
 
 # only needed when running this binary
-from time_series_serializer import TimeSeriesSerializer
+from time_series_serializer import TimeSeriesSerializer, STORAGE_FORMATS
+from time_series_json import parse_times
 from du_response_parser import SaleRecord
+from analytics_cache import AnalyticsCache, cache_file
+from daily_bars import DailyBars
 import sys
 # hack for import
 sys.path.append("../strategy/")
@@ -19,8 +24,74 @@ from fx_rate import FxRate
 """
 Provides analytics (price history, volume, vol) based on given transactions.
 Built-in binary takes stored time series. Import in feed (gets) for live data processing.
+
+matplotlib is only imported to plot. render_charts plots many (style_id, size)
+headless (Agg backend) over a pool of processes into an output folder, with a
+manifest.json of what was rendered.
 """
 
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+ROLLING_FIELDS = [
+    "rolling_sales",
+    "rolling_mean",
+    "rolling_std",
+    "realized_volatility",
+    "ewma_volatility",
+]
+
+
+def ewma(values, decay):
+    """
+    Exponentially weighted moving average of values,
+    result[i] = decay * result[i - 1] + (1 - decay) * values[i], from 0.
+    Computed from cumulative sums of values scaled by decay ** -i, in blocks
+    short enough for those not to overflow.
+    """
+    result = np.empty(len(values))
+    if decay <= 0:
+        result[:] = values
+        return result
+    block = max(int(500 / -np.log(decay)) if decay < 1 else len(values), 1)
+    previous = 0.0
+    for begin in range(0, len(values), block):
+        chunk = np.asarray(values[begin : begin + block], dtype=np.float64)
+        powers = np.power(decay, np.arange(len(chunk), dtype=np.float64))
+        scaled = (1 - decay) * powers * np.cumsum(chunk / powers)
+        result[begin : begin + len(chunk)] = powers * decay * previous + scaled
+        previous = result[begin + len(chunk) - 1]
+    return result
+
+
+def sort_by_time(times, prices):
+    """
+    Transaction times (as datetime64[us]) and prices, ordered earliest to
+    latest. Du times are stamped with the year they were fed in, so stored
+    histories are not always in time order.
+    """
+    times = np.asarray(times).astype("datetime64[us]", copy=False)
+    prices = np.asarray(prices, dtype=np.float64)
+    if len(times) > 1 and np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        prices = prices[order]
+    return times, prices
+
+
+def import_pyplot(headless=False):
+    import matplotlib
+
+    if headless:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def chart_file(style_id, size):
+    return "{}_{}.png".format(style_id, size)
+
 class ItemAnalyzer:
     def __init__(self):
         return
@@ -33,89 +104,355 @@ class ItemAnalyzer:
             result.append(SaleRecord("", t["price"], t["time"]))
         return result
 
-    def plot_historical_transactions(self, transactions, plot_title=None, save_png=None):
+    def draw_historical_transactions(
+        self, fig, ax, times, prices, plot_title=None, lows=None, highs=None
+    ):
         """
-        Given ordered transactions (earliest to latest), plot transaction prices on a monthly scale.
-        Optionally title and save the plot.
+        Draw transaction prices (earliest to latest) on a monthly scale onto
+        an existing figure, clearing what was drawn on it before.
+        Optionally with the range of lows to highs at each time, e.g. of
+        daily bars.
         """
-        x = np.array([datetime.datetime.strptime(t.time, "%Y-%m-%dT%H:%M:%S.%fZ") for t in transactions])
-        y = np.array([(t.price / 100) for t in transactions])
+        import matplotlib.dates as mdates
 
-        if len(x) > 0:
-            months = mdates.MonthLocator()  # every month
-            year_month_fmt = mdates.DateFormatter('%Y%m')
+        ax.clear()
+        if lows is not None:
+            ax.vlines(times, lows, highs, alpha=0.5)
+        ax.plot(times, prices, marker='o')
+        # format the ticks
+        ax.xaxis.set_major_locator(mdates.MonthLocator())  # every month
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y%m'))
 
-            fig, ax = plt.subplots()
+        # round to nearest months.
+        datemin = np.datetime64(times[0], 'm')
+        datemax = np.datetime64(times[-1], 'm') + np.timedelta64(1, 'm')
+        ax.set_xlim(datemin, datemax)
 
-            ax.plot(x, y, marker='o')
-            # format the ticks
-            ax.xaxis.set_major_locator(months)
-            ax.xaxis.set_major_formatter(year_month_fmt)
+        # format the coords message box
+        ax.format_xdata = mdates.DateFormatter('%Y-%m-%d')
+        ax.format_ydata = lambda x: '$%1.2f' % x  # format the price.
+        ax.grid(True)
 
-            # round to nearest months.
-            datemin = np.datetime64(x[0], 'm')
-            datemax = np.datetime64(x[-1], 'm') + np.timedelta64(1, 'm')
-            ax.set_xlim(datemin, datemax)
+        # rotates and right aligns the x labels, and moves the bottom of the
+        # axes up to make room for them
+        fig.autofmt_xdate()
+        fig.suptitle(plot_title if plot_title else "")
+        return
 
-            # format the coords message box
-            ax.format_xdata = mdates.DateFormatter('%Y-%m-%d')
-            ax.format_ydata = lambda x: '$%1.2f' % x  # format the price.
-            ax.grid(True)
+    def plot_historical_transactions(
+        self, transactions, plot_title=None, save_png=None, show=True
+    ):
+        """
+        Given ordered transactions (earliest to latest), plot transaction prices on a monthly scale.
+        Optionally title and save the plot.
+        """
+        if len(transactions) == 0:
+            print("no historical transactions to plot")
+            return
 
-            # rotates and right aligns the x labels, and moves the bottom of the
-            # axes up to make room for them
-            fig.autofmt_xdate()
+        plt = import_pyplot(headless=not show)
+        x = parse_times([t.time for t in transactions])
+        y = np.array([(t.price / 100) for t in transactions])
+        fig, ax = plt.subplots()
+        self.draw_historical_transactions(fig, ax, x, y, plot_title)
+        self._show_or_save(plt, fig, save_png, show)
+        return
 
-            if plot_title:
-                fig.suptitle(plot_title)
-            if save_png:
-                plt.savefig(save_png)
-                print("historical transaction figure saved to {}".format(save_png))
+    def plot_daily_bars(self, bars, plot_title=None, save_png=None, show=True):
+        """
+        Plot daily closing transaction prices with their daily range, given
+        daily bars (daily_bars.py).
+        """
+        if len(bars["day"]) == 0:
+            print("no daily bars to plot")
+            return
+
+        plt = import_pyplot(headless=not show)
+        fig, ax = plt.subplots()
+        self.draw_historical_transactions(
+            fig,
+            ax,
+            bars["day"],
+            bars["close"] / 100,
+            plot_title,
+            bars["low"] / 100,
+            bars["high"] / 100,
+        )
+        self._show_or_save(plt, fig, save_png, show)
+        return
+
+    def _show_or_save(self, plt, fig, save_png, show):
+        if save_png:
+            fig.savefig(save_png)
+            print("historical transaction figure saved to {}".format(save_png))
+        if show:
+            plt.show()
+        plt.close(fig)
+        return
+
+    @staticmethod
+    def to_arrays(transactions):
+        """
+        Columnar transactions as stored (newest first), earliest to latest
+        @return (times as datetime64[us], prices as stored)
+        """
+        times = parse_times([t["time"] for t in transactions[::-1]])
+        prices = np.array([t["price"] for t in transactions[::-1]], dtype=np.float64)
+        return sort_by_time(times, prices)
 
-            plt.show()            
-        else:
-            print("no historical transactions found for {} {}".format(args.style_id, args.plot_size))
-    
     def get_historical_transactions_stats(self, transactions, furthest_back=None):
-        dates = [datetime.datetime.strptime(t.time, "%Y-%m-%dT%H:%M:%S.%fZ") for t in transactions]
-        prices = [(t.price / 100) for t in transactions]
+        """
+        Stats of SaleRecords, see
+        `get_historical_transactions_stats_from_arrays`
+        """
+        times = parse_times([t.time for t in transactions])
+        prices = np.array([t.price for t in transactions], dtype=np.float64)
+        return self.get_historical_transactions_stats_from_arrays(
+            times, prices, furthest_back
+        )
+
+    def get_historical_transactions_stats_from_arrays(
+        self, times, prices, furthest_back=None
+    ):
+        """
+        Given transaction times (datetime64) and prices as stored (e.g. from
+        `to_arrays`, or the "transaction_arrays" of
+        ColumnarTimeSeriesReader.get_compact), in any order. first / last
+        are the earliest / latest sales.
+        Only transactions at or after furthest_back are considered if given.
+        """
+        times, prices = sort_by_time(times, prices)
 
         if furthest_back:
-            for idx in range(0, len(dates)):
-                if dates[idx] < furthest_back:
-                    dates = dates[:idx]
-                    prices = prices[:idx]
-                    break
-
-        start_date = dates[0]
-        end_date = dates[-1]
-
-        elapsed_days = (end_date - start_date).days + 1
-        sales_per_day = float(len(prices)) / elapsed_days
-        high = max(prices)
-        low = min(prices)
-        last = prices[-1]
-        
-        prices_np = np.array(prices)
-        stdev = np.std(prices_np)
-        avg = np.average(prices_np)
+            begin = np.searchsorted(
+                times, np.datetime64(furthest_back, "us"), side="left"
+            )
+            times = times[begin:]
+            prices = prices[begin:]
 
+        prices = prices / 100
+        num_sales = len(prices)
+        elapsed_days = int((times[-1] - times[0]) // np.timedelta64(1, "D")) + 1
+        avg = prices.mean()
         return {
-            "num_sales": len(prices),
+            "num_sales": num_sales,
             "elapsed_days": elapsed_days,
-            "sales_per_day": sales_per_day,
+            "sales_per_day": float(num_sales) / elapsed_days,
 
-            "high": high,
-            "low": low,
+            "high": prices.max(),
+            "low": prices.min(),
             "first": prices[0],
-            "last": last,
-            "first_date": start_date,
-            "last_date": end_date,
+            "last": prices[-1],
+            "first_date": times[0].astype(datetime.datetime),
+            "last_date": times[-1].astype(datetime.datetime),
 
             "avg": avg,
-            "stdev": stdev,
+            "stdev": np.sqrt(np.mean(np.square(prices - avg))),
+        }
+
+    def get_historical_transactions_stats_from_bars(self, bars):
+        """
+        Same stats as `get_historical_transactions_stats` of all transactions,
+        from their daily bars (daily_bars.py). Bars order transactions by
+        time, so first / last are the earliest / latest sales even if
+        reported out of order.
+        """
+        num_sales = int(bars["volume"].sum())
+        first_date = bars["first_time"][0]
+        last_date = bars["last_time"][-1]
+        elapsed_days = int((last_date - first_date) // np.timedelta64(1, "D")) + 1
+        avg = bars["turnover"].sum() / num_sales
+        variance = max(bars["sum_squares"].sum() / num_sales - avg * avg, 0)
+        return {
+            "num_sales": num_sales,
+            "elapsed_days": elapsed_days,
+            "sales_per_day": float(num_sales) / elapsed_days,
+
+            "high": bars["high"].max() / 100,
+            "low": bars["low"].min() / 100,
+            "first": bars["open"][0] / 100,
+            "last": bars["close"][-1] / 100,
+            "first_date": first_date.astype(datetime.datetime),
+            "last_date": last_date.astype(datetime.datetime),
+
+            "avg": avg / 100,
+            "stdev": np.sqrt(variance) / 100,
+        }
+
+    def get_rolling_stats(
+        self, times, prices, window_days=7, ewma_decay=0.94, end=None
+    ):
+        """
+        Daily time series of rolling-window stats, given transaction times
+        (datetime64) and prices as stored, in any order. Days run from that
+        of the earliest transaction to that of end (default the latest
+        transaction); only transactions until end are considered.
+
+        Each is computed for every day at once from cumulative sums over days:
+          date:                 the day
+          sales:                number of sales on the day
+          rolling_sales:        number of sales in the window_days ending on the day
+          rolling_mean:         mean price of those, nan if none
+          rolling_std:          stdev of their prices, nan if none
+          realized_volatility:  root of the sum of squared log returns between
+                                consecutive sales, of the sales in the window
+          ewma_volatility:      root of the exponentially weighted moving
+                                average (ewma_decay a day) of the daily sums of
+                                squared log returns
+        """
+        times, prices = sort_by_time(times, prices)
+        prices = prices / 100
+        if end is not None:
+            n = np.searchsorted(times, np.datetime64(end, "us"), side="right")
+            times = times[:n]
+            prices = prices[:n]
+        if len(times) == 0:
+            raise RuntimeError("no transactions to compute rolling stats of")
+
+        days = times.astype("datetime64[D]")
+        first_day = days[0]
+        last_day = np.datetime64(end, "D") if end is not None else days[-1]
+        num_days = int((last_day - first_day) // np.timedelta64(1, "D")) + 1
+        day_idx = (days - first_day).astype(np.int64)
+
+        def daily_sum(weights=None):
+            return np.bincount(day_idx, weights=weights, minlength=num_days)
+
+        def rolling_sum(daily):
+            cumsum = np.concatenate(([0.0], np.cumsum(daily)))
+            ends = np.arange(1, num_days + 1)
+            return cumsum[ends] - cumsum[np.maximum(ends - window_days, 0)]
+
+        sales = daily_sum()
+        rolling_sales = np.rint(rolling_sum(sales)).astype(np.int64)
+        # moments around the overall mean, to keep sums of squares small
+        reference = prices.mean()
+        deviations = prices - reference
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rolling_dev = rolling_sum(daily_sum(deviations)) / rolling_sales
+            rolling_square = (
+                rolling_sum(daily_sum(np.square(deviations))) / rolling_sales
+            )
+            rolling_var = rolling_square - np.square(rolling_dev)
+        rolling_mean = rolling_dev + reference
+        rolling_std = np.sqrt(np.maximum(rolling_var, 0))
+
+        squared_returns = np.zeros(len(prices))
+        squared_returns[1:] = np.square(np.diff(np.log(prices)))
+        daily_squared_returns = daily_sum(squared_returns)
+        realized_volatility = np.sqrt(np.maximum(rolling_sum(daily_squared_returns), 0))
+        ewma_volatility = np.sqrt(ewma(daily_squared_returns, ewma_decay))
+
+        return {
+            "date": first_day + np.arange(num_days),
+            "sales": sales.astype(np.int64),
+            "rolling_sales": rolling_sales,
+            "rolling_mean": rolling_mean,
+            "rolling_std": rolling_std,
+            "realized_volatility": realized_volatility,
+            "ewma_volatility": ewma_volatility,
         }
 
+    def get_rolling_summary(
+        self, times, prices, window_days=7, ewma_decay=0.94, end=None
+    ):
+        """
+        `get_rolling_stats` of the day of end (default the last transaction),
+        as scalars. With no transactions, no sales and nan stats.
+        """
+        times, prices = sort_by_time(times, prices)
+        if len(times) == 0 or (
+            end is not None and times[0] > np.datetime64(end, "us")
+        ):
+            summary = {name: float("nan") for name in ROLLING_FIELDS}
+            summary["rolling_sales"] = 0
+            summary["date"] = None
+            return summary
+        rolling = self.get_rolling_stats(times, prices, window_days, ewma_decay, end)
+        summary = {name: rolling[name][-1].item() for name in ROLLING_FIELDS}
+        summary["date"] = rolling["date"][-1].item()
+        return summary
+
+
+def render_shard(keys, data_folder, storage_format, output_folder):
+    """
+    Plot each of keys [(style_id, size)] headless into output_folder, in a
+    worker process of render_charts. One figure is drawn over for all keys.
+    @return manifest entries of keys, "file" None if nothing to plot
+    """
+    plt = import_pyplot(headless=True)
+    serializer = TimeSeriesSerializer(data_folder, storage_format)
+    analyzer = ItemAnalyzer()
+    fig, ax = plt.subplots()
+    entries = []
+    try:
+        for style_id, size in keys:
+            entry = {"style_id": style_id, "size": size, "file": None, "num_sales": 0}
+            entries.append(entry)
+            try:
+                transactions = serializer.get_all_transactions(style_id, size, "du")
+            except FileNotFoundError:
+                continue
+            if len(transactions) == 0:
+                continue
+            times, prices = ItemAnalyzer.to_arrays(transactions)
+            analyzer.draw_historical_transactions(
+                fig, ax, times, prices / 100, "{} {}".format(style_id, size)
+            )
+            entry["file"] = chart_file(style_id, size)
+            entry["num_sales"] = len(transactions)
+            entry["newest_id"] = transactions[0].get("id")
+            fig.savefig(os.path.join(output_folder, entry["file"]))
+    finally:
+        plt.close(fig)
+    return entries
+
+
+def render_charts(keys, data_folder, output_folder, storage_format=None, processes=1):
+    """
+    Plot du transaction prices of each of keys [(style_id, size)] into
+    output_folder/{style_id}_{size}.png, and list them in
+    output_folder/manifest.json, in the order of keys.
+    @return manifest entries
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    processes = max(int(processes), 1)
+    shards = [keys[i::processes] for i in range(processes)]
+    if processes == 1:
+        results = [render_shard(keys, data_folder, storage_format, output_folder)]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            results = list(
+                pool.map(
+                    render_shard,
+                    shards,
+                    [data_folder] * processes,
+                    [storage_format] * processes,
+                    [output_folder] * processes,
+                )
+            )
+    rendered = {}
+    for entries in results:
+        for entry in entries:
+            rendered[(entry["style_id"], entry["size"])] = entry
+    manifest = [rendered[tuple(k)] for k in keys]
+    with open(os.path.join(output_folder, MANIFEST_FILE_NAME), "w") as outfile:
+        outfile.write(json.dumps(manifest, indent=2))
+    print(
+        "rendered {} of {} charts into {}".format(
+            sum(1 for e in manifest if e["file"]), len(manifest), output_folder
+        )
+    )
+    return manifest
+
+
+def load_keys(keys_file):
+    """
+    @return [(style_id, size)] of a csv with style_id and size columns
+    """
+    with open(keys_file, "r") as infile:
+        return [(row["style_id"], row["size"]) for row in csv.DictReader(infile)]
+
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -128,7 +465,7 @@ def parse_args():
     )
     parser.add_argument(
         "--mode",
-        help="comma separated list of [plot|stats] to perform"
+        help="comma separated list of [plot|stats|rolling|plot_batch] to perform"
     )
     parser.add_argument(
         "--style_id",
@@ -138,7 +475,73 @@ def parse_args():
         "--size",
         help="the size to analyze",
     )
+    parser.add_argument(
+        "--storage_format",
+        help="how time series are stored, one of {} (default json)".format(
+            STORAGE_FORMATS
+        ),
+    )
+    parser.add_argument(
+        "--fx_rates_file",
+        help="local fx rates to use instead of fetching them (see fx_rate.py)",
+    )
+    parser.add_argument(
+        "--offline", action="store_true", help="never fetch fx rates"
+    )
+    parser.add_argument(
+        "--window_days",
+        default=7,
+        type=int,
+        help="with rolling, the window of rolling stats, in days",
+    )
+    parser.add_argument(
+        "--ewma_decay",
+        default=0.94,
+        type=float,
+        help="with rolling, the daily decay of ewma volatility",
+    )
+    parser.add_argument(
+        "--rolling_days",
+        default=30,
+        type=int,
+        help="with rolling, print this many most recent days",
+    )
+    parser.add_argument(
+        "--data_folder",
+        default="../data",
+        help="the data folder to analyze",
+    )
+    parser.add_argument(
+        "--keys_file",
+        help="with plot_batch, csv with style_id and size columns of the charts to render",
+    )
+    parser.add_argument(
+        "--output_folder",
+        default="charts",
+        help="with plot_batch, write charts and their manifest here",
+    )
+    parser.add_argument(
+        "--processes",
+        default=1,
+        type=int,
+        help="with plot_batch, render in this many processes",
+    )
+    parser.add_argument(
+        "--bars",
+        action="store_true",
+        help="plot and compute stats from daily bars (daily_bars.py) rather than every transaction",
+    )
+    parser.add_argument(
+        "--no_analytics_cache",
+        action="store_true",
+        help="always recompute stats rather than reuse those of an unchanged history (analytics_cache.py)",
+    )
     args = parser.parse_args()
+    if args.mode == "plot_batch":
+        if not args.keys_file:
+            parser.print_help(sys.stderr)
+            raise RuntimeError("args.keys_file is required in plot_batch")
+        return args
     if not args.style_id:
         parser.print_help(sys.stderr)
         raise RuntimeError("args.style_id is required in analysis")
@@ -152,6 +555,9 @@ def parse_args():
 
 
 def serialize_stats(stats, fx_rate):
+    stats_usd = fx_rate.convert(
+        [stats[k] for k in ["high", "low", "first", "last", "avg"]], "CNY", "USD"
+    )
     serialized = """
         First Date:       {}
         Last Date:        {}
@@ -168,35 +574,107 @@ def serialize_stats(stats, fx_rate):
         stats["last_date"].isoformat(),
         stats["num_sales"],
         stats["sales_per_day"],
-        stats["high"], fx_rate.get_spot_fx(stats["high"], "CNY", "USD"),
-        stats["low"], fx_rate.get_spot_fx(stats["low"], "CNY", "USD"),
-        stats["first"], fx_rate.get_spot_fx(stats["first"], "CNY", "USD"),
-        stats["last"], fx_rate.get_spot_fx(stats["last"], "CNY", "USD"),
-        stats["avg"], fx_rate.get_spot_fx(stats["avg"], "CNY", "USD"),
+        stats["high"], stats_usd[0],
+        stats["low"], stats_usd[1],
+        stats["first"], stats_usd[2],
+        stats["last"], stats_usd[3],
+        stats["avg"], stats_usd[4],
         stats["stdev"])
     return serialized
 
 
+def serialize_rolling(rolling, num_days):
+    lines = [
+        "    {:<12}{:>7}{:>9}{:>12}{:>12}{:>12}{:>12}".format(
+            "Date", "Sales", "Window", "Mean", "Stdev", "Realized", "EWMA"
+        )
+    ]
+    for i in range(max(len(rolling["date"]) - num_days, 0), len(rolling["date"])):
+        lines.append(
+            "    {:<12}{:>7}{:>9}{:>12.2f}{:>12.2f}{:>12.4f}{:>12.4f}".format(
+                str(rolling["date"][i]),
+                rolling["sales"][i],
+                rolling["rolling_sales"][i],
+                rolling["rolling_mean"][i],
+                rolling["rolling_std"][i],
+                rolling["realized_volatility"][i],
+                rolling["ewma_volatility"][i],
+            )
+        )
+    return "\n".join(lines)
+
+
 if __name__ == "__main__":
     args = parse_args()
     analyzer = ItemAnalyzer()
 
-    serializer = TimeSeriesSerializer()
-    data = serializer.get(args.style_id, args.size)
-    du_transactions = data[args.size]["du"]["transactions"]
-    if len(du_transactions) == 0:
-        print("no transactions found for {} {}".format(args.style_id, args.size))
+    if args.mode == "plot_batch":
+        render_charts(
+            load_keys(args.keys_file),
+            args.data_folder,
+            args.output_folder,
+            args.storage_format,
+            args.processes,
+        )
         exit(0)
-    transactions = ItemAnalyzer.to_ordered_sale_record(du_transactions)
 
+    serializer = TimeSeriesSerializer(args.data_folder, args.storage_format)
     modes = args.mode.split(',')
+    bars = None
+    if args.bars:
+        bars = DailyBars(serializer.parent_folder).get(args.style_id, args.size, "du")
+        if bars is None:
+            print(
+                "no daily bars of {} {}, using transactions".format(
+                    args.style_id, args.size
+                )
+            )
+    if bars is None or "rolling" in modes:
+        data = serializer.get(args.style_id, args.size)
+        du_transactions = data[args.size]["du"]["transactions"]
+        if len(du_transactions) == 0:
+            print("no transactions found for {} {}".format(args.style_id, args.size))
+            exit(0)
 
     for mode in modes:
-        if mode == "plot":
-            analyzer.plot_historical_transactions(transactions)
+        if mode == "plot" and bars is not None:
+            analyzer.plot_daily_bars(bars, "{} {}".format(args.style_id, args.size))
+        elif mode == "plot":
+            analyzer.plot_historical_transactions(
+                ItemAnalyzer.to_ordered_sale_record(du_transactions)
+            )
+        elif mode == "stats" and bars is not None:
+            stats = analyzer.get_historical_transactions_stats_from_bars(bars)
+            fx_rate = FxRate(rates_file=args.fx_rates_file, offline=args.offline)
+            print(serialize_stats(stats, fx_rate))
         elif mode == "stats":
-            stats = analyzer.get_historical_transactions_stats(transactions)
-            fx_rate = FxRate()
+            analytics_cache = None
+            stats = None
+            newest_id = du_transactions[0].get("id")
+            if not args.no_analytics_cache and newest_id is not None:
+                analytics_cache = AnalyticsCache(cache_file(serializer.parent_folder))
+                stats = analytics_cache.get(args.style_id, args.size, newest_id)
+            if stats is None:
+                stats = analyzer.get_historical_transactions_stats_from_arrays(
+                    *ItemAnalyzer.to_arrays(du_transactions)
+                )
+                if analytics_cache is not None:
+                    analytics_cache.put(args.style_id, args.size, newest_id, stats)
+                    analytics_cache.save()
+            fx_rate = FxRate(rates_file=args.fx_rates_file, offline=args.offline)
             print(serialize_stats(stats, fx_rate))
+        elif mode == "rolling":
+            rolling = analyzer.get_rolling_stats(
+                *ItemAnalyzer.to_arrays(du_transactions),
+                window_days=args.window_days,
+                ewma_decay=args.ewma_decay,
+                end=datetime.datetime.utcnow(),
+            )
+            print(
+                "{}-day rolling du transaction stats, prices in CNY, volatility of log returns".format(
+                    args.window_days
+                )
+            )
+            print(serialize_rolling(rolling, args.rolling_days))
         else:
             raise RuntimeError("unrecognized mode {}".format(mode))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import random
+import time
+
+import numpy as np
+
+from du_analyzer import ItemAnalyzer
+
+"""
+Time ItemAnalyzer transaction stats on long du histories: SaleRecords with
+strptime-parsed times, against columnar arrays with bulk-parsed times.
+
+example usage:
+    ./du_analyzer_benchmark.py --transactions 100000 --histories 5
+"""
+
+
+def make_transactions(num_transactions, seed=0):
+    """
+    @return transactions as stored, newest first
+    """
+    rng = random.Random(seed)
+    time = datetime.datetime(2019, 12, 25)
+    transactions = []
+    for i in range(num_transactions):
+        time -= datetime.timedelta(minutes=rng.uniform(1, 30))
+        transactions.append(
+            {
+                "price": rng.randint(60000, 300000),
+                "time": time.isoformat(timespec="milliseconds") + "Z",
+                "id": str(num_transactions - i),
+            }
+        )
+    return transactions
+
+
+def legacy_stats(transactions, furthest_back=None):
+    """
+    Stats from lists of strptime-parsed datetimes and prices, as
+    ItemAnalyzer.get_historical_transactions_stats used to compute them
+    """
+    dates = [
+        datetime.datetime.strptime(t.time, "%Y-%m-%dT%H:%M:%S.%fZ")
+        for t in transactions
+    ]
+    prices = [(t.price / 100) for t in transactions]
+    if furthest_back:
+        kept = [i for i in range(len(dates)) if dates[i] >= furthest_back]
+        dates = [dates[i] for i in kept]
+        prices = [prices[i] for i in kept]
+    elapsed_days = (dates[-1] - dates[0]).days + 1
+    prices_np = np.array(prices)
+    return {
+        "num_sales": len(prices),
+        "elapsed_days": elapsed_days,
+        "sales_per_day": float(len(prices)) / elapsed_days,
+        "high": max(prices),
+        "low": min(prices),
+        "first": prices[0],
+        "last": prices[-1],
+        "first_date": dates[0],
+        "last_date": dates[-1],
+        "avg": np.average(prices_np),
+        "stdev": np.std(prices_np),
+    }
+
+
+def check(expected, actual):
+    for field, value in expected.items():
+        if isinstance(value, datetime.datetime):
+            assert value == actual[field], field
+        else:
+            assert np.isclose(value, actual[field]), field
+    return
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("benchmark du transaction stats")
+    parser.add_argument(
+        "--transactions", default=100000, help="transactions of each history"
+    )
+    parser.add_argument("--histories", default=5, help="histories to analyze")
+    parser.add_argument(
+        "--window_days", default=30, help="furthest_back of windowed stats, in days"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    analyzer = ItemAnalyzer()
+    histories = [
+        make_transactions(int(args.transactions), seed)
+        for seed in range(int(args.histories))
+    ]
+    furthest_back = datetime.datetime(2019, 12, 25) - datetime.timedelta(
+        days=int(args.window_days)
+    )
+
+    for window in [None, furthest_back]:
+        start = time.perf_counter()
+        expected = [
+            legacy_stats(ItemAnalyzer.to_ordered_sale_record(t), window)
+            for t in histories
+        ]
+        legacy_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = [
+            analyzer.get_historical_transactions_stats_from_arrays(
+                *ItemAnalyzer.to_arrays(t), window
+            )
+            for t in histories
+        ]
+        columnar_elapsed = time.perf_counter() - start
+
+        for e, a in zip(expected, actual):
+            check(e, a)
+        print(
+            "window {}: sale records {:.3f} s, columnar {:.3f} s, speedup {:.1f}x".format(
+                window or "all",
+                legacy_elapsed,
+                columnar_elapsed,
+                legacy_elapsed / columnar_elapsed,
+            )
+        )
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from du_analyzer import (
+    MANIFEST_FILE_NAME,
+    ROLLING_FIELDS,
+    ItemAnalyzer,
+    ewma,
+    render_charts,
+)
+from time_series_serializer import TimeSeriesSerializer
+
+
+class TestItemAnalyzer(unittest.TestCase):
+    def setUp(self):
+        # newest first, as stored
+        self.transactions = [
+            {"price": 130000, "time": "2019-12-10T10:00:00.000Z", "id": "4"},
+            {"price": 120000, "time": "2019-12-05T10:00:00.000Z", "id": "3"},
+            {"price": 100000, "time": "2019-12-01T10:00:00.000Z", "id": "2"},
+            {"price": 110000, "time": "2019-12-01T09:00:00.000Z", "id": "1"},
+        ]
+        self.analyzer = ItemAnalyzer()
+
+    def test_stats(self):
+        stats = self.analyzer.get_historical_transactions_stats_from_arrays(
+            *ItemAnalyzer.to_arrays(self.transactions)
+        )
+        self.assertEqual(stats["num_sales"], 4)
+        self.assertEqual(stats["elapsed_days"], 10)
+        self.assertAlmostEqual(stats["sales_per_day"], 0.4)
+        self.assertEqual(stats["high"], 1300)
+        self.assertEqual(stats["low"], 1000)
+        self.assertEqual(stats["first"], 1100)
+        self.assertEqual(stats["last"], 1300)
+        self.assertEqual(stats["first_date"], datetime.datetime(2019, 12, 1, 9))
+        self.assertEqual(stats["last_date"], datetime.datetime(2019, 12, 10, 10))
+        self.assertAlmostEqual(stats["avg"], 1150)
+        self.assertAlmostEqual(stats["stdev"], 111.80339887)
+
+        self.assertEqual(
+            self.analyzer.get_historical_transactions_stats(
+                ItemAnalyzer.to_ordered_sale_record(self.transactions)
+            ),
+            stats,
+        )
+
+    def test_furthest_back(self):
+        stats = self.analyzer.get_historical_transactions_stats_from_arrays(
+            *ItemAnalyzer.to_arrays(self.transactions),
+            furthest_back=datetime.datetime(2019, 12, 1, 10)
+        )
+        self.assertEqual(stats["num_sales"], 3)
+        self.assertEqual(stats["first"], 1000)
+        self.assertEqual(stats["first_date"], datetime.datetime(2019, 12, 1, 10))
+
+    def test_stats_unsorted(self):
+        # the 2019-12-05 sale stored as the newest
+        transactions = [self.transactions[1], self.transactions[0]] + self.transactions[
+            2:
+        ]
+        times, prices = ItemAnalyzer.to_arrays(transactions)
+        self.assertTrue(np.all(times[1:] >= times[:-1]))
+        stats = self.analyzer.get_historical_transactions_stats_from_arrays(
+            times[::-1], prices[::-1], furthest_back=datetime.datetime(2019, 12, 1, 10)
+        )
+        self.assertEqual(stats["num_sales"], 3)
+        self.assertEqual(stats["first"], 1000)
+        self.assertEqual(stats["last"], 1300)
+        self.assertEqual(stats["first_date"], datetime.datetime(2019, 12, 1, 10))
+        self.assertEqual(stats["last_date"], datetime.datetime(2019, 12, 10, 10))
+
+    def test_rolling_stats(self):
+        times, prices = ItemAnalyzer.to_arrays(self.transactions)
+        rolling = self.analyzer.get_rolling_stats(
+            times, prices, window_days=3, end=datetime.datetime(2019, 12, 12)
+        )
+        self.assertEqual(len(rolling["date"]), 12)
+        self.assertEqual(rolling["date"][-1], np.datetime64("2019-12-12"))
+        self.assertEqual(list(rolling["sales"][:5]), [2, 0, 0, 0, 1])
+        self.assertEqual(list(rolling["rolling_sales"][:5]), [2, 2, 2, 0, 1])
+        self.assertAlmostEqual(rolling["rolling_mean"][2], 1050)
+        self.assertAlmostEqual(rolling["rolling_std"][2], 50)
+        self.assertTrue(np.isnan(rolling["rolling_mean"][3]))
+        # day 0 holds the return from 1100 to 1000, day 4 from 1000 to 1200
+        returns = np.square(np.log([1000 / 1100, 1200 / 1000]))
+        self.assertAlmostEqual(rolling["realized_volatility"][2], np.sqrt(returns[0]))
+        self.assertAlmostEqual(rolling["realized_volatility"][4], np.sqrt(returns[1]))
+        daily = np.zeros(12)
+        daily[[0, 4, 9]] = np.append(returns, np.square(np.log(1300 / 1200)))
+        expected = np.empty(12)
+        previous = 0
+        for i in range(12):
+            previous = 0.94 * previous + 0.06 * daily[i]
+            expected[i] = previous
+        np.testing.assert_allclose(rolling["ewma_volatility"], np.sqrt(expected))
+        np.testing.assert_allclose(
+            ewma(np.ones(2000), 0.5), np.ones(2000) - 0.5 ** np.arange(1, 2001)
+        )
+
+        summary = self.analyzer.get_rolling_summary(
+            times, prices, window_days=3, end=datetime.datetime(2019, 12, 12)
+        )
+        self.assertEqual(summary["rolling_sales"], 1)
+        self.assertEqual(summary["date"], datetime.date(2019, 12, 12))
+
+    def test_rolling_stats_unsorted(self):
+        times = np.array(
+            ["2020-01-03", "2019-12-30", "2020-01-05"], dtype="datetime64[us]"
+        )
+        prices = np.array([110000, 100000, 120000])
+        rolling = self.analyzer.get_rolling_stats(times, prices, window_days=7)
+        self.assertEqual(rolling["date"][0], np.datetime64("2019-12-30"))
+        self.assertEqual(len(rolling["date"]), 7)
+        self.assertEqual(list(rolling["sales"]), [1, 0, 0, 0, 1, 0, 1])
+        self.assertEqual(rolling["rolling_sales"][-1], 3)
+        self.assertAlmostEqual(rolling["rolling_mean"][-1], 1100)
+        expected = self.analyzer.get_rolling_stats(
+            np.sort(times), prices[[1, 0, 2]], window_days=7
+        )
+        for name in ROLLING_FIELDS:
+            np.testing.assert_allclose(rolling[name], expected[name])
+
+        summary = self.analyzer.get_rolling_summary(
+            times, prices, end=datetime.datetime(2019, 12, 31)
+        )
+        self.assertEqual(summary["rolling_sales"], 1)
+
+    def test_render_charts(self):
+        with tempfile.TemporaryDirectory() as folder:
+            data_folder = os.path.join(folder, "data")
+            store = TimeSeriesSerializer(data_folder, "json").store
+            for style_id in ["A-1", "B-2", "C-3"]:
+                store.write(
+                    style_id,
+                    "9.5",
+                    {
+                        "du": {"prices": [], "transactions": self.transactions},
+                        "stockx": {"prices": [], "transactions": []},
+                    },
+                )
+            store.write(
+                "D-4",
+                "9.5",
+                {
+                    "du": {"prices": [], "transactions": []},
+                    "stockx": {"prices": [], "transactions": []},
+                },
+            )
+            # D-4 has no transactions, E-5 nothing stored
+            keys = [("C-3", "9.5"), ("E-5", "9.5"), ("A-1", "9.5")]
+            keys += [("D-4", "9.5"), ("B-2", "9.5")]
+            output_folder = os.path.join(folder, "charts")
+            render_charts(keys, data_folder, output_folder, "json", processes=2)
+
+            with open(os.path.join(output_folder, MANIFEST_FILE_NAME), "r") as infile:
+                manifest = json.loads(infile.read())
+            self.assertEqual([(e["style_id"], e["size"]) for e in manifest], keys)
+            self.assertEqual(
+                [e["file"] for e in manifest],
+                ["C-3_9.5.png", None, "A-1_9.5.png", None, "B-2_9.5.png"],
+            )
+            self.assertEqual(manifest[0]["num_sales"], 4)
+            self.assertEqual(manifest[0]["newest_id"], "4")
+            self.assertEqual(
+                sorted(os.listdir(output_folder)),
+                ["A-1_9.5.png", "B-2_9.5.png", "C-3_9.5.png", MANIFEST_FILE_NAME],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import asyncio
+import concurrent.futures
+import functools
+import json
+import time
+
+import requests
+
+from du_url_builder import DuRequestBuilder
+from sizer import SizerError
+
+"""
+Concurrent driver for du feed update mode.
+
+Products are fanned out on an asyncio loop, with the blocking DuFeed calls
+(product detail, one page of transactions) running on a bounded thread pool.
+Pages of one product are still fetched in order, as each page gives the cursor
+to the next.
+
+Serializer writes happen on the loop thread once a product's requests are
+done, so LastUpdatedSerializer and TimeSeriesSerializer see the same sequence
+of calls as the serial update mode, one product at a time.
+"""
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to a host such that at most `rate` requests per second
+    are started. A `rate` of None or 0 disables limiting.
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / float(rate) if rate else 0
+        self.next_slot = 0
+        return
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        wait = self.next_slot - now
+        self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class DuAsyncUpdater:
+    def __init__(
+        self,
+        feed,
+        last_updated_serializer,
+        time_series_serializer,
+        concurrency=8,
+        rate_limit=None,
+        use_watermarks=True,
+    ):
+        self.feed = feed
+        self.last_updated_serializer = last_updated_serializer
+        self.time_series_serializer = time_series_serializer
+        self.concurrency = int(concurrency)
+        self.rate_limit = rate_limit
+        self.use_watermarks = use_watermarks
+        # keyed by host, every Du request currently goes to the same one
+        self.rate_limiters = {}
+
+        self.num_requests = 0
+        self.num_updated = 0
+        self.num_failed = 0
+        self.elapsed_seconds = 0
+        return
+
+    def _get_rate_limiter(self, host):
+        if host not in self.rate_limiters:
+            self.rate_limiters[host] = HostRateLimiter(self.rate_limit)
+        return self.rate_limiters[host]
+
+    async def _call(self, fn, *args, **kwargs):
+        """
+        Run one blocking request-issuing call on the pool, subject to rate limit.
+        """
+        await self._get_rate_limiter(DuRequestBuilder.du_headers["Host"]).acquire()
+        self.num_requests += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def get_historical_transactions(
+        self,
+        product_id,
+        in_code,
+        max_page=0,
+        up_to_time=None,
+        up_to_id=None,
+        up_to_ids=None,
+    ):
+        """
+        Same as DuFeed.get_historical_transactions, yielding to other products
+        while waiting for each page.
+        """
+        known_ids = set(up_to_ids) if up_to_ids else set()
+        if up_to_id:
+            known_ids.add(up_to_id)
+
+        all_sales = []
+        page_idx = 0
+        while max_page >= 0:
+            page_idx, sales = await self._call(
+                self.feed.get_transactions_page, page_idx, product_id, in_code
+            )
+            if len(sales) == 0:
+                return all_sales
+            all_sales += sales
+            if self.feed.reached_history_limit(sales, up_to_time, known_ids):
+                return all_sales
+            max_page -= 1
+        return all_sales
+
+    async def _update_one(self, product_id, style_id, max_page, up_to_time):
+        async with self.semaphore:
+            print("working with {} style_id {}".format(product_id, style_id))
+            try:
+                result = await self._call(
+                    self.feed.get_size_prices_from_product_id, product_id
+                )
+                if not result:
+                    self.num_failed += 1
+                    return
+                size_prices, gender = result
+                watermarks = (
+                    self.time_series_serializer.get_transaction_watermarks(
+                        style_id, "du"
+                    )
+                    if self.use_watermarks
+                    else {}
+                )
+                product_up_to_time, up_to_ids = self.feed.get_paging_limits(
+                    watermarks, up_to_time
+                )
+                transactions = await self.get_historical_transactions(
+                    product_id,
+                    gender,
+                    max_page=max_page,
+                    up_to_time=product_up_to_time,
+                    up_to_ids=up_to_ids,
+                )
+                size_transactions = self.feed.split_size_transactions(transactions)
+
+                update_time = self.last_updated_serializer.update_last_updated(
+                    style_id, "du"
+                )
+                self.time_series_serializer.update(
+                    "du", update_time, style_id, size_prices, size_transactions
+                )
+                self.num_updated += 1
+            except KeyError as e:
+                self.num_failed += 1
+                print("get_tick failed {}".format(e))
+            except RuntimeError as e:
+                self.num_failed += 1
+                print("get_tick failed {}".format(e))
+            except json.decoder.JSONDecodeError as e:
+                self.num_failed += 1
+                print("get_tick failed {}".format(e))
+            except SizerError as e:
+                self.num_failed += 1
+                print(e.msg, e.in_code, e.out_code, e.in_size)
+            except requests.exceptions.RequestException as e:
+                self.num_failed += 1
+                print("get_tick failed {}".format(e))
+            self.last_updated_serializer.save_last_updated()
+
+    async def _run(self, jobs, max_page, up_to_time):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.concurrency
+        ) as self.executor:
+            await asyncio.gather(
+                *[
+                    self._update_one(product_id, style_id, max_page, up_to_time)
+                    for product_id, style_id in jobs
+                ]
+            )
+
+    def run(self, jobs, max_page=0, up_to_time=None):
+        """
+        Update every (product_id, style_id) in jobs.
+
+        @param jobs        list of (product_id, style_id)
+        @param max_page    see DuFeed.get_historical_transactions
+        @param up_to_time  see DuFeed.get_historical_transactions
+        """
+        start = time.monotonic()
+        try:
+            asyncio.run(self._run(jobs, max_page, up_to_time))
+        finally:
+            self.elapsed_seconds = time.monotonic() - start
+        return
+
+    def report(self):
+        elapsed = max(self.elapsed_seconds, 1e-9)
+        print(
+            "updated {} products ({} failed) with {} requests in {:.1f} s\n"
+            "  concurrency:    {}\n"
+            "  rate limit:     {}\n"
+            "  products / min: {:.2f}\n"
+            "  requests / s:   {:.2f}".format(
+                self.num_updated,
+                self.num_failed,
+                self.num_requests,
+                self.elapsed_seconds,
+                self.concurrency,
+                "{} / s".format(self.rate_limit) if self.rate_limit else "none",
+                self.num_updated * 60.0 / elapsed,
+                self.num_requests / elapsed,
+            )
+        )
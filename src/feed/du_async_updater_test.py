@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import asyncio
+import datetime
+import threading
+import time
+import unittest
+
+from du_async_updater import DuAsyncUpdater, HostRateLimiter
+from du_feed import DuFeed
+from du_response_parser import SaleRecord
+
+
+class StubFeed(DuFeed):
+    """
+    Serves 3 pages of transactions per product without sending requests,
+    taking a while on each call so that products overlap
+    """
+
+    def __init__(self, failing=()):
+        super().__init__(transport=object())
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # product_id => pages requested, in order
+        self.pages = {}
+
+    def get_size_prices_from_product_id(self, product_id):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        if product_id in self.failing:
+            raise RuntimeError("no size prices for {}".format(product_id))
+        return {"9.5": {"list_price": 100000}}, "men"
+
+    def get_transactions_page(self, page, product_id, in_code):
+        time.sleep(0.005)
+        with self.lock:
+            self.pages.setdefault(product_id, []).append(page)
+        if page == 3:
+            return page + 1, []
+        sales = [
+            SaleRecord(
+                "9.5",
+                100000,
+                "2019-12-{:02d}T00:00:00.000Z".format(20 - page * 2 - i),
+                "{}-{}-{}".format(product_id, page, i),
+            )
+            for i in range(2)
+        ]
+        return page + 1, sales
+
+
+class StubLastUpdated:
+    def __init__(self):
+        self.saved = 0
+
+    def update_last_updated(self, style_id, venue):
+        return datetime.datetime(2019, 12, 21)
+
+    def save_last_updated(self):
+        self.saved += 1
+
+
+class StubTimeSeries:
+    def __init__(self):
+        # (style_id, [transaction ids], thread)
+        self.updates = []
+
+    def get_transaction_watermarks(self, style_id, venue):
+        return {}
+
+    def update(self, venue, update_time, style_id, size_prices, size_transactions):
+        self.updates.append(
+            (
+                style_id,
+                [t["id"] for t in size_transactions.get("9.5", [])],
+                threading.current_thread(),
+            )
+        )
+
+
+class TestDuAsyncUpdater(unittest.TestCase):
+    def setUp(self):
+        self.jobs = [("p{}".format(i), "S{}".format(i)) for i in range(6)]
+        self.feed = StubFeed(failing=["p3"])
+        self.last_updated = StubLastUpdated()
+        self.time_series = StubTimeSeries()
+
+    def test_run(self):
+        updater = DuAsyncUpdater(
+            self.feed, self.last_updated, self.time_series, concurrency=2
+        )
+        updater.run(self.jobs, max_page=5)
+
+        # bounded by the semaphore, yet overlapping
+        self.assertEqual(self.feed.max_in_flight, 2)
+        # pages of a product in order, following the cursor until Du has no more
+        for product_id, _ in self.jobs:
+            if product_id != "p3":
+                self.assertEqual(self.feed.pages[product_id], [0, 1, 2, 3])
+        self.assertNotIn("p3", self.feed.pages)
+
+        self.assertEqual(
+            sorted(u[0] for u in self.time_series.updates),
+            ["S0", "S1", "S2", "S4", "S5"],
+        )
+        for style_id, ids, thread in self.time_series.updates:
+            product_id = "p" + style_id[1:]
+            self.assertEqual(
+                ids,
+                [
+                    "{}-{}-{}".format(product_id, p, i)
+                    for p in range(3)
+                    for i in range(2)
+                ],
+            )
+            # written on the loop thread, not the pool's
+            self.assertIs(thread, threading.main_thread())
+
+        self.assertEqual(updater.num_updated, 5)
+        self.assertEqual(updater.num_failed, 1)
+        # 6 size prices requests, 4 pages of each of the 5 that succeeded
+        self.assertEqual(updater.num_requests, 6 + 5 * 4)
+        self.assertEqual(self.last_updated.saved, 6)
+
+    def test_max_page(self):
+        updater = DuAsyncUpdater(
+            self.feed, self.last_updated, self.time_series, concurrency=4
+        )
+        updater.run(self.jobs[:1], max_page=1)
+        self.assertEqual(self.feed.pages["p0"], [0, 1])
+
+    def test_rate_limit(self):
+        async def acquire_all(limiter, n):
+            start = time.monotonic()
+            starts = []
+            for _ in range(n):
+                await limiter.acquire()
+                starts.append(time.monotonic() - start)
+            return starts
+
+        starts = asyncio.run(acquire_all(HostRateLimiter(20), 5))
+        # spaced 50 ms apart, the first right away
+        self.assertLess(starts[0], 0.02)
+        for previous, current in zip(starts, starts[1:]):
+            self.assertGreater(current - previous, 0.045)
+
+        starts = asyncio.run(acquire_all(HostRateLimiter(None), 5))
+        self.assertLess(starts[-1], 0.02)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,23 +11,27 @@ import argparse
 import pprint
 
 from du_url_builder import DuRequestBuilder
+from du_transport import DuTransport
 from du_response_parser import DuParser, SaleRecord, DuItem
 from last_updated import LastUpdatedSerializer
-from time_series_serializer import TimeSeriesSerializer
+from time_series_serializer import TimeSeriesSerializer, STORAGE_FORMATS
 from static_info_serializer import StaticInfoSerializer
 from sizer import Sizer, SizerError
 from du_analyzer import ItemAnalyzer
+from du_async_updater import DuAsyncUpdater
+from daily_bars import DailyBars
 
 class DuFeed:
-    def __init__(self):
+    def __init__(self, transport=None):
         self.sizer = Sizer()
         self.parser = DuParser(self.sizer)
         self.builder = DuRequestBuilder()
+        self.transport = transport if transport else DuTransport()
 
     def _send_du_request(self, url):
         if __debug__:
             print("request {}".format(url))
-        return requests.get(url=url, headers=DuRequestBuilder.du_headers)
+        return self.transport.get(url)
 
     def search_pages(self, keyword, pages=0, result_items=None):
         print("querying keyword {}".format(keyword))
@@ -125,44 +129,90 @@ class DuFeed:
         for t in transactions:
             if t.size not in result:
                 result[t.size] = []
-            else:
-                result[t.size].append({"price": t.price, "time": t.time, "id": t.id})
+            result[t.size].append({"price": t.price, "time": t.time, "id": t.id})
         return result
 
     def get_historical_transactions(
-        self, product_id, in_code, max_page=0, up_to_time=None, up_to_id=None
+        self,
+        product_id,
+        in_code,
+        max_page=0,
+        up_to_time=None,
+        up_to_id=None,
+        up_to_ids=None,
     ):
-        def get_one_page(page, product_id, in_code):
-            recentsales_list_url = self.builder.get_recentsales_list_url(
-                page, product_id
-            )
-            recentsales_list_response = requests.get(
-                url=recentsales_list_url, headers=DuRequestBuilder.du_headers
-            )
-            return self.parser.parse_recent_sales(
-                recentsales_list_response.text, in_code
-            )
+        """
+        Page through transactions of product_id, newest first, until any of
+          - max_page pages after the first are retrieved,
+          - a page reaches back past up_to_time,
+          - a page contains up_to_id or any of up_to_ids.
+        @return [SaleRecord] newest first
+        """
+        known_ids = set(up_to_ids) if up_to_ids else set()
+        if up_to_id:
+            known_ids.add(up_to_id)
 
         all_sales = []
         page_idx = 0
         while max_page >= 0:
-            page_idx, sales = get_one_page(page_idx, product_id, in_code)
+            page_idx, sales = self.get_transactions_page(page_idx, product_id, in_code)
             if len(sales) == 0:
                 return all_sales
             all_sales += sales
-            if (
-                up_to_time
-                and datetime.datetime.strptime(sales[-1].time, "%Y-%m-%dT%H:%M:%S.%fZ")
-                < up_to_time
-            ):
+            if self.reached_history_limit(sales, up_to_time, known_ids):
                 return all_sales
-            if up_to_id:
-                for sale in all_sales[::-1]:
-                    if sale.id == up_to_id:
-                        return all_sales
             max_page -= 1
         return all_sales
 
+    def get_transactions_page(self, page, product_id, in_code):
+        """
+        Retrieve one page of transactions starting from last id `page`.
+        @return (last_id, [SaleRecord]) where last_id is the cursor to the next page
+        """
+        recentsales_list_url = self.builder.get_recentsales_list_url(page, product_id)
+        recentsales_list_response = self._send_du_request(recentsales_list_url)
+        return self.parser.parse_recent_sales(recentsales_list_response.text, in_code)
+
+    @staticmethod
+    def reached_history_limit(sales, up_to_time=None, known_ids=None):
+        """
+        Whether paging in `get_historical_transactions` should stop after
+        retrieving the page `sales` (newest first).
+        Only the latest page is checked, earlier pages did not hit the limit.
+        """
+        if (
+            up_to_time
+            and datetime.datetime.strptime(sales[-1].time, "%Y-%m-%dT%H:%M:%S.%fZ")
+            < up_to_time
+        ):
+            return True
+        if known_ids:
+            for sale in sales:
+                if sale.id in known_ids:
+                    return True
+        return False
+
+    @staticmethod
+    def get_paging_limits(watermarks, up_to_time=None):
+        """
+        Turn the newest stored transaction per size (see
+        TimeSeriesSerializer.get_transaction_watermarks) into paging limits.
+
+        Stored transactions are a prefix of what Du returns (feed always stores
+        everything newer than the last run), so paging can stop once it sees any
+        stored id. As a fallback for stored ids that no longer show up, paging
+        also stops once it is older than the oldest of the newest stored times.
+
+        @return (up_to_time, up_to_ids)
+        """
+        if not watermarks:
+            return up_to_time, set()
+        up_to_ids = set(w["id"] for w in watermarks.values())
+        watermark_time = min(w["time"] for w in watermarks.values())
+        if not up_to_time or watermark_time > up_to_time:
+            up_to_time = watermark_time
+        return up_to_time, up_to_ids
+
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -171,6 +221,7 @@ def parse_args():
 
         example usage:
           ./du_feed.py --mode update --start_from du.mapping.20191206-211125.csv --min_interval_seconds 3600 --transaction_history_date 20190801 --transaction_history_maxpage 20
+          ./du_feed.py --mode update --start_from merged.20191225.csv --transaction_history_date 20190801 --transaction_history_maxpage 20 --concurrency 16 --rate_limit 10
           ./du_feed.py --mode query --kw aj --pages 2 --start_from du.mapping.20191206-145908.csv
           ./du_feed.py --mode query --kw aj --pages 30
           ./du_feed.py --mode getraw --style_id 575441-028 --start_from merged.20191225.csv
@@ -224,6 +275,39 @@ def parse_args():
         help="in update mode, the furthest back in pages this tries to look for historical transactions\n"
         "this performs an 'and' on all conditions",
     )
+    parser.add_argument(
+        "--storage_format",
+        help="in update mode, how time series are stored, one of {} (default json)".format(
+            STORAGE_FORMATS
+        ),
+    )
+    parser.add_argument(
+        "--full_history",
+        action="store_true",
+        help="in update mode, page back to transaction_history_date / maxpage even for styles with stored transactions\n"
+        "by default paging stops at the newest stored transaction",
+    )
+    parser.add_argument(
+        "--concurrency",
+        help="in update mode, the number of products to update concurrently. Products are updated one by one if not specified",
+    )
+    parser.add_argument(
+        "--rate_limit",
+        help="in update mode with concurrency, the maximum number of requests per second sent to a host",
+    )
+    parser.add_argument(
+        "--pool_size",
+        help="the number of kept-alive connections to Du. Defaults to concurrency in update mode",
+    )
+    parser.add_argument(
+        "--request_timeout_seconds",
+        help="connect and read timeout of each request to Du",
+    )
+    parser.add_argument(
+        "--no_daily_bars",
+        action="store_true",
+        help="in update mode, do not update daily bars (daily_bars.py) of the updated transactions",
+    )
     parser.add_argument(
         "--plot_size",
         help="in gets mode, plot the historical prices of the given size"
@@ -232,8 +316,23 @@ def parse_args():
     return args
 
 
+def make_transport(args):
+    pool_size = 10
+    if args.pool_size:
+        pool_size = int(args.pool_size)
+    elif args.concurrency:
+        pool_size = max(pool_size, int(args.concurrency))
+    if args.request_timeout_seconds:
+        return DuTransport(
+            pool_size=pool_size,
+            connect_timeout=args.request_timeout_seconds,
+            read_timeout=args.request_timeout_seconds,
+        )
+    return DuTransport(pool_size=pool_size)
+
+
 def query_mode(args):
-    feed = DuFeed()
+    feed = DuFeed(make_transport(args))
     serializer = StaticInfoSerializer()
 
     keywords = []
@@ -257,7 +356,7 @@ def query_mode(args):
 
 
 def update_mode(args):
-    feed = DuFeed()
+    feed = DuFeed(make_transport(args))
     serializer = StaticInfoSerializer()
 
     last_updated_file = "last_updated.log"
@@ -267,69 +366,137 @@ def update_mode(args):
     last_updated_serializer = LastUpdatedSerializer(
         last_updated_file, args.min_interval_seconds
     )
-    time_series_serializer = TimeSeriesSerializer()
+    time_series_serializer = TimeSeriesSerializer(
+        storage_format=args.storage_format
+    )
 
     static_info, _ = serializer.load_static_info_from_csv(
         args.start_from, return_key="du_product_id"
     )
-    count = 0
-    try:
+    max_page = (
+        int(args.transaction_history_maxpage)
+        if args.transaction_history_maxpage
+        else 0
+    )
+    up_to_time = (
+        datetime.datetime.strptime(args.transaction_history_date, "%Y%m%d")
+        if args.transaction_history_date
+        else None
+    )
+
+    if args.concurrency and int(args.concurrency) > 1:
+        jobs = []
         for product_id in static_info:
             style_id = static_info[product_id].style_id
             if last_updated_serializer.should_update(style_id, "du"):
-                count += 1
-                if args.limit and count > int(args.limit):
+                if args.limit and len(jobs) >= int(args.limit):
                     break
-                print(
-                    "working with {} style_id {} brand {}".format(
-                        product_id, style_id, static_info[product_id].title
-                    )
-                )
-                try:
-                    size_prices, gender = feed.get_size_prices_from_product_id(product_id)
+                jobs.append((product_id, style_id))
+            else:
+                print("should skip {}".format(product_id))
 
-                    max_page = (
-                        int(args.transaction_history_maxpage)
-                        if args.transaction_history_maxpage
-                        else 0
-                    )
-                    up_to_time = (
-                        datetime.datetime.strptime(
-                            args.transaction_history_date, "%Y%m%d"
+        updater = DuAsyncUpdater(
+            feed,
+            last_updated_serializer,
+            time_series_serializer,
+            concurrency=int(args.concurrency),
+            rate_limit=float(args.rate_limit) if args.rate_limit else None,
+            use_watermarks=not args.full_history,
+        )
+        try:
+            with time_series_serializer.batch():
+                updater.run(jobs, max_page=max_page, up_to_time=up_to_time)
+        except KeyboardInterrupt:
+            last_updated_serializer.save_last_updated()
+            print("Caught KeyboardInterrupt. Saving last_updated and exiting")
+            exit(1)
+        updater.report()
+        feed.transport.stats.report()
+        update_daily_bars(
+            args, time_series_serializer, [style_id for _, style_id in jobs]
+        )
+        return
+
+    count = 0
+    # styles stored this run, the others have nothing new to aggregate
+    updated_style_ids = []
+    with time_series_serializer.batch():
+        try:
+            for product_id in static_info:
+                style_id = static_info[product_id].style_id
+                if last_updated_serializer.should_update(style_id, "du"):
+                    count += 1
+                    if args.limit and count > int(args.limit):
+                        break
+                    print(
+                        "working with {} style_id {} brand {}".format(
+                            product_id, style_id, static_info[product_id].title
                         )
-                        if args.transaction_history_date
-                        else None
-                    )
-                    transactions = feed.get_historical_transactions(
-                        product_id, gender, max_page=max_page, up_to_time=up_to_time
                     )
-                    size_transactions = feed.split_size_transactions(transactions)
+                    try:
+                        size_prices, gender = feed.get_size_prices_from_product_id(product_id)
+
+                        watermarks = (
+                            time_series_serializer.get_transaction_watermarks(
+                                style_id, "du"
+                            )
+                            if not args.full_history
+                            else {}
+                        )
+                        product_up_to_time, up_to_ids = feed.get_paging_limits(
+                            watermarks, up_to_time
+                        )
+                        transactions = feed.get_historical_transactions(
+                            product_id,
+                            gender,
+                            max_page=max_page,
+                            up_to_time=product_up_to_time,
+                            up_to_ids=up_to_ids,
+                        )
+                        size_transactions = feed.split_size_transactions(transactions)
                     
-                    update_time = last_updated_serializer.update_last_updated(
-                        style_id, "du"
-                    )
-                    time_series_serializer.update(
-                        "du", update_time, style_id, size_prices, size_transactions
-                    )
-                except KeyError as e:
-                    print("get_tick failed {}".format(e))
-                except RuntimeError as e:
-                    print("get_tick failed {}".format(e))
-                except json.decoder.JSONDecodeError as e:
-                    print("get_tick failed {}".format(e))
-                except SizerError as e:
-                    print(e.msg, e.in_code, e.out_code, e.in_size)
-                last_updated_serializer.save_last_updated()
-            else:
-                print("should skip {}".format(product_id))
-    except KeyboardInterrupt:
-        last_updated_serializer.save_last_updated()
-        print("Caught KeyboardInterrupt. Saving last_updated and exiting")
-        exit(1)
+                        update_time = last_updated_serializer.update_last_updated(
+                            style_id, "du"
+                        )
+                        time_series_serializer.update(
+                            "du", update_time, style_id, size_prices, size_transactions
+                        )
+                        updated_style_ids.append(style_id)
+                    except KeyError as e:
+                        print("get_tick failed {}".format(e))
+                    except RuntimeError as e:
+                        print("get_tick failed {}".format(e))
+                    except json.decoder.JSONDecodeError as e:
+                        print("get_tick failed {}".format(e))
+                    except SizerError as e:
+                        print(e.msg, e.in_code, e.out_code, e.in_size)
+                    except requests.exceptions.RequestException as e:
+                        print("get_tick failed {}".format(e))
+                    last_updated_serializer.save_last_updated()
+                else:
+                    print("should skip {}".format(product_id))
+        except KeyboardInterrupt:
+            last_updated_serializer.save_last_updated()
+            print("Caught KeyboardInterrupt. Saving last_updated and exiting")
+            exit(1)
+    feed.transport.stats.report()
+    update_daily_bars(args, time_series_serializer, updated_style_ids)
+
+
+def update_daily_bars(args, time_series_serializer, style_ids):
+    """
+    Aggregate what the update stored of style_ids into daily bars, only the
+    styles with new transactions are read
+    """
+    if args.no_daily_bars:
+        return
+    DailyBars(time_series_serializer.parent_folder).update(
+        time_series_serializer, "du", style_ids
+    )
 
 
 def get_mode(args):
-    feed = DuFeed()
+    feed = DuFeed(make_transport(args))
     serializer = StaticInfoSerializer()
     pp = pprint.PrettyPrinter()
 
@@ -388,7 +555,7 @@ def get_mode(args):
             reversed_t = transactions[::-1]
             for t in reversed_t:
                 t.size = t.size.strip().strip('Y')
-            filtered_t = [t for in reversed_t if float(t.size) == float(args.plot_size)]
+            filtered_t = [t for t in reversed_t if float(t.size) == float(args.plot_size)]
             
             if args.style_id:
                 fig_filename = "{}.{}.png".format(args.style_id, args.plot_size)
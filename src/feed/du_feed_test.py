@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import datetime
+import unittest
+
+from du_feed import DuFeed
+from du_response_parser import SaleRecord
+
+
+def make_sale(i):
+    """
+    Sale i happened i hours after 2019-12-01
+    """
+    time = datetime.datetime(2019, 12, 1) + datetime.timedelta(hours=i)
+    return SaleRecord("9.5", 100000 + i, time.isoformat() + ".000Z", "s{}".format(i))
+
+
+class TestPaging(unittest.TestCase):
+    def setUp(self):
+        # page cursor => (next cursor, sales newest first): s11..s8, s7..s4, s3..s0
+        self.pages = {
+            0: (1, [make_sale(i) for i in range(11, 7, -1)]),
+            1: (2, [make_sale(i) for i in range(7, 3, -1)]),
+            2: (3, [make_sale(i) for i in range(3, -1, -1)]),
+            3: (4, []),
+        }
+        self.requested = []
+        # never sends requests, pages are served from self.pages
+        self.feed = DuFeed(transport=object())
+        self.feed.get_transactions_page = self.get_transactions_page
+
+    def get_transactions_page(self, page, product_id, in_code):
+        self.requested.append(page)
+        return self.pages[page]
+
+    def get_ids(self, watermarks, max_page=10):
+        up_to_time, up_to_ids = DuFeed.get_paging_limits(watermarks)
+        sales = self.feed.get_historical_transactions(
+            "1", "men", max_page=max_page, up_to_time=up_to_time, up_to_ids=up_to_ids
+        )
+        return [s.id for s in sales]
+
+    def test_paging_limits(self):
+        self.assertEqual(DuFeed.get_paging_limits({}), (None, set()))
+        up_to_time = datetime.datetime(2019, 11, 1)
+        self.assertEqual(DuFeed.get_paging_limits({}, up_to_time), (up_to_time, set()))
+        watermarks = {
+            "9.5": {"id": "s6", "time": datetime.datetime(2019, 12, 1, 6)},
+            "10.0": {"id": "x", "time": datetime.datetime(2019, 12, 1, 2)},
+        }
+        # stops at any stored id, or past the oldest of the newest stored times
+        self.assertEqual(
+            DuFeed.get_paging_limits(watermarks, up_to_time),
+            (datetime.datetime(2019, 12, 1, 2), {"s6", "x"}),
+        )
+
+    def test_stop_at_watermark_id(self):
+        # its time alone would page back to the end
+        ids = self.get_ids(
+            {"9.5": {"id": "s6", "time": datetime.datetime(2019, 11, 1)}}
+        )
+        # the page holding s6 is the last requested
+        self.assertEqual(self.requested, [0, 1])
+        self.assertEqual(ids, ["s{}".format(i) for i in range(11, 3, -1)])
+
+    def test_stop_at_watermark_time(self):
+        # the stored id no longer shows up, the page reaching back past its
+        # time is the last requested
+        ids = self.get_ids(
+            {"9.5": {"id": "gone", "time": datetime.datetime(2019, 12, 1, 5)}}
+        )
+        self.assertEqual(self.requested, [0, 1])
+        self.assertEqual(len(ids), 8)
+
+    def test_full_history(self):
+        # --full_history pages without watermarks, until Du has no more
+        ids = self.get_ids({})
+        self.assertEqual(self.requested, [0, 1, 2, 3])
+        self.assertEqual(ids, ["s{}".format(i) for i in range(11, -1, -1)])
+        # or until max_page pages after the first
+        self.requested = []
+        self.assertEqual(len(self.get_ids({}, max_page=1)), 8)
+        self.assertEqual(self.requested, [0, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
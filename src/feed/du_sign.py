@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+
+import hashlib
+
+"""
+In-process implementation of getSign in sign.js.
+
+getSign is the md5 (crypt / charenc based) of the utf-8 encoded parameter
+string, rendered as lower case hex, which hashlib does without spawning a JS
+runtime per signature.
+"""
+
+
+def get_sign(payload):
+    """
+    @param payload  str concatenated request parameters and salt
+    @return str the 32 character hex sign, equal to getSign(payload) in sign.js
+    """
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
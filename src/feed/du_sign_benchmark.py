@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+
+from du_url_builder import DuRequestBuilder
+
+"""
+Signatures / second of the native signer vs getSign in sign.js through execjs.
+
+example usage:
+    ./du_sign_benchmark.py --n 20000 --n_js 50
+"""
+
+
+def bench(builder, n):
+    start = time.perf_counter()
+    for i in range(n):
+        builder.get_recentsales_list_url(i, 40755)
+    elapsed = time.perf_counter() - start
+    return n / elapsed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("benchmark Du request signing")
+    parser.add_argument("--n", default=20000, help="signatures to time natively")
+    parser.add_argument(
+        "--n_js", default=50, help="signatures to time through execjs, 0 to skip"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    native_rate = bench(DuRequestBuilder(sign_impl="native"), int(args.n))
+    print("native: {:.0f} signatures / s".format(native_rate))
+    if int(args.n_js) > 0:
+        js_rate = bench(DuRequestBuilder(sign_impl="js"), int(args.n_js))
+        print("execjs: {:.2f} signatures / s".format(js_rate))
+        print("speedup: {:.0f}x".format(native_rate / js_rate))
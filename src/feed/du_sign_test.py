@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from du_sign import get_sign
+from du_url_builder import DuRequestBuilder
+
+try:
+    import execjs
+except ImportError:
+    execjs = None
+
+SALT = "19bc545a393a25177083d4a748807cc0"
+
+# (payload, getSign(payload)) recorded from sign.js under node
+RECORDED = [
+    (
+        "lastId0limit20productId40755sourceAppapp" + SALT,
+        "fe256a8d25b43db9ba1f0f6a9b64ff76",
+    ),
+    (
+        "lastId12345limit20productId53489sourceAppapp" + SALT,
+        "0211ba24437527cc91906d43251ba38d",
+    ),
+    (
+        "limit20page0sortMode1sortType0titleajunionId" + SALT,
+        "4328be072c5da75fec5e1a4ce1ac2597",
+    ),
+    (
+        "limit20page3sortMode1sortType0titleair jordan 1unionId" + SALT,
+        "835a6a92fb30ccebfe2e849b6aec3ce6",
+    ),
+    (
+        "limit20page0sortMode1sortType0title乔丹unionId" + SALT,
+        "075d87cbc8209ca85d64d21b5e5d7c20",
+    ),
+    ("lastId1limit20tabId4" + SALT, "66382023a2ef234b07932b8b63eb58cf"),
+    ("productId53489productSourceNamewx" + SALT, "05434c143dc024fdf4bf2efe47d5832f"),
+    ("", "d41d8cd98f00b204e9800998ecf8427e"),
+    ("x" * 120, "fb98667f98096de92620b64f46e1c5b5"),
+]
+
+
+class TestNativeSign(unittest.TestCase):
+    def test_recorded(self):
+        for payload, sign in RECORDED:
+            self.assertEqual(get_sign(payload), sign, payload)
+
+    def test_builder_urls(self):
+        builder = DuRequestBuilder()
+        self.assertTrue(
+            builder.get_recentsales_list_url(0, 40755).endswith(
+                "sign=fe256a8d25b43db9ba1f0f6a9b64ff76"
+            )
+        )
+        self.assertTrue(
+            builder.get_search_by_keywords_url("乔丹", 0, 1, 0).endswith(
+                "sign=075d87cbc8209ca85d64d21b5e5d7c20"
+            )
+        )
+        self.assertTrue(
+            builder.get_brand_list_url(1, 4).endswith(
+                "sign=66382023a2ef234b07932b8b63eb58cf"
+            )
+        )
+        self.assertTrue(
+            builder.get_product_detail_url(53489).endswith(
+                "sign=05434c143dc024fdf4bf2efe47d5832f"
+            )
+        )
+
+    @unittest.skipIf(execjs is None, "execjs is not installed")
+    def test_against_sign_js(self):
+        js_builder = DuRequestBuilder(sign_impl="js")
+        for payload, _ in RECORDED:
+            self.assertEqual(get_sign(payload), js_builder.sign(payload), payload)
+
+
+if __name__ == "__main__":
+    unittest.main()
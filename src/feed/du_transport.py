@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from du_url_builder import DuRequestBuilder
+
+"""
+Shared HTTP transport for Du requests.
+
+One requests.Session with a connection pool, so consecutive requests to
+app.poizon.com reuse a kept-alive TCP + TLS connection instead of handshaking
+every time. Responses are gzip-encoded (see du_headers) and decoded by requests.
+
+Each request's latency is split into
+  - connect: TCP connect + TLS handshake, 0 if a pooled connection was reused,
+  - ttfb:    from sending the request to having the response headers, less connect,
+  - body:    reading (and decompressing) the response body.
+"""
+
+# connect time of the request in flight on this thread, set by _Timed*Connection
+_timing = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _timing.connect_seconds += time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _timing.connect_seconds += time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class TransportStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connect = []
+        self.ttfb = []
+        self.body = []
+        self.num_errors = 0
+        return
+
+    def record(self, connect_seconds, ttfb_seconds, body_seconds):
+        with self.lock:
+            self.connect.append(connect_seconds)
+            self.ttfb.append(ttfb_seconds)
+            self.body.append(body_seconds)
+
+    def record_error(self):
+        with self.lock:
+            self.num_errors += 1
+
+    def report(self):
+        num_requests = len(self.connect)
+        if num_requests == 0:
+            print("transport: no requests sent")
+            return
+        connect = np.array(self.connect)
+        num_connections = int(np.count_nonzero(connect))
+        lines = [
+            "transport: {} requests, {} new connections, {} errors".format(
+                num_requests, num_connections, self.num_errors
+            ),
+            "  {:8s} {:>10s} {:>10s} {:>10s} {:>10s}".format(
+                "phase", "total s", "mean ms", "p50 ms", "p95 ms"
+            ),
+        ]
+        for name, values in [
+            ("connect", connect),
+            ("ttfb", np.array(self.ttfb)),
+            ("body", np.array(self.body)),
+        ]:
+            lines.append(
+                "  {:8s} {:10.2f} {:10.1f} {:10.1f} {:10.1f}".format(
+                    name,
+                    values.sum(),
+                    values.mean() * 1000,
+                    np.percentile(values, 50) * 1000,
+                    np.percentile(values, 95) * 1000,
+                )
+            )
+        if num_connections > 0:
+            lines.append(
+                "  {:.1f} ms per new connection".format(
+                    connect.sum() / num_connections * 1000
+                )
+            )
+        print("\n".join(lines))
+
+
+class DuTransport:
+    def __init__(self, pool_size=10, connect_timeout=10, read_timeout=30):
+        """
+        @param pool_size        connections kept alive per host, should be at
+            least the number of threads sending requests
+        @param connect_timeout  seconds
+        @param read_timeout     seconds
+        """
+        self.session = requests.Session()
+        self.session.headers.update(DuRequestBuilder.du_headers)
+        adapter = _TimedHTTPAdapter(pool_connections=1, pool_maxsize=int(pool_size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeout = (float(connect_timeout), float(read_timeout))
+        self.stats = TransportStats()
+        return
+
+    def get(self, url):
+        _timing.connect_seconds = 0
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url=url, timeout=self.timeout, stream=True)
+            headers_received = time.perf_counter()
+            # reads and decodes the whole body, releasing the connection to the pool
+            response.content
+        except requests.exceptions.RequestException:
+            self.stats.record_error()
+            raise
+        end = time.perf_counter()
+        connect = _timing.connect_seconds
+        self.stats.record(
+            connect, headers_received - start - connect, end - headers_received
+        )
+        return response
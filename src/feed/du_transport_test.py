@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import http.server
+import socket
+import threading
+import unittest
+
+import requests
+
+from du_transport import DuTransport, TransportStats
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # keep-alive, as app.poizon.com
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/missing":
+            self.send_error(404)
+            return
+        body = b'{"status": 200}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TestDuTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.transport = DuTransport(connect_timeout=1, read_timeout=5)
+
+    def tearDown(self):
+        self.transport.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_keep_alive(self):
+        for _ in range(3):
+            response = self.transport.get(self.url + "/product")
+            self.assertEqual(response.json(), {"status": 200})
+        stats = self.transport.stats
+        self.assertEqual(len(stats.ttfb), 3)
+        self.assertEqual(len(stats.body), 3)
+        # connected once, the connection reused afterwards
+        self.assertGreater(stats.connect[0], 0)
+        self.assertEqual(stats.connect[1:], [0, 0])
+        self.assertEqual(stats.num_errors, 0)
+
+    def test_errors(self):
+        # an http error status is a response, left to the caller
+        response = self.transport.get(self.url + "/missing")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.transport.stats.num_errors, 0)
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.transport.get("http://127.0.0.1:{}/".format(closed_port()))
+        self.assertEqual(self.transport.stats.num_errors, 1)
+        # only requests answered are timed
+        self.assertEqual(len(self.transport.stats.connect), 1)
+
+
+class TestTransportStats(unittest.TestCase):
+    def test_record(self):
+        stats = TransportStats()
+        threads = [
+            threading.Thread(
+                target=lambda: [stats.record(0, 0.1, 0.01) for _ in range(100)]
+            )
+            for _ in range(4)
+        ]
+        threads.append(threading.Thread(target=stats.record_error))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(stats.connect), 400)
+        self.assertEqual(len(stats.ttfb), 400)
+        self.assertEqual(len(stats.body), 400)
+        self.assertEqual(stats.num_errors, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
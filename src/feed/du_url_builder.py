@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-import execjs
+from du_sign import get_sign
 
 
 class DuRequestBuilder:
@@ -16,17 +16,28 @@ class DuRequestBuilder:
         "Accept": "*/*",
     }
 
-    def __init__(self):
+    def __init__(self, sign_impl="native"):
+        """
+        @param sign_impl  "native" signs in process (du_sign.py), "js" evaluates
+            getSign in sign.js through execjs
+        """
         self.salt = "19bc545a393a25177083d4a748807cc0"
         self.base_url = "https://app.poizon.com/api/v1/h5"
 
-        with open("sign.js", "r", encoding="utf-8") as f:
-            self.ctx = execjs.compile(f.read())
+        if sign_impl == "native":
+            self.sign = get_sign
+        elif sign_impl == "js":
+            import execjs
+
+            with open("sign.js", "r", encoding="utf-8") as f:
+                self.ctx = execjs.compile(f.read())
+            self.sign = lambda payload: self.ctx.call("getSign", payload)
+        else:
+            raise RuntimeError("unrecognized sign_impl {}".format(sign_impl))
 
     def get_recentsales_list_url(self, last_id, product_id, limit=20):
         # recent sales
-        sign = self.ctx.call(
-            "getSign",
+        sign = self.sign(
             "lastId{}limit{}productId{}sourceAppapp{}".format(
                 last_id, limit, product_id, self.salt
             ),
@@ -41,8 +52,7 @@ class DuRequestBuilder:
 
     def get_search_by_keywords_url(self, title, page, sort_mode, sort_type, limit=20):
         # search by keyword
-        sign = self.ctx.call(
-            "getSign",
+        sign = self.sign(
             "limit{}page{}sortMode{}sortType{}title{}unionId{}".format(
                 limit, page, sort_mode, sort_type, title, self.salt
             ),
@@ -58,8 +68,7 @@ class DuRequestBuilder:
 
     def get_brand_list_url(self, last_id, tab_id, limit=20):
         # list
-        sign = self.ctx.call(
-            "getSign",
+        sign = self.sign(
             "lastId{}limit{}tabId{}{}".format(last_id, limit, tab_id, self.salt),
         )
         url = (
@@ -70,8 +79,8 @@ class DuRequestBuilder:
 
     def get_product_detail_url(self, product_id):
         # product details
-        sign = self.ctx.call(
-            "getSign", "productId{}productSourceNamewx{}".format(product_id, self.salt)
+        sign = self.sign(
+            "productId{}productSourceNamewx{}".format(product_id, self.salt)
         )
         url = (
             self.base_url + "/index/fire/flow/product/detail?"
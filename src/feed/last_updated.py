@@ -31,6 +31,11 @@ class LastUpdatedSerializer:
         with open(self.dst_file_path) as infile:
             rr = csv.reader(infile)
             for row in rr:
+                if len(row) > 0 and row[0] == "style_id":
+                    # written by last_updated.js, with a header naming the venues:
+                    # style_id,stockx_last_updated
+                    self.columns = [c.replace("_last_updated", "") for c in row[1:]]
+                    continue
                 style_id = row[0]
                 self.last_updated[style_id] = {}
 
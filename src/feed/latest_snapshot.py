@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import pathlib
+
+from time_series_json import get_new_transactions, parse_time
+
+"""
+Compact index of the newest reading of every (style_id, size), kept next to
+the time series in the data folder so that readers only interested in the
+latest prices (e.g. strategy) need not parse whole histories.
+
+One file per venue, latest_snapshot.{venue}.json, so that writers of
+different venues (du_feed.py, stockx_feed.js) do not overwrite each other:
+  {style_id : {size : {
+      "price":            newest price reading, as stored
+      "transaction":      newest transaction, as stored, or None
+      "transaction_time": time of the latest transaction (by time, not order)
+      "num_prices":       number of price readings stored
+      "num_transactions": number of transactions stored
+  }}}
+
+TimeSeriesSerializer.update keeps it up to date incrementally. Rebuild it
+from the full history with
+    ./latest_snapshot.py --mode build --data_folder ../data
+"""
+
+
+def snapshot_file(parent_folder, venue):
+    return os.path.join(parent_folder, "latest_snapshot.{}.json".format(venue))
+
+
+def make_entry():
+    return {
+        "price": None,
+        "transaction": None,
+        "transaction_time": None,
+        "num_prices": 0,
+        "num_transactions": 0,
+    }
+
+
+def update_entry(entry, prices, transactions):
+    """
+    Fold in readings appended to a time series.
+    @param prices        new price records, newest first
+    @param transactions  transactions, newest first, may overlap with what was
+        folded in before (as they come from the feed)
+    """
+    if len(prices) > 0:
+        entry["price"] = prices[0]
+        entry["num_prices"] += len(prices)
+    if entry["transaction"] is not None:
+        transactions = get_new_transactions(transactions, entry["transaction"]["id"])
+    if len(transactions) > 0:
+        entry["transaction"] = transactions[0]
+        entry["num_transactions"] += len(transactions)
+        newest = max(transactions, key=lambda t: parse_time(t["time"]))["time"]
+        if entry["transaction_time"] is None or parse_time(newest) > parse_time(
+            entry["transaction_time"]
+        ):
+            entry["transaction_time"] = newest
+    return entry
+
+
+class LatestSnapshot:
+    def __init__(self, parent_folder):
+        self.parent_folder = parent_folder
+        # venue => {style_id : {size : entry}}, loaded on first use
+        self.venues = {}
+        self.dirty = set()
+        # venues with a file in parent_folder, listed on first use
+        self.listed = None
+        return
+
+    def get_venue(self, venue):
+        if venue not in self.venues:
+            infile_path = snapshot_file(self.parent_folder, venue)
+            if os.path.isfile(infile_path):
+                with open(infile_path, "r") as infile:
+                    self.venues[venue] = json.loads(infile.read())
+            else:
+                self.venues[venue] = {}
+        return self.venues[venue]
+
+    def update(self, venue, style_id, size, prices, transactions):
+        style = self.get_venue(venue).setdefault(style_id, {})
+        if size not in style:
+            style[size] = make_entry()
+        update_entry(style[size], prices, transactions)
+        self.dirty.add(venue)
+        return
+
+    def save(self):
+        """
+        Write out venues updated since the last save
+        """
+        pathlib.Path(self.parent_folder).mkdir(parents=True, exist_ok=True)
+        for venue in self.dirty:
+            outfile_path = snapshot_file(self.parent_folder, venue)
+            with open(outfile_path + ".tmp", "w") as outfile:
+                outfile.write(json.dumps(self.venues[venue]))
+            os.replace(outfile_path + ".tmp", outfile_path)
+        self.dirty = set()
+        return
+
+    def get(self, style_id):
+        """
+        In the shape of TimeSeriesSerializer.get, but each venue only holds its
+        newest price and transaction:
+        {size : {venue : {"prices": [newest], "transactions": [newest],
+                          "snapshot": entry}}}
+        """
+        size_prices = {}
+        for venue in self.get_venues():
+            for size, entry in self.get_venue(venue).get(style_id, {}).items():
+                size_prices.setdefault(size, {})[venue] = {
+                    "prices": [entry["price"]] if entry["price"] else [],
+                    "transactions": (
+                        [entry["transaction"]] if entry["transaction"] else []
+                    ),
+                    "snapshot": entry,
+                }
+        return size_prices
+
+    def get_venues(self):
+        prefix = "latest_snapshot."
+        if self.listed is None:
+            self.listed = set()
+            if os.path.isdir(self.parent_folder):
+                for f in os.listdir(self.parent_folder):
+                    if f.startswith(prefix) and f.endswith(".json"):
+                        self.listed.add(f[len(prefix) : -len(".json")])
+        return sorted(self.listed | set(self.venues))
+
+    def relist(self):
+        """
+        List the venue files of parent_folder again on next use, e.g. to pick
+        up a venue another process started writing
+        """
+        self.listed = None
+        return
+
+    def reload(self, venue):
+        """
+        Read venue from its file again on next use, e.g. after another process
+        saved it
+        @return the venue as it was
+        """
+        self.relist()
+        return self.venues.pop(venue, {})
+
+    def build(self, serializer):
+        """
+        Rebuild every venue from the full history in serializer (a
+        TimeSeriesSerializer)
+        """
+        venues = {}
+        for style_id in serializer.get_style_ids():
+            try:
+                size_prices = serializer.get(style_id)
+            except FileNotFoundError:
+                continue
+            for size in size_prices:
+                for venue, data in size_prices[size].items():
+                    style = venues.setdefault(venue, {}).setdefault(style_id, {})
+                    style[size] = update_entry(
+                        make_entry(),
+                        data.get("prices", []),
+                        data.get("transactions", []),
+                    )
+        self.venues = venues
+        self.dirty = set(venues)
+        self.save()
+        return
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("""
+        latest snapshot maintenance.
+
+        example usage:
+          ./latest_snapshot.py --mode build --data_folder ../data
+    """)
+    parser.add_argument("--mode", help="[build]")
+    parser.add_argument(
+        "--data_folder", help="the data folder to operate on", default="../data"
+    )
+    parser.add_argument(
+        "--storage_format", help="how time series in data_folder are stored"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from time_series_serializer import TimeSeriesSerializer
+
+    args = parse_args()
+    if args.mode == "build":
+        LatestSnapshot(args.data_folder).build(
+            TimeSeriesSerializer(args.data_folder, args.storage_format)
+        )
+    else:
+        raise RuntimeError("Unsupported mode {}".format(args.mode))
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import json
+import os
+import pathlib
+
+import numpy as np
+
+from time_series_json import parse_time
+from time_series_serializer import TimeSeriesSerializer, STORAGE_FORMATS
+
+"""
+Columnar copy of a data folder, for readers that want whole histories as
+arrays rather than one dict per reading.
+
+Layout of the columnar folder:
+  index.json                         keys [[style_id, size], ...] and venues
+  prices.{column}.npy                one row per price reading
+  transactions.{column}.npy          one row per transaction
+  {prices|transactions}.offsets.npy  rows of (key, venue) k * len(venues) + v
+                                     are [offsets[i], offsets[i + 1])
+
+Rows are grouped by (key, venue) and ordered oldest first within a group.
+Times are int64 microseconds since epoch (UTC), viewable as datetime64[us];
+missing prices are nan. Arrays are opened memory-mapped, slicing a (key,
+venue) reads only its pages.
+
+Built from a data folder with
+    ./time_series_columnar.py --data_folder ../data --output ../data.columnar
+"""
+
+PRICE_COLUMNS = [
+    "bid_price",
+    "ask_price",
+    "list_price",
+    "annual_high",
+    "annual_low",
+    "volatility",
+    "sale_72_hours",
+    "number_asks",
+    "number_bids",
+]
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def to_epoch_us(time_str):
+    return (parse_time(time_str) - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def from_epoch_us(epoch_us):
+    return EPOCH + datetime.timedelta(microseconds=int(epoch_us))
+
+
+def build_columnar(serializer, output_folder, style_ids=None):
+    """
+    Write every reading in serializer (a TimeSeriesSerializer) for style_ids
+    (default all) to output_folder.
+    """
+    if style_ids is None:
+        style_ids = serializer.get_style_ids()
+
+    keys = []
+    venues = []
+    # (key_idx, venue) => (prices, transactions), both newest first
+    groups = {}
+    for style_id in style_ids:
+        try:
+            size_prices = serializer.get(style_id)
+        except FileNotFoundError:
+            continue
+        for size in sorted(size_prices):
+            key_idx = len(keys)
+            keys.append([style_id, size])
+            for venue in size_prices[size]:
+                if venue not in venues:
+                    venues.append(venue)
+                groups[(key_idx, venue)] = (
+                    size_prices[size][venue].get("prices", []),
+                    size_prices[size][venue].get("transactions", []),
+                )
+
+    prices = {c: [] for c in ["time"] + PRICE_COLUMNS}
+    transactions = {"time": [], "price": [], "id": []}
+    prices_offsets = [0]
+    transactions_offsets = [0]
+    for key_idx in range(len(keys)):
+        for venue in venues:
+            venue_prices, venue_transactions = groups.get((key_idx, venue), ([], []))
+            for p in venue_prices[::-1]:
+                prices["time"].append(to_epoch_us(p["time"]))
+                for c in PRICE_COLUMNS:
+                    value = p.get(c)
+                    prices[c].append(np.nan if value is None else value)
+            for t in venue_transactions[::-1]:
+                transactions["time"].append(to_epoch_us(t["time"]))
+                transactions["price"].append(t["price"])
+                transactions["id"].append(t.get("id") or "")
+            prices_offsets.append(len(prices["time"]))
+            transactions_offsets.append(len(transactions["time"]))
+
+    pathlib.Path(output_folder).mkdir(parents=True, exist_ok=True)
+    np.save(
+        os.path.join(output_folder, "prices.time.npy"),
+        np.array(prices["time"], dtype=np.int64),
+    )
+    for c in PRICE_COLUMNS:
+        np.save(
+            os.path.join(output_folder, "prices.{}.npy".format(c)),
+            np.array(prices[c], dtype=np.float64),
+        )
+    np.save(
+        os.path.join(output_folder, "prices.offsets.npy"),
+        np.array(prices_offsets, dtype=np.int64),
+    )
+    np.save(
+        os.path.join(output_folder, "transactions.time.npy"),
+        np.array(transactions["time"], dtype=np.int64),
+    )
+    np.save(
+        os.path.join(output_folder, "transactions.price.npy"),
+        np.array(transactions["price"], dtype=np.float64),
+    )
+    # wide enough for the longest id, fixed width strings truncate silently
+    ids = [str(i).encode("utf-8") for i in transactions["id"]]
+    np.save(
+        os.path.join(output_folder, "transactions.id.npy"),
+        np.array(ids, dtype="S{}".format(max([len(i) for i in ids] + [1]))),
+    )
+    np.save(
+        os.path.join(output_folder, "transactions.offsets.npy"),
+        np.array(transactions_offsets, dtype=np.int64),
+    )
+    with open(os.path.join(output_folder, "index.json"), "w") as outfile:
+        outfile.write(json.dumps({"keys": keys, "venues": venues}))
+    print(
+        "wrote {} (style_id, size), {} price readings, {} transactions to {}".format(
+            len(keys), len(prices["time"]), len(transactions["time"]), output_folder
+        )
+    )
+    return
+
+
+class ColumnarTimeSeriesReader:
+    def __init__(self, columnar_folder):
+        self.folder = columnar_folder
+        with open(os.path.join(columnar_folder, "index.json"), "r") as infile:
+            index = json.loads(infile.read())
+        self.keys = [tuple(k) for k in index["keys"]]
+        self.key_idx = {k: i for i, k in enumerate(self.keys)}
+        self.venues = index["venues"]
+        self.venue_idx = {v: i for i, v in enumerate(self.venues)}
+        self.style_sizes = {}
+        for style_id, size in self.keys:
+            self.style_sizes.setdefault(style_id, []).append(size)
+
+        self.prices = {
+            c: self._load("prices.{}.npy".format(c)) for c in ["time"] + PRICE_COLUMNS
+        }
+        self.prices_offsets = self._load("prices.offsets.npy")
+        self.transactions = {
+            c: self._load("transactions.{}.npy".format(c))
+            for c in ["time", "price", "id"]
+        }
+        self.transactions_offsets = self._load("transactions.offsets.npy")
+        return
+
+    def _load(self, filename):
+        return np.load(os.path.join(self.folder, filename), mmap_mode="r")
+
+    def _group(self, style_id, size, venue):
+        if (style_id, size) not in self.key_idx or venue not in self.venue_idx:
+            return None
+        return self.key_idx[(style_id, size)] * len(self.venues) + self.venue_idx[venue]
+
+    def _slice(self, offsets, group):
+        if group is None:
+            return slice(0, 0)
+        return slice(int(offsets[group]), int(offsets[group + 1]))
+
+    def get_style_ids(self):
+        return sorted(self.style_sizes)
+
+    def get_sizes(self, style_id):
+        return self.style_sizes.get(style_id, [])
+
+    def get_prices(self, style_id, size, venue):
+        """
+        @return {column : array} oldest first, time in epoch microseconds
+        """
+        s = self._slice(self.prices_offsets, self._group(style_id, size, venue))
+        return {c: self.prices[c][s] for c in self.prices}
+
+    def get_transactions(self, style_id, size, venue):
+        """
+        @return {"time": int64 array, "price": float array, "id": bytes array}
+            oldest first, time in epoch microseconds
+        """
+        s = self._slice(self.transactions_offsets, self._group(style_id, size, venue))
+        return {c: self.transactions[c][s] for c in self.transactions}
+
+    def get_latest_price(self, style_id, size, venue):
+        """
+        The newest price reading as stored in the json format, None if there is none
+        """
+        s = self._slice(self.prices_offsets, self._group(style_id, size, venue))
+        if s.stop == s.start:
+            return None
+        i = s.stop - 1
+        record = {
+            "time": from_epoch_us(self.prices["time"][i]).isoformat(
+                timespec="microseconds"
+            )
+            + "Z"
+        }
+        for c in PRICE_COLUMNS:
+            value = float(self.prices[c][i])
+            record[c] = None if np.isnan(value) else value
+        return record
+
+    def get_latest_transaction(self, style_id, size, venue):
+        """
+        The newest transaction as stored in the json format, None if there is none
+        """
+        s = self._slice(self.transactions_offsets, self._group(style_id, size, venue))
+        if s.stop == s.start:
+            return None
+        i = s.stop - 1
+        return {
+            "price": float(self.transactions["price"][i]),
+            "time": from_epoch_us(self.transactions["time"][i]).isoformat(
+                timespec="microseconds"
+            )
+            + "Z",
+            "id": self.transactions["id"][i].decode("utf-8"),
+        }
+
+    def get_compact(self, style_id):
+        """
+        Like TimeSeriesSerializer.get, but each venue only holds its newest price
+        and transaction, plus the whole transaction history as arrays:
+        {size : {venue : {"prices": [newest], "transactions": [newest],
+                          "transaction_arrays": {"time": datetime64[us], "price": float}}}}
+        """
+        size_prices = {}
+        for size in self.get_sizes(style_id):
+            size_prices[size] = {}
+            for venue in self.venues:
+                latest_price = self.get_latest_price(style_id, size, venue)
+                latest_transaction = self.get_latest_transaction(style_id, size, venue)
+                if latest_price is None and latest_transaction is None:
+                    continue
+                transactions = self.get_transactions(style_id, size, venue)
+                size_prices[size][venue] = {
+                    "prices": [latest_price] if latest_price else [],
+                    "transactions": [latest_transaction] if latest_transaction else [],
+                    "transaction_arrays": {
+                        "time": transactions["time"].view("datetime64[us]"),
+                        "price": transactions["price"],
+                    },
+                }
+        return size_prices
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("""
+        build a columnar copy of a data folder.
+
+        example usage:
+          ./time_series_columnar.py --data_folder ../data --output ../data.columnar
+    """)
+    parser.add_argument(
+        "--data_folder", default="../data", help="the data folder to read"
+    )
+    parser.add_argument(
+        "--storage_format",
+        help="how time series in data_folder are stored, one of {} (default json)".format(
+            STORAGE_FORMATS
+        ),
+    )
+    parser.add_argument("--output", help="the columnar folder to write")
+    args = parser.parse_args()
+    if not args.output:
+        raise RuntimeError("args.output is required")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    build_columnar(
+        TimeSeriesSerializer(args.data_folder, args.storage_format), args.output
+    )
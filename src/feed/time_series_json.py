@@ -0,0 +1,196 @@
+import json
+import os
+import glob
+import pathlib
+import datetime
+
+import numpy as np
+
+
+def parse_time(time_str):
+    """
+    Parse a stored price / transaction time string.
+    Du and stockx times are iso8601 with or without "Z", very early Du readings
+    use %Y%m%d-%H%M%S.
+    """
+    for fmt in [
+        "%Y-%m-%dT%H:%M:%S.%fZ",
+        "%Y-%m-%dT%H:%M:%S.%f",
+        "%Y-%m-%dT%H:%M:%SZ",
+        "%Y-%m-%dT%H:%M:%S",
+        "%Y%m%d-%H%M%S",
+    ]:
+        try:
+            return datetime.datetime.strptime(time_str, fmt)
+        except ValueError:
+            pass
+    raise ValueError("unrecognized time {}".format(time_str))
+
+
+def parse_times(time_strs):
+    """
+    Bulk parse_time into a datetime64[us] array. Iso8601 strings are converted
+    by numpy in one go, falling back to parse_time one by one for others.
+    """
+    stripped = [t[:-1] if t.endswith("Z") else t for t in time_strs]
+    try:
+        return np.array(stripped, dtype="datetime64[us]")
+    except ValueError:
+        return np.array([parse_time(t) for t in time_strs], dtype="datetime64[us]")
+
+
+def make_price_record(update_time, prices):
+    return {
+        "time": update_time.isoformat() + "Z",
+        "bid_price": prices["bid_price"] if "bid_price" in prices else None,
+        "ask_price": prices["ask_price"] if "ask_price" in prices else None,
+        "list_price": prices["list_price"] if "list_price" in prices else None,
+    }
+
+
+def get_new_transactions(transactions, last_id):
+    """
+    The prefix of transactions (newest first) that is newer than last_id.
+    """
+    idx = 0
+    for t in transactions:
+        if t["id"] == last_id:
+            break
+        else:
+            idx += 1
+    return transactions[:idx]
+
+
+class JsonTimeSeriesStore:
+    """
+    One {style_id}/{size}.json document per (style_id, size), holding
+    {venue : {"prices": [...], "transactions": [...]}} newest first.
+    This is also what stockx_feed.js writes.
+    """
+
+    def __init__(self, parent_folder):
+        self.parent_folder = parent_folder
+        return
+
+    def get_style_ids(self):
+        return sorted(
+            os.path.basename(os.path.dirname(p))
+            for p in glob.glob("{}/*/".format(self.parent_folder))
+        )
+
+    def get_sizes(self, style_id):
+        return [
+            ".".join(os.path.basename(f).split(".")[:-1])
+            for f in glob.glob(self._find_parent_path(style_id) + "*.json")
+        ]
+
+    def _find_path(self, style_id, size):
+        return "{}/{}/{}.json".format(self.parent_folder, style_id, size)
+
+    def _find_parent_path(self, style_id):
+        return "{}/{}/".format(self.parent_folder, style_id)
+
+    def get(self, style_id, size=None):
+        """
+        Get all size_prices for the specified style_id and optionally specified size
+        returns {(style_id, size) : {venue : {"prices": [...], "transactions": [...]}}}
+
+        Throws FileNotFoundError if no serialized data can be found
+        """
+        return {
+            size: json.loads(text)
+            for size, text in self.read_documents(style_id, size).items()
+        }
+
+    def read_documents(self, style_id, size=None):
+        """
+        The undecoded documents get would return, {size : str}
+        """
+        documents = {}
+        if not size:
+            parent_path = self._find_parent_path(style_id)
+            for f in glob.glob(parent_path + "*.json"):
+                size = ".".join(os.path.basename(f).split(".")[:-1])
+                with open(f, "r") as infile:
+                    documents[size] = infile.read()
+        else:
+            f = self._find_path(style_id, size)
+            with open(f, "r") as infile:
+                documents[size] = infile.read()
+        return documents
+
+    def get_all_historical_price(self, style_id, size, venue):
+        f = self._find_path(style_id, size)
+        with open(f, "r") as infile:
+            data = json.loads(infile.read())
+            return data[venue]["prices"]
+
+    def get_all_transactions(self, style_id, size, venue):
+        f = self._find_path(style_id, size)
+        with open(f, "r") as infile:
+            data = json.loads(infile.read())
+            return data[venue]["transactions"]
+
+    def get_transaction_watermarks(self, style_id, venue):
+        """
+        Newest stored transaction of each size of style_id on venue.
+        returns {size : {"id": str, "time": datetime}}, empty if nothing is stored
+        """
+        watermarks = {}
+        for f in glob.glob(self._find_parent_path(style_id) + "*.json"):
+            size = ".".join(os.path.basename(f).split(".")[:-1])
+            with open(f, "r") as infile:
+                data = json.loads(infile.read())
+            if venue in data and len(data[venue]["transactions"]) > 0:
+                newest = data[venue]["transactions"][0]
+                watermarks[size] = {
+                    "id": newest["id"],
+                    "time": parse_time(newest["time"]),
+                }
+        return watermarks
+
+    def update(self, venue, update_time, style_id, size_prices, size_transactions):
+        for size in size_prices:
+            outfile = self._find_path(style_id, size)
+            if os.path.isfile(outfile):
+                with open(outfile, "r") as infile:
+                    data = json.loads(infile.read())
+            else:
+                outdir = os.path.dirname(outfile)
+                pathlib.Path(outdir).mkdir(parents=True, exist_ok=True)
+                data = {}
+
+            if not venue in data:
+                data[venue] = {"prices": [], "transactions": []}
+
+            data[venue]["prices"].insert(
+                0, make_price_record(update_time, size_prices[size])
+            )
+
+            if size in size_transactions:
+                transactions = size_transactions[size]
+                if len(data[venue]["transactions"]) > 0:
+                    last_id = data[venue]["transactions"][0]["id"]
+                    data[venue]["transactions"] = (
+                        get_new_transactions(transactions, last_id)
+                        + data[venue]["transactions"]
+                    )
+                else:
+                    data[venue]["transactions"] = transactions
+
+            with open(outfile, "w") as infile:
+                infile.write(json.dumps(data))
+        return
+
+    def write(self, style_id, size, data):
+        """
+        Replace everything stored for (style_id, size) with data
+        {venue : {"prices": [...], "transactions": [...]}}.
+        """
+        outfile = self._find_path(style_id, size)
+        pathlib.Path(os.path.dirname(outfile)).mkdir(parents=True, exist_ok=True)
+        with open(outfile, "w") as outfile_obj:
+            outfile_obj.write(json.dumps(data))
+
+    def remove(self, style_id, size):
+        os.remove(self._find_path(style_id, size))
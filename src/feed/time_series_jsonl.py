@@ -0,0 +1,218 @@
+import json
+import os
+import glob
+import pathlib
+
+from time_series_json import (
+    JsonTimeSeriesStore,
+    make_price_record,
+    get_new_transactions,
+    parse_time,
+)
+
+
+def read_last_line(path, chunk_size=4096):
+    """
+    Last line of a file, read backwards from the end so that the cost does not
+    depend on the file size. None if the file is empty.
+    """
+    with open(path, "rb") as infile:
+        infile.seek(0, os.SEEK_END)
+        pos = infile.tell()
+        tail = b""
+        while pos > 0:
+            step = min(chunk_size, pos)
+            pos -= step
+            infile.seek(pos)
+            tail = infile.read(step) + tail
+            if b"\n" in tail.rstrip(b"\n"):
+                break
+        tail = tail.rstrip(b"\n")
+        if not tail:
+            return None
+        return tail.rsplit(b"\n", 1)[-1].decode("utf-8")
+
+
+class JsonLinesTimeSeriesStore:
+    """
+    Append-only segments, one json record per line, oldest first:
+      {style_id}/{size}/{venue}.prices.jsonl
+      {style_id}/{size}/{venue}.transactions.jsonl
+
+    An update appends to the tail of each segment and only reads the last
+    stored transaction, so its cost does not grow with history.
+
+    stockx_feed.js still writes {style_id}/{size}.json. Venues found there are
+    taken to be newer than the segments and are returned in front of them; the
+    migrate command folds them into the segments.
+    """
+
+    def __init__(self, parent_folder):
+        self.parent_folder = parent_folder
+        self.legacy = JsonTimeSeriesStore(parent_folder)
+        return
+
+    def _find_size_path(self, style_id, size):
+        return "{}/{}/{}/".format(self.parent_folder, style_id, size)
+
+    def _find_segment_path(self, style_id, size, venue, kind):
+        return "{}/{}/{}/{}.{}.jsonl".format(
+            self.parent_folder, style_id, size, venue, kind
+        )
+
+    @staticmethod
+    def _read_segment(path):
+        """
+        @return records newest first, as in the json format
+        """
+        if not os.path.isfile(path):
+            return []
+        with open(path, "r") as infile:
+            records = [json.loads(line) for line in infile if line.strip()]
+        records.reverse()
+        return records
+
+    @staticmethod
+    def _append_segment(path, records):
+        """
+        @param records  oldest first
+        """
+        if len(records) == 0:
+            return
+        with open(path, "a") as outfile:
+            outfile.write("".join(json.dumps(r) + "\n" for r in records))
+
+    def _get_last_transaction(self, style_id, size, venue):
+        path = self._find_segment_path(style_id, size, venue, "transactions")
+        if not os.path.isfile(path):
+            return None
+        line = read_last_line(path)
+        return json.loads(line) if line else None
+
+    def _get_venues(self, style_id, size):
+        return sorted(
+            set(
+                os.path.basename(f).split(".")[0]
+                for f in glob.glob(self._find_size_path(style_id, size) + "*.jsonl")
+            )
+        )
+
+    def get_style_ids(self):
+        return self.legacy.get_style_ids()
+
+    def get_sizes(self, style_id):
+        sizes = set(self.legacy.get_sizes(style_id))
+        for p in glob.glob(self._find_size_path(style_id, "*")):
+            if os.path.isdir(p):
+                sizes.add(os.path.basename(os.path.dirname(p)))
+        return sorted(sizes)
+
+    def _get_size(self, style_id, size):
+        data = {}
+        for venue in self._get_venues(style_id, size):
+            data[venue] = {
+                "prices": self._read_segment(
+                    self._find_segment_path(style_id, size, venue, "prices")
+                ),
+                "transactions": self._read_segment(
+                    self._find_segment_path(style_id, size, venue, "transactions")
+                ),
+            }
+        if os.path.isfile(self.legacy._find_path(style_id, size)):
+            legacy = self.legacy.get(style_id, size)[size]
+            for venue in legacy:
+                if not venue in data:
+                    data[venue] = legacy[venue]
+                    continue
+                data[venue]["prices"] = legacy[venue]["prices"] + data[venue]["prices"]
+                transactions = legacy[venue].get("transactions", [])
+                if len(data[venue]["transactions"]) > 0:
+                    transactions = get_new_transactions(
+                        transactions, data[venue]["transactions"][0]["id"]
+                    )
+                data[venue]["transactions"] = transactions + data[venue]["transactions"]
+        if len(data) == 0:
+            raise FileNotFoundError(
+                "no readings stored for {} {}".format(style_id, size)
+            )
+        return data
+
+    def get(self, style_id, size=None):
+        size_prices = {}
+        if not size:
+            for s in self.get_sizes(style_id):
+                size_prices[s] = self._get_size(style_id, s)
+        else:
+            size_prices[size] = self._get_size(style_id, size)
+        return size_prices
+
+    def get_all_historical_price(self, style_id, size, venue):
+        return self._get_size(style_id, size)[venue]["prices"]
+
+    def get_all_transactions(self, style_id, size, venue):
+        return self._get_size(style_id, size)[venue]["transactions"]
+
+    def get_transaction_watermarks(self, style_id, venue):
+        watermarks = self.legacy.get_transaction_watermarks(style_id, venue)
+        for size in self.get_sizes(style_id):
+            if size in watermarks:
+                # legacy documents are newer than the segments
+                continue
+            newest = self._get_last_transaction(style_id, size, venue)
+            if newest:
+                watermarks[size] = {
+                    "id": newest["id"],
+                    "time": parse_time(newest["time"]),
+                }
+        return watermarks
+
+    def _append(self, venue, style_id, size, prices, transactions):
+        """
+        @param prices        price records, newest first
+        @param transactions  transaction records, newest first, may overlap
+            with what is stored
+        """
+        pathlib.Path(self._find_size_path(style_id, size)).mkdir(
+            parents=True, exist_ok=True
+        )
+        self._append_segment(
+            self._find_segment_path(style_id, size, venue, "prices"), prices[::-1]
+        )
+        if len(transactions) > 0:
+            last = self._get_last_transaction(style_id, size, venue)
+            if last:
+                transactions = get_new_transactions(transactions, last["id"])
+            self._append_segment(
+                self._find_segment_path(style_id, size, venue, "transactions"),
+                transactions[::-1],
+            )
+
+    def update(self, venue, update_time, style_id, size_prices, size_transactions):
+        for size in size_prices:
+            self._append(
+                venue,
+                style_id,
+                size,
+                [make_price_record(update_time, size_prices[size])],
+                size_transactions[size] if size in size_transactions else [],
+            )
+        return
+
+    def merge(self, style_id, size, data):
+        for venue in data:
+            self._append(
+                venue,
+                style_id,
+                size,
+                data[venue]["prices"],
+                data[venue].get("transactions", []),
+            )
+
+    def remove(self, style_id, size):
+        for venue in self._get_venues(style_id, size):
+            for kind in ["prices", "transactions"]:
+                path = self._find_segment_path(style_id, size, venue, kind)
+                if os.path.isfile(path):
+                    os.remove(path)
+        if os.path.isdir(self._find_size_path(style_id, size)):
+            os.rmdir(self._find_size_path(style_id, size))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import argparse
+import concurrent.futures
+import json
+import threading
+import time
+
+from time_series_serializer import TimeSeriesSerializer, STORAGE_FORMATS
+
+"""
+Loads the time series of many style_ids at once. On a cold page cache reading
+thousands of style folders one after another is bound by disk latency, so
+reads are spread over a thread pool. Decoding json holds the GIL, and can
+optionally be moved to a process pool (json storage format only).
+
+example usage:
+    ./time_series_loader.py --data_folder ../data --threads 16 --decode_processes 4
+"""
+
+
+def decode_documents(documents):
+    """
+    @param documents  {size : str}, as JsonTimeSeriesStore.read_documents
+    """
+    return {size: json.loads(text) for size, text in documents.items()}
+
+
+class TimeSeriesLoader:
+    def __init__(self, data_folder, storage_format=None, threads=8, decode_processes=0):
+        """
+        @param threads           readers of the data folder
+        @param decode_processes  if > 0, decode json documents in this many
+            processes instead of in the reading threads
+        """
+        self.data_folder = data_folder
+        self.storage_format = storage_format if storage_format else "json"
+        self.threads = max(1, int(threads))
+        self.decode_processes = int(decode_processes) if decode_processes else 0
+        if self.decode_processes > 0 and self.storage_format != "json":
+            raise RuntimeError(
+                "decode_processes is only supported with json storage format, not {}".format(
+                    self.storage_format
+                )
+            )
+        # serializers are not shared between threads, sqlite connections can't be
+        self.local = threading.local()
+        self.elapsed = {}
+        return
+
+    def _serializer(self):
+        if not hasattr(self.local, "serializer"):
+            self.local.serializer = TimeSeriesSerializer(
+                self.data_folder, self.storage_format
+            )
+        return self.local.serializer
+
+    def _get(self, style_id):
+        return self._serializer().get(style_id)
+
+    def _read(self, style_id):
+        return self._serializer().store.read_documents(style_id)
+
+    def load(self, style_ids, progress_every=None):
+        """
+        @param style_ids       iterable of style_ids to load
+        @param progress_every  print progress every this many style_ids,
+            default every 10%
+        @return {style_id : size_prices} in the order of style_ids, size_prices
+            as returned by TimeSeriesSerializer.get
+        """
+        style_ids = list(style_ids)
+        if not progress_every:
+            progress_every = max(1, len(style_ids) // 10)
+        begin = time.perf_counter()
+
+        result = {}
+        with concurrent.futures.ThreadPoolExecutor(self.threads) as threads:
+            if self.decode_processes > 0:
+                with concurrent.futures.ProcessPoolExecutor(
+                    self.decode_processes
+                ) as processes:
+                    # executor.map yields in order of style_ids as documents
+                    # are read, decoding starts on each as soon as it is handed out
+                    decoding = [
+                        processes.submit(decode_documents, documents)
+                        for documents in threads.map(self._read, style_ids)
+                    ]
+                    self.elapsed["read"] = time.perf_counter() - begin
+                    for style_id, future in zip(style_ids, decoding):
+                        result[style_id] = future.result()
+                        self._progress(len(result), len(style_ids), progress_every)
+            else:
+                for style_id, size_prices in zip(
+                    style_ids, threads.map(self._get, style_ids)
+                ):
+                    result[style_id] = size_prices
+                    self._progress(len(result), len(style_ids), progress_every)
+
+        self.elapsed["total"] = time.perf_counter() - begin
+        self.num_style_ids = len(result)
+        self.num_sizes = sum(len(size_prices) for size_prices in result.values())
+        return result
+
+    def _progress(self, done, total, progress_every):
+        if done % progress_every == 0 or done == total:
+            print("loaded {} / {} style_ids".format(done, total))
+        return
+
+    def report(self):
+        print(
+            "loaded {} style_ids, {} (style_id, size) in {:.3f} s with {} threads, {} decode processes{}".format(
+                self.num_style_ids,
+                self.num_sizes,
+                self.elapsed["total"],
+                self.threads,
+                self.decode_processes,
+                (
+                    " (reading done at {:.3f} s)".format(self.elapsed["read"])
+                    if "read" in self.elapsed
+                    else ""
+                ),
+            )
+        )
+        return
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("time the loading of a data folder")
+    parser.add_argument("--data_folder", default="../data")
+    parser.add_argument(
+        "--storage_format",
+        help="how time series in data_folder are stored, one of {} (default json)".format(
+            STORAGE_FORMATS
+        ),
+    )
+    parser.add_argument("--threads", default=8, help="number of reading threads")
+    parser.add_argument(
+        "--decode_processes",
+        default=0,
+        help="number of json decoding processes, 0 to decode in the reading threads",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    loader = TimeSeriesLoader(
+        args.data_folder, args.storage_format, args.threads, args.decode_processes
+    )
+    loader.load(loader._serializer().get_style_ids())
+    loader.report()
@@ -5,12 +5,45 @@ let shell = require('shelljs');
 class TimeSeriesSerializer {
     constructor() {
         this.venue = "stockx";
+        this.snapshot = undefined;
     }
 
     findPath(styleId, size) {
         return "../data/" + styleId + "/" + size + ".json"
     }
 
+    findSnapshotPath() {
+        return "../data/latest_snapshot." + this.venue + ".json"
+    }
+
+    // keeps latest_snapshot.stockx.json in the format of latest_snapshot.py
+    updateSnapshot(styleId, size, price) {
+        if (this.snapshot === undefined) {
+            let infile = this.findSnapshotPath();
+            this.snapshot = fs.existsSync(infile) ? JSON.parse(fs.readFileSync(infile)) : {};
+        }
+        if (this.snapshot[styleId] === undefined) {
+            this.snapshot[styleId] = {};
+        }
+        if (this.snapshot[styleId][size] === undefined) {
+            this.snapshot[styleId][size] = {
+                price: null,
+                transaction: null,
+                transaction_time: null,
+                num_prices: 0,
+                num_transactions: 0
+            }
+        }
+        this.snapshot[styleId][size].price = price;
+        this.snapshot[styleId][size].num_prices += 1;
+    }
+
+    saveSnapshot() {
+        let outfile = this.findSnapshotPath();
+        fs.writeFileSync(outfile + ".tmp", JSON.stringify(this.snapshot));
+        fs.renameSync(outfile + ".tmp", outfile);
+    }
+
     update(updateTime, styleId, sizePrices) {
         for (let size in sizePrices) {
             let outfile = this.findPath(styleId, size);
@@ -31,7 +64,7 @@ class TimeSeriesSerializer {
                 }
             }
 
-            data[this.venue].prices.unshift({
+            let price = {
                 time: updateTime.toISOString(),
                 bid_price: sizePrices[size]["bestBid"],
                 ask_price: sizePrices[size]["bestAsk"],
@@ -41,9 +74,14 @@ class TimeSeriesSerializer {
                 sale_72_hours: sizePrices[size]["salesLast72Hours"],
                 number_asks: sizePrices[size]["numberOfAsks"],
                 number_bids: sizePrices[size]["numberOfBids"]
-            })
+            };
+            data[this.venue].prices.unshift(price);
 
             fs.writeFileSync(outfile, JSON.stringify(data));
+            this.updateSnapshot(styleId, size, price);
+        }
+        if (this.snapshot !== undefined) {
+            this.saveSnapshot();
         }
     }
 }
@@ -1,20 +1,55 @@
-import json
-import os
-import glob
-import pathlib
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+
+from latest_snapshot import LatestSnapshot
+from time_series_json import JsonTimeSeriesStore, make_price_record, parse_time
+from time_series_jsonl import JsonLinesTimeSeriesStore
+from time_series_sqlite import SqliteTimeSeriesStore
+
+"""
+Encapsulates reading and writing of price and transaction readings of each
+(style_id, size) in a data folder.
+
+The storage_format selects the layout under the data folder:
+  json:  {style_id}/{size}.json documents, rewritten on each update. This is
+         what stockx_feed.js writes.
+  jsonl: append-only {style_id}/{size}/{venue}.{prices|transactions}.jsonl
+         segments, newest at the tail (time_series_jsonl.py).
+  sqlite: a time_series.sqlite3 database with time indexed prices and
+         transactions tables (time_series_sqlite.py).
+
+All formats return readings in the same shape, newest first.
+
+Updates also maintain latest_snapshot.{venue}.json, the newest reading of each
+(style_id, size) (latest_snapshot.py).
+"""
+
+
+STORAGE_FORMATS = ["json", "jsonl", "sqlite"]
 
 
 class TimeSeriesSerializer:
-    def __init__(self, parent_folder=None):
-        if not parent_folder:
-            self.parent_folder = "../data"
+    def __init__(self, parent_folder=None, storage_format=None):
+        self.parent_folder = parent_folder if parent_folder else "../data"
+        self.storage_format = storage_format if storage_format else "json"
+        if self.storage_format == "json":
+            self.store = JsonTimeSeriesStore(self.parent_folder)
+        elif self.storage_format == "jsonl":
+            self.store = JsonLinesTimeSeriesStore(self.parent_folder)
+        elif self.storage_format == "sqlite":
+            self.store = SqliteTimeSeriesStore(self.parent_folder)
+        else:
+            raise RuntimeError(
+                "unrecognized storage format {}".format(self.storage_format)
+            )
+        self.snapshot = LatestSnapshot(self.parent_folder)
+        self.in_batch = False
         return
 
-    def _find_path(self, style_id, size):
-        return "{}/{}/{}.json".format(self.parent_folder, style_id, size)
-
-    def _find_parent_path(self, style_id):
-        return "{}/{}/".format(self.parent_folder, style_id)
+    def get_style_ids(self):
+        return self.store.get_style_ids()
 
     def get(self, style_id, size=None):
         """
@@ -23,76 +58,160 @@ class TimeSeriesSerializer:
 
         Throws FileNotFoundError if no serialized data can be found
         """
-        size_prices = {}
-        if not size:
-            parent_path = self._find_parent_path(style_id)
-            for f in glob.glob(parent_path + "*.json"):
-                size = ".".join(os.path.basename(f).split(".")[:-1])
-                with open(f, "r") as infile:
-                    data = json.loads(infile.read())
-                    size_prices[size] = data
-        else:
-            f = self._find_path(style_id, size)
-            with open(f, "r") as infile:
-                data = json.loads(infile.read())
-                size_prices[size] = data
-        return size_prices
+        return self.store.get(style_id, size)
 
     def get_all_historical_price(self, style_id, size, venue):
-        f = self._find_path(style_id, size)
-        with open(f, "r") as infile:
-            data = json.loads(infile.read())
-            return data[venue]["prices"]
+        return self.store.get_all_historical_price(style_id, size, venue)
 
     def get_all_transactions(self, style_id, size, venue):
-        f = self._find_path(style_id, size)
-        with open(f, "r") as infile:
-            data = json.loads(infile.read())
-            return data[venue]["transactions"]
+        return self.store.get_all_transactions(style_id, size, venue)
+
+    def get_transaction_watermarks(self, style_id, venue):
+        """
+        Newest stored transaction of each size of style_id on venue.
+        returns {size : {"id": str, "time": datetime}}, empty if nothing is stored
+        """
+        return self.store.get_transaction_watermarks(style_id, venue)
 
     def update(self, venue, update_time, style_id, size_prices, size_transactions):
+        self.store.update(venue, update_time, style_id, size_prices, size_transactions)
         for size in size_prices:
-            outfile = self._find_path(style_id, size)
-            if os.path.isfile(outfile):
-                with open(outfile, "r") as infile:
-                    data = json.loads(infile.read())
+            self.snapshot.update(
+                venue,
+                style_id,
+                size,
+                [make_price_record(update_time, size_prices[size])],
+                size_transactions[size] if size in size_transactions else [],
+            )
+        if not self.in_batch:
+            self.snapshot.save()
+        return
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Context in which updates may be written together, e.g. a feed run.
+        The sqlite format writes them in one transaction, the latest snapshot
+        is saved once on the way out.
+        """
+        self.in_batch = True
+        try:
+            if hasattr(self.store, "batch"):
+                with self.store.batch():
+                    yield self
             else:
-                outdir = os.path.dirname(outfile)
-                pathlib.Path(outdir).mkdir(parents=True, exist_ok=True)
-                data = {}
-
-            if not venue in data:
-                data[venue] = {"prices": [], "transactions": []}
-
-            prices = size_prices[size]
-            data[venue]["prices"].insert(
-                0,
-                {
-                    "time": update_time.isoformat() + "Z",
-                    "bid_price": prices["bid_price"] if "bid_price" in prices else None,
-                    "ask_price": prices["ask_price"] if "ask_price" in prices else None,
-                    "list_price": prices["list_price"]
-                    if "list_price" in prices
-                    else None,
-                },
+                yield self
+        finally:
+            self.in_batch = False
+            self.snapshot.save()
+
+    def _require(self, method):
+        if not hasattr(self.store, method):
+            raise RuntimeError(
+                "{} is not supported by storage format {}".format(
+                    method, self.storage_format
+                )
             )
+        return getattr(self.store, method)
 
-            if size in size_transactions:
-                transactions = size_transactions[size]
-                if len(data[venue]["transactions"]) > 0:
-                    last_id = data[venue]["transactions"][0]["id"]
-                    idx = 0
-                    for t in transactions:
-                        if t["id"] == last_id:
-                            break
-                        else:
-                            idx += 1
-                    data[venue]["transactions"] = (
-                        transactions[:idx] + data[venue]["transactions"]
+    def get_prices_between(self, style_id, size, venue, start=None, end=None):
+        """
+        Price readings with start <= time < end, newest first. sqlite only
+        """
+        return self._require("get_prices_between")(style_id, size, venue, start, end)
+
+    def get_transactions_between(self, style_id, size, venue, start=None, end=None):
+        """
+        Transactions with start <= time < end, newest first. sqlite only
+        """
+        return self._require("get_transactions_between")(
+            style_id, size, venue, start, end
+        )
+
+    def get_latest_prices(self, style_id, size, venue, n):
+        """
+        The newest n price readings, newest first. sqlite only
+        """
+        return self._require("get_latest_prices")(style_id, size, venue, n)
+
+    def get_latest_transactions(self, style_id, size, venue, n):
+        """
+        The newest n transactions, newest first. sqlite only
+        """
+        return self._require("get_latest_transactions")(style_id, size, venue, n)
+
+
+def migrate(parent_folder, from_format, to_format):
+    """
+    Move every reading in parent_folder from one storage format to another.
+    Re-running json to jsonl folds in documents stockx_feed.js wrote since.
+
+    To sqlite is an import: the source is left in place, and re-running only
+    adds readings written to it since.
+    """
+    json_store = JsonTimeSeriesStore(parent_folder)
+    jsonl_store = JsonLinesTimeSeriesStore(parent_folder)
+    count = 0
+    if from_format == "json" and to_format == "jsonl":
+        for style_id in json_store.get_style_ids():
+            for size in json_store.get_sizes(style_id):
+                data = json_store.get(style_id, size)[size]
+                jsonl_store.merge(style_id, size, data)
+                json_store.remove(style_id, size)
+                count += 1
+    elif from_format == "jsonl" and to_format == "json":
+        for style_id in jsonl_store.get_style_ids():
+            for size in jsonl_store.get_sizes(style_id):
+                data = jsonl_store.get(style_id, size)[size]
+                json_store.write(style_id, size, data)
+                jsonl_store.remove(style_id, size)
+                count += 1
+    elif to_format == "sqlite" and from_format in ["json", "jsonl"]:
+        src_store = json_store if from_format == "json" else jsonl_store
+        sqlite_store = SqliteTimeSeriesStore(parent_folder)
+        with sqlite_store.batch():
+            for style_id in src_store.get_style_ids():
+                for size in src_store.get_sizes(style_id):
+                    sqlite_store.merge(
+                        style_id, size, src_store.get(style_id, size)[size]
                     )
-                else:
-                    data[venue]["transactions"] = transactions
+                    count += 1
+    else:
+        raise RuntimeError(
+            "unsupported migration {} to {}".format(from_format, to_format)
+        )
+    print("migrated {} (style_id, size) from {} to {}".format(count, from_format, to_format))
+    return
 
-            with open(outfile, "w") as infile:
-                infile.write(json.dumps(data))
-        return
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        """
+        time series storage maintenance.
+
+        example usage:
+          ./time_series_serializer.py --mode migrate --data_folder ../data --from_format json --to_format jsonl
+          ./time_series_serializer.py --mode migrate --data_folder ../data --from_format json --to_format sqlite
+    """
+    )
+    parser.add_argument("--mode", help="[migrate]")
+    parser.add_argument(
+        "--data_folder", help="the data folder to operate on", default="../data"
+    )
+    parser.add_argument(
+        "--from_format", help="in migrate mode, one of {}".format(STORAGE_FORMATS)
+    )
+    parser.add_argument(
+        "--to_format", help="in migrate mode, one of {}".format(STORAGE_FORMATS)
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.mode == "migrate":
+        if not args.from_format or not args.to_format:
+            raise RuntimeError("args.from_format and args.to_format are required in migrate mode")
+        migrate(args.data_folder, args.from_format, args.to_format)
+    else:
+        raise RuntimeError("Unsupported mode {}".format(args.mode))
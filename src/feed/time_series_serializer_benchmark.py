@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import tempfile
+import time
+
+from time_series_json import make_price_record
+from time_series_serializer import TimeSeriesSerializer, STORAGE_FORMATS
+
+"""
+Time of one daily update of a (style_id, size) against the length of its
+stored history, for each storage format.
+
+example usage:
+    ./time_series_serializer_benchmark.py --history 100,1000,10000,50000 --updates 20
+"""
+
+
+def make_history(num_ticks, start):
+    prices = []
+    transactions = []
+    for i in range(num_ticks):
+        tick_time = start + datetime.timedelta(hours=i)
+        prices.append(
+            make_price_record(
+                tick_time, {"bid_price": 1000 + i, "list_price": 2000 + i}
+            )
+        )
+        transactions.append(
+            {
+                "price": 1500 + i,
+                "time": tick_time.isoformat() + "Z",
+                "id": "h{}".format(i),
+            }
+        )
+    # newest first
+    return {"du": {"prices": prices[::-1], "transactions": transactions[::-1]}}
+
+
+def bench(storage_format, num_ticks, num_updates):
+    start = datetime.datetime(2019, 1, 1)
+    with tempfile.TemporaryDirectory() as folder:
+        serializer = TimeSeriesSerializer(folder, storage_format)
+        history = make_history(num_ticks, start)
+        if storage_format == "json":
+            serializer.store.write("STYLE", "9.0", history)
+        else:
+            serializer.store.merge("STYLE", "9.0", history)
+
+        elapsed = 0
+        last_id = "h{}".format(num_ticks - 1)
+        for i in range(num_updates):
+            update_time = start + datetime.timedelta(hours=num_ticks + i)
+            new_id = "u{}".format(i)
+            size_transactions = {
+                "9.0": [
+                    {"price": 1, "time": update_time.isoformat() + "Z", "id": new_id},
+                    {"price": 1, "time": update_time.isoformat() + "Z", "id": last_id},
+                ]
+            }
+            last_id = new_id
+            begin = time.perf_counter()
+            serializer.update(
+                "du",
+                update_time,
+                "STYLE",
+                {"9.0": {"list_price": i}},
+                size_transactions,
+            )
+            elapsed += time.perf_counter() - begin
+    return elapsed / num_updates
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("benchmark time series update cost")
+    parser.add_argument(
+        "--history",
+        default="100,1000,10000",
+        help="comma separated stored history lengths (ticks and transactions each)",
+    )
+    parser.add_argument(
+        "--updates", default=20, help="updates timed per history length"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(
+        "{:>10s} ".format("history")
+        + " ".join("{:>12s}".format(f) for f in STORAGE_FORMATS)
+    )
+    for num_ticks in [int(n) for n in args.history.split(",")]:
+        row = [bench(f, num_ticks, int(args.updates)) * 1000 for f in STORAGE_FORMATS]
+        print(
+            "{:>10d} ".format(num_ticks)
+            + " ".join("{:>9.3f} ms".format(r) for r in row)
+        )
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+import datetime
+import tempfile
+import unittest
+
+from latest_snapshot import LatestSnapshot
+from time_series_serializer import TimeSeriesSerializer, migrate
+
+
+def make_transactions(ids):
+    return [
+        {
+            "price": 100000 + i,
+            "time": "2019-12-{:02d}T00:00:00.000Z".format(i),
+            "id": str(i),
+        }
+        for i in ids
+    ]
+
+
+# (update_time, size_prices, size_transactions) fed to "du" in order, transactions
+# overlap between updates as they would coming from the feed
+UPDATES = [
+    (
+        datetime.datetime(2019, 12, 1),
+        {"9.0": {"bid_price": 1, "list_price": 2}, "9.5": {"list_price": 3}},
+        {"9.0": make_transactions([2, 1])},
+    ),
+    (
+        datetime.datetime(2019, 12, 2),
+        {"9.0": {"bid_price": 4, "list_price": 5}, "9.5": {"list_price": 6}},
+        {"9.0": make_transactions([4, 3, 2, 1]), "9.5": make_transactions([3])},
+    ),
+    (
+        datetime.datetime(2019, 12, 3),
+        {"9.0": {"bid_price": 7, "list_price": 8}},
+        {"9.0": make_transactions([4, 3])},
+    ),
+]
+
+
+class TestStorageFormats(unittest.TestCase):
+    def setUp(self):
+        self.json_folder = tempfile.TemporaryDirectory()
+        self.jsonl_folder = tempfile.TemporaryDirectory()
+        self.sqlite_folder = tempfile.TemporaryDirectory()
+        self.json = TimeSeriesSerializer(self.json_folder.name, "json")
+        self.jsonl = TimeSeriesSerializer(self.jsonl_folder.name, "jsonl")
+        self.sqlite = TimeSeriesSerializer(self.sqlite_folder.name, "sqlite")
+        for update_time, size_prices, size_transactions in UPDATES:
+            for serializer in [self.json, self.jsonl, self.sqlite]:
+                serializer.update(
+                    "du", update_time, "BQ6623-800", size_prices, size_transactions
+                )
+
+    def tearDown(self):
+        self.json_folder.cleanup()
+        self.jsonl_folder.cleanup()
+        self.sqlite.store.conn.close()
+        self.sqlite_folder.cleanup()
+
+    def test_same_readings(self):
+        expected = self.json.get("BQ6623-800")
+        for other in [self.jsonl, self.sqlite]:
+            self.assertEqual(other.get("BQ6623-800"), expected)
+            self.assertEqual(other.get("BQ6623-800", "9.0"), {"9.0": expected["9.0"]})
+            for size in ["9.0", "9.5"]:
+                self.assertEqual(
+                    other.get_all_historical_price("BQ6623-800", size, "du"),
+                    self.json.get_all_historical_price("BQ6623-800", size, "du"),
+                )
+                self.assertEqual(
+                    other.get_all_transactions("BQ6623-800", size, "du"),
+                    self.json.get_all_transactions("BQ6623-800", size, "du"),
+                )
+            self.assertEqual(
+                other.get_transaction_watermarks("BQ6623-800", "du"),
+                self.json.get_transaction_watermarks("BQ6623-800", "du"),
+            )
+        self.assertEqual(
+            [t["id"] for t in expected["9.0"]["du"]["transactions"]],
+            ["4", "3", "2", "1"],
+        )
+        self.assertEqual(expected["9.0"]["du"]["prices"][0]["list_price"], 8)
+
+    def test_latest_snapshot(self):
+        snapshot = LatestSnapshot(self.json_folder.name).get("BQ6623-800")
+        entry = snapshot["9.0"]["du"]["snapshot"]
+        self.assertEqual(entry["price"]["list_price"], 8)
+        self.assertEqual(entry["transaction"]["id"], "4")
+        self.assertEqual(entry["transaction_time"], "2019-12-04T00:00:00.000Z")
+        self.assertEqual(entry["num_prices"], 3)
+        self.assertEqual(entry["num_transactions"], 4)
+
+        rebuilt = LatestSnapshot(self.sqlite_folder.name)
+        rebuilt.build(self.sqlite)
+        self.assertEqual(rebuilt.get("BQ6623-800"), snapshot)
+        self.assertEqual(
+            LatestSnapshot(self.sqlite_folder.name).get("BQ6623-800"), snapshot
+        )
+
+    def test_missing_style(self):
+        for serializer in [self.json, self.jsonl, self.sqlite]:
+            self.assertEqual(serializer.get("NOT-FED"), {})
+        with self.assertRaises(FileNotFoundError):
+            self.sqlite.get("NOT-FED", "9.0")
+        with self.assertRaises(FileNotFoundError):
+            self.json.get("NOT-FED", "9.0")
+
+    def test_sqlite_queries(self):
+        self.assertEqual(
+            [
+                t["id"]
+                for t in self.sqlite.get_transactions_between(
+                    "BQ6623-800",
+                    "9.0",
+                    "du",
+                    datetime.datetime(2019, 12, 2),
+                    datetime.datetime(2019, 12, 4),
+                )
+            ],
+            ["3", "2"],
+        )
+        self.assertEqual(
+            [
+                p["list_price"]
+                for p in self.sqlite.get_prices_between(
+                    "BQ6623-800", "9.0", "du", start=datetime.datetime(2019, 12, 2)
+                )
+            ],
+            [8, 5],
+        )
+        self.assertEqual(
+            [
+                p["list_price"]
+                for p in self.sqlite.get_latest_prices("BQ6623-800", "9.0", "du", 2)
+            ],
+            [8, 5],
+        )
+        self.assertEqual(
+            [
+                t["id"]
+                for t in self.sqlite.get_latest_transactions(
+                    "BQ6623-800", "9.0", "du", 1
+                )
+            ],
+            ["4"],
+        )
+        with self.assertRaises(RuntimeError):
+            self.json.get_latest_prices("BQ6623-800", "9.0", "du", 1)
+
+    def test_import_sqlite(self):
+        expected = self.json.get("BQ6623-800")
+        migrate(self.json_folder.name, "json", "sqlite")
+        # importing again only adds what was written since
+        migrate(self.json_folder.name, "json", "sqlite")
+        imported = TimeSeriesSerializer(self.json_folder.name, "sqlite")
+        self.assertEqual(imported.get("BQ6623-800"), expected)
+        imported.store.conn.close()
+
+    def test_migrate(self):
+        expected = self.json.get("BQ6623-800")
+        migrate(self.json_folder.name, "json", "jsonl")
+        migrated = TimeSeriesSerializer(self.json_folder.name, "jsonl")
+        self.assertEqual(migrated.get("BQ6623-800"), expected)
+
+        # documents written in json format after migration are newer readings
+        legacy = TimeSeriesSerializer(self.json_folder.name, "json")
+        legacy.update(
+            "du",
+            datetime.datetime(2019, 12, 4),
+            "BQ6623-800",
+            {"9.0": {"list_price": 9}},
+            {"9.0": make_transactions([5])},
+        )
+        readings = migrated.get("BQ6623-800", "9.0")["9.0"]["du"]
+        self.assertEqual(readings["prices"][0]["list_price"], 9)
+        self.assertEqual(len(readings["prices"]), 4)
+        self.assertEqual(
+            [t["id"] for t in readings["transactions"]], ["5", "4", "3", "2", "1"]
+        )
+
+        migrate(self.json_folder.name, "json", "jsonl")
+        self.assertEqual(migrated.get("BQ6623-800", "9.0")["9.0"]["du"], readings)
+        migrate(self.json_folder.name, "jsonl", "json")
+        self.assertEqual(legacy.get("BQ6623-800", "9.0")["9.0"]["du"], readings)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,295 @@
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import sqlite3
+
+from time_series_json import make_price_record, get_new_transactions, parse_time
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    seq INTEGER PRIMARY KEY,
+    style_id TEXT NOT NULL,
+    size TEXT NOT NULL,
+    venue TEXT NOT NULL,
+    epoch_us INTEGER NOT NULL,
+    bid_price REAL,
+    ask_price REAL,
+    list_price REAL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS prices_key ON prices (style_id, size, venue);
+CREATE INDEX IF NOT EXISTS prices_key_time ON prices (style_id, size, venue, epoch_us);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY,
+    style_id TEXT NOT NULL,
+    size TEXT NOT NULL,
+    venue TEXT NOT NULL,
+    epoch_us INTEGER NOT NULL,
+    price REAL,
+    time TEXT NOT NULL,
+    id TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_key ON transactions (style_id, size, venue);
+CREATE INDEX IF NOT EXISTS transactions_key_time ON transactions (style_id, size, venue, epoch_us);
+"""
+
+
+def to_epoch_us(t):
+    """
+    @param t  datetime, or a stored time string
+    """
+    if isinstance(t, str):
+        t = parse_time(t)
+    return (t - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+class SqliteTimeSeriesStore:
+    """
+    Price readings and transactions in one sqlite database at
+    {parent_folder}/time_series.sqlite3, keyed by (style_id, size, venue) and
+    indexed by time.
+
+    Rows are returned newest (last inserted) first in the same shape as the json
+    format. Price rows keep the reading as written in `record`, as venues store
+    different fields; bid / ask / list are also columns for queries.
+
+    Every update commits on its own unless inside `batch()`, which commits
+    once at the end.
+    """
+
+    def __init__(self, parent_folder, filename="time_series.sqlite3"):
+        pathlib.Path(parent_folder).mkdir(parents=True, exist_ok=True)
+        self.db_path = os.path.join(parent_folder, filename)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+        self.in_batch = False
+        return
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Write everything inside in one transaction. Commits on the way out
+        even on interruption, as callers record progress as they go.
+        """
+        self.in_batch = True
+        try:
+            yield self
+        finally:
+            self.in_batch = False
+            self.conn.commit()
+
+    def _commit(self):
+        if not self.in_batch:
+            self.conn.commit()
+
+    @staticmethod
+    def _to_transaction(row):
+        price, time, id = row
+        return {"price": price, "time": time, "id": id}
+
+    def get_style_ids(self):
+        rows = self.conn.execute(
+            "SELECT DISTINCT style_id FROM prices "
+            "UNION SELECT DISTINCT style_id FROM transactions"
+        )
+        return sorted(r[0] for r in rows)
+
+    def get_sizes(self, style_id):
+        rows = self.conn.execute(
+            "SELECT DISTINCT size FROM prices WHERE style_id = ? "
+            "UNION SELECT DISTINCT size FROM transactions WHERE style_id = ?",
+            (style_id, style_id),
+        )
+        return sorted(r[0] for r in rows)
+
+    def get(self, style_id, size=None):
+        condition = "style_id = ?"
+        params = (style_id,)
+        if size:
+            condition += " AND size = ?"
+            params += (size,)
+
+        size_prices = {}
+
+        def venue_data(s, venue):
+            if s not in size_prices:
+                size_prices[s] = {}
+            if venue not in size_prices[s]:
+                size_prices[s][venue] = {"prices": [], "transactions": []}
+            return size_prices[s][venue]
+
+        for s, venue, record in self.conn.execute(
+            "SELECT size, venue, record FROM prices WHERE {} "
+            "ORDER BY size, venue, seq DESC".format(condition),
+            params,
+        ):
+            venue_data(s, venue)["prices"].append(json.loads(record))
+        for s, venue, price, time, id in self.conn.execute(
+            "SELECT size, venue, price, time, id FROM transactions WHERE {} "
+            "ORDER BY size, venue, seq DESC".format(condition),
+            params,
+        ):
+            venue_data(s, venue)["transactions"].append(
+                self._to_transaction((price, time, id))
+            )
+
+        # as the json formats: no sizes of a style is none stored, a size
+        # asked for that isn't stored is an error
+        if size and len(size_prices) == 0:
+            raise FileNotFoundError(
+                "no readings stored for {} {}".format(style_id, size)
+            )
+        return size_prices
+
+    def get_all_historical_price(self, style_id, size, venue):
+        return self.get_latest_prices(style_id, size, venue)
+
+    def get_all_transactions(self, style_id, size, venue):
+        return self.get_latest_transactions(style_id, size, venue)
+
+    def get_latest_prices(self, style_id, size, venue, n=None):
+        """
+        The newest n (default all) price readings, newest first
+        """
+        rows = self.conn.execute(
+            "SELECT record FROM prices WHERE style_id = ? AND size = ? AND venue = ? "
+            "ORDER BY seq DESC LIMIT ?",
+            (style_id, size, venue, -1 if n is None else int(n)),
+        )
+        return [json.loads(r[0]) for r in rows]
+
+    def get_latest_transactions(self, style_id, size, venue, n=None):
+        """
+        The newest n (default all) transactions, newest first
+        """
+        rows = self.conn.execute(
+            "SELECT price, time, id FROM transactions "
+            "WHERE style_id = ? AND size = ? AND venue = ? ORDER BY seq DESC LIMIT ?",
+            (style_id, size, venue, -1 if n is None else int(n)),
+        )
+        return [self._to_transaction(r) for r in rows]
+
+    def get_prices_between(self, style_id, size, venue, start=None, end=None):
+        """
+        Price readings with start <= time < end (datetimes, either may be None),
+        newest first
+        """
+        rows = self.conn.execute(
+            "SELECT record FROM prices WHERE style_id = ? AND size = ? AND venue = ? "
+            "AND epoch_us >= ? AND epoch_us < ? ORDER BY epoch_us DESC",
+            (style_id, size, venue) + self._time_range(start, end),
+        )
+        return [json.loads(r[0]) for r in rows]
+
+    def get_transactions_between(self, style_id, size, venue, start=None, end=None):
+        """
+        Transactions with start <= time < end (datetimes, either may be None),
+        newest first
+        """
+        rows = self.conn.execute(
+            "SELECT price, time, id FROM transactions "
+            "WHERE style_id = ? AND size = ? AND venue = ? "
+            "AND epoch_us >= ? AND epoch_us < ? ORDER BY epoch_us DESC",
+            (style_id, size, venue) + self._time_range(start, end),
+        )
+        return [self._to_transaction(r) for r in rows]
+
+    @staticmethod
+    def _time_range(start, end):
+        return (
+            to_epoch_us(start) if start else -(2**63),
+            to_epoch_us(end) if end else 2**63 - 1,
+        )
+
+    def get_transaction_watermarks(self, style_id, venue):
+        rows = self.conn.execute(
+            "SELECT t.size, t.id, t.time FROM transactions t JOIN ("
+            "  SELECT size, MAX(seq) AS seq FROM transactions"
+            "  WHERE style_id = ? AND venue = ? GROUP BY size"
+            ") newest ON t.seq = newest.seq",
+            (style_id, venue),
+        )
+        return {size: {"id": id, "time": parse_time(time)} for size, id, time in rows}
+
+    def _insert(self, venue, style_id, size, prices, transactions):
+        """
+        @param prices        price records, newest first
+        @param transactions  transaction records, newest first, may overlap
+            with what is stored
+        """
+        self.conn.executemany(
+            "INSERT INTO prices "
+            "(style_id, size, venue, epoch_us, bid_price, ask_price, list_price, record) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    style_id,
+                    size,
+                    venue,
+                    to_epoch_us(p["time"]),
+                    p.get("bid_price"),
+                    p.get("ask_price"),
+                    p.get("list_price"),
+                    json.dumps(p),
+                )
+                for p in prices[::-1]
+            ],
+        )
+        if len(transactions) > 0:
+            newest = self.get_latest_transactions(style_id, size, venue, 1)
+            if len(newest) > 0:
+                transactions = get_new_transactions(transactions, newest[0]["id"])
+            self.conn.executemany(
+                "INSERT INTO transactions "
+                "(style_id, size, venue, epoch_us, price, time, id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        style_id,
+                        size,
+                        venue,
+                        to_epoch_us(t["time"]),
+                        t["price"],
+                        t["time"],
+                        t.get("id"),
+                    )
+                    for t in transactions[::-1]
+                ],
+            )
+
+    def update(self, venue, update_time, style_id, size_prices, size_transactions):
+        for size in size_prices:
+            self._insert(
+                venue,
+                style_id,
+                size,
+                [make_price_record(update_time, size_prices[size])],
+                size_transactions[size] if size in size_transactions else [],
+            )
+        self._commit()
+        return
+
+    def merge(self, style_id, size, data):
+        """
+        Import readings {venue : {"prices": [...], "transactions": [...]}},
+        skipping those already stored, so re-importing a data folder only adds
+        what was written to it since.
+        """
+        for venue in data:
+            prices = data[venue]["prices"]
+            newest = self.conn.execute(
+                "SELECT MAX(epoch_us) FROM prices "
+                "WHERE style_id = ? AND size = ? AND venue = ?",
+                (style_id, size, venue),
+            ).fetchone()[0]
+            if newest is not None:
+                prices = [p for p in prices if to_epoch_us(p["time"]) > newest]
+            self._insert(
+                venue, style_id, size, prices, data[venue].get("transactions", [])
+            )
+        self._commit()
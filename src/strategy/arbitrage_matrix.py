@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import sys
+
+# hack for import
+sys.path.append("../feed/")
+
+import datetime
+
+import numpy as np
+
+from time_series_json import parse_times
+
+"""
+Profit of every buy venue x sell venue route of every (style_id, size), from
+the venue registry in fees.json.
+
+Quotes of each venue (its buy_price / sell_price fields, see fees.json) are
+gathered into (venue, key) arrays in USD, fee coefficients into (venue,) and
+(buy venue, sell venue) arrays, and the profit of all routes of all keys is
+then one broadcast (buy venue, sell venue, key) computation. Adding a venue
+adds a row to the arrays rather than another loop.
+"""
+
+# 3 days
+QUOTE_LIFETIME_SECONDS = 259200
+
+
+class ArbitrageMatrix:
+    def __init__(self, fees, fx_rate, venues=None):
+        """
+        @param venues  venues to consider, default all in the fees registry
+        """
+        self.fees = fees
+        self.fx_rate = fx_rate
+        self.venues = venues if venues else fees.get_venues()
+
+        num_venues = len(self.venues)
+        self.buy_percent = np.zeros(num_venues)
+        self.buy_fixed_usd = np.zeros(num_venues)
+        self.sell_percent = np.zeros(num_venues)
+        self.sell_fixed_usd = np.zeros(num_venues)
+        self.shipping_usd = np.zeros((num_venues, num_venues))
+        # routes fees can be worked out for, never from a venue to itself
+        self.routes = np.zeros((num_venues, num_venues), dtype=bool)
+        for i, buy_venue in enumerate(self.venues):
+            for j, sell_venue in enumerate(self.venues):
+                if i == j:
+                    continue
+                try:
+                    model = fees.get_model(buy_venue, sell_venue)
+                except RuntimeError as e:
+                    print(
+                        "not considering {} to {}: {}".format(buy_venue, sell_venue, e)
+                    )
+                    continue
+                self.buy_percent[i] = model.buy_percent
+                self.buy_fixed_usd[i] = model.buy_fixed_usd
+                self.sell_percent[j] = model.sell_percent
+                self.sell_fixed_usd[j] = model.sell_fixed_usd
+                self.shipping_usd[i, j] = model.shipping_usd
+                self.routes[i, j] = True
+        return
+
+    def get_quotes(self, size_prices, now=None):
+        """
+        @param size_prices  {(style_id, size): {venue: {"prices": [...], ...}}}
+        @return keys, buy and sell quotes as (venue, key) arrays in USD, nan
+            where the venue has no fresh quote
+        """
+        if now is None:
+            now = datetime.datetime.utcnow()
+        oldest = np.datetime64(now, "us") - np.timedelta64(
+            int(QUOTE_LIFETIME_SECONDS * 1e6), "us"
+        )
+        keys = list(size_prices)
+        buy = np.full((len(self.venues), len(keys)), np.nan)
+        sell = np.full((len(self.venues), len(keys)), np.nan)
+        for i, venue in enumerate(self.venues):
+            conf = self.fees.get_venue_conf(venue)
+            owners = []
+            newest = []
+            for k_idx, k in enumerate(keys):
+                if venue in size_prices[k] and len(size_prices[k][venue]["prices"]) > 0:
+                    owners.append(k_idx)
+                    newest.append(size_prices[k][venue]["prices"][0])
+            if len(owners) == 0:
+                continue
+            fresh = parse_times([p["time"] for p in newest]) >= oldest
+            for quotes, field in [(buy, conf["buy_price"]), (sell, conf["sell_price"])]:
+                values = np.array(
+                    [p.get(field) if p.get(field) else np.nan for p in newest],
+                    dtype=np.float64,
+                )
+                values[~fresh] = np.nan
+                quotes[i, owners] = self.fx_rate.convert(
+                    values * conf["price_scale"], conf["quote_ccy"], "USD"
+                )
+        return keys, buy, sell
+
+    def compute(self, buy, sell):
+        """
+        @param buy, sell  (venue, key) quotes in USD
+        @return profit ratio and value as (buy venue, sell venue, key) arrays,
+            nan for routes that can't be taken
+        """
+        buy = buy[:, None, :]
+        sell = sell[None, :, :]
+        total_expenditure = (
+            buy
+            + (
+                buy * self.buy_percent[:, None, None] / 100
+                + self.buy_fixed_usd[:, None, None]
+            )
+            + self.shipping_usd[:, :, None]
+        )
+        total_income = sell - (
+            sell * self.sell_percent[None, :, None] / 100
+            + self.sell_fixed_usd[None, :, None]
+        )
+        value = total_income - total_expenditure
+        ratio = value / total_expenditure
+        value[~self.routes] = np.nan
+        ratio[~self.routes] = np.nan
+        return ratio, value
+
+    def get_best_routes(self, size_prices, now=None):
+        """
+        @return {(style_id, size): route} of keys with at least one route, route
+            being {"buy_venue", "sell_venue", "buy_price_usd", "sell_price_usd",
+            "profit_ratio", "profit_value"} of the highest profit ratio
+        """
+        keys, buy, sell = self.get_quotes(size_prices, now)
+        ratio, value = self.compute(buy, sell)
+        num_venues = len(self.venues)
+        flat_ratio = ratio.reshape(num_venues * num_venues, len(keys))
+        best = np.argmax(np.where(np.isnan(flat_ratio), -np.inf, flat_ratio), axis=0)
+        best_ratio = flat_ratio[best, np.arange(len(keys))]
+        best_buy, best_sell = np.divmod(best, num_venues)
+
+        routes = {}
+        for k_idx in np.flatnonzero(~np.isnan(best_ratio)).tolist():
+            i = int(best_buy[k_idx])
+            j = int(best_sell[k_idx])
+            routes[keys[k_idx]] = {
+                "buy_venue": self.venues[i],
+                "sell_venue": self.venues[j],
+                "buy_price_usd": float(buy[i, k_idx]),
+                "sell_price_usd": float(sell[j, k_idx]),
+                "profit_ratio": float(best_ratio[k_idx]),
+                "profit_value": float(value[i, j, k_idx]),
+            }
+        return routes
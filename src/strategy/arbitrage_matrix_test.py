@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+from arbitrage_matrix import ArbitrageMatrix
+from fees import Fees
+from fx_rate import FxRate
+
+
+def make_prices(time, **quotes):
+    return {"prices": [dict(time=time, **quotes)], "transactions": []}
+
+
+class TestArbitrageMatrix(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        rates_file = os.path.join(self.folder.name, "fx_rates.json")
+        with open(rates_file, "w") as outfile:
+            outfile.write(json.dumps({"CNY/USD": {"2019-12-01": 0.14}}))
+        self.fx_rate = FxRate(cache_file=None, rates_file=rates_file)
+        self.fees = Fees(
+            os.path.join(os.path.dirname(__file__), "fees.json"), self.fx_rate
+        )
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_best_routes(self):
+        now = datetime.datetime(2019, 12, 10, 12)
+        fresh = "2019-12-10T10:00:00.000Z"
+        stale = "2019-12-01T10:00:00.000Z"
+        size_prices = {
+            ("A-1", "9.5"): {
+                "stockx": make_prices(fresh, bid_price=95, ask_price=100),
+                "flightclub": make_prices(fresh, bid_price=80, ask_price=90),
+                "du": make_prices(fresh, list_price=150000),
+            },
+            ("B-2", "9.5"): {
+                "stockx": make_prices(fresh, bid_price=95, ask_price=100),
+                "du": make_prices(fresh, list_price=150000),
+            },
+            ("C-3", "9.5"): {"du": make_prices(fresh, list_price=150000)},
+            ("D-4", "9.5"): {
+                "stockx": make_prices(stale, bid_price=95, ask_price=100),
+                "du": make_prices(fresh, list_price=150000),
+            },
+        }
+        matrix = ArbitrageMatrix(self.fees, self.fx_rate)
+        routes = matrix.get_best_routes(size_prices, now)
+        self.assertEqual(sorted(routes), [("A-1", "9.5"), ("B-2", "9.5")])
+
+        # selling on du at 1500 CNY = 210 USD nets
+        # 210 - 210 * 14 % - (8 + 15 + 10) CNY * 0.14 = 175.98 USD
+        route = routes[("A-1", "9.5")]
+        self.assertEqual(route["buy_venue"], "flightclub")
+        self.assertEqual(route["sell_venue"], "du")
+        self.assertAlmostEqual(route["buy_price_usd"], 90)
+        self.assertAlmostEqual(route["sell_price_usd"], 210)
+        # 90 + 14.5 buy side shipping + 15 shipping to du
+        self.assertAlmostEqual(route["profit_value"], 175.98 - 119.5)
+        self.assertAlmostEqual(route["profit_ratio"], (175.98 - 119.5) / 119.5)
+
+        route = routes[("B-2", "9.5")]
+        self.assertEqual(route["buy_venue"], "stockx")
+        # 100 + 13.95 buy side shipping + 15 shipping to du
+        self.assertAlmostEqual(route["profit_value"], 175.98 - 128.95)
+        self.assertAlmostEqual(route["profit_ratio"], (175.98 - 128.95) / 128.95)
+
+        # only routes with shipping configured are considered
+        venues = matrix.venues
+        self.assertFalse(matrix.routes[venues.index("du"), venues.index("stockx")])
+        self.assertFalse(
+            matrix.routes[venues.index("flightclub"), venues.index("stockx")]
+        )
+        with self.assertRaises(RuntimeError):
+            self.fees.get_shipping_cost("flightclub", "stockx")
+
+
+if __name__ == "__main__":
+    unittest.main()
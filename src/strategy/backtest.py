@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+
+import sys
+
+# hack for import
+sys.path.append("../feed/")
+
+import argparse
+import csv
+import time
+
+import numpy as np
+
+from time_series_serializer import STORAGE_FORMATS
+from time_series_json import parse_times
+from fees import Fees
+from fx_rate import FxRate, AsOfFxRate
+from strategy import Strategy, parse_strategy_options
+from strategy_engine import MarketArrays, StrategyEngine
+
+"""
+Replay stored time series through the strategy filters: what would the
+strategy have recommended on each of a range of dates, and what did those
+(style_id, size) trade at on du in the days after.
+
+Readings of all keys are loaded once and indexed by (key, time)
+(AsOfSeries), so the latest reading of every key as of any time is one
+searchsorted. Dates are replayed in order, and the market arrays the filters
+run on (AsOfMarket) are only updated for keys with readings since the
+previous date.
+
+As of a date, a key's newest du transaction is the latest one by time, and
+transactions after the date are unknown to the filters; they are what the
+recommendation is measured with:
+    realized profit ratio = profit of buying at the stockx ask as of the date
+        and selling at the average du transaction price of the following
+        horizon_days
+"""
+
+
+def to_seconds(times, ceil=False):
+    """
+    @return epoch seconds of datetime64 times, rounded down, or up if ceil
+    """
+    microseconds = np.asarray(times).astype("datetime64[us]").astype(np.int64)
+    if ceil:
+        return -(-microseconds // 1000000)
+    return microseconds // 1000000
+
+
+class AsOfSeries:
+    """
+    Readings of keys 0..num_keys-1, in flat arrays sorted by (key, time).
+    """
+
+    def __init__(self, num_keys, key_ids, times, fields):
+        """
+        @param key_ids  key of each reading
+        @param times    datetime64 time of each reading
+        @param fields   {name: array of a value of each reading}
+        """
+        self.num_keys = num_keys
+        key_ids = np.asarray(key_ids, dtype=np.int64)
+        times = np.asarray(times).astype("datetime64[us]")
+        order = np.lexsort((times, key_ids))
+        # a reading is at or before a whole second if its time rounded up is
+        seconds = to_seconds(times, ceil=True)
+        self.key_ids = key_ids[order]
+        self.times = times[order]
+        self.fields = {name: np.asarray(v)[order] for name, v in fields.items()}
+
+        # readings sorted by (key, time) are sorted by this one number, so
+        # that the reading of every key as of a time is one searchsorted
+        self.origin = seconds.min() if len(seconds) > 0 else 0
+        self.span = (seconds.max() - self.origin + 2) if len(seconds) > 0 else 2
+        self.composite = self.key_ids * self.span + (seconds[order] - self.origin)
+        self.starts = np.searchsorted(self.key_ids, np.arange(num_keys), "left")
+        # cumulative sums of each field, for sums over ranges of readings
+        self.cumsums = {}
+        return
+
+    def _search(self, time, key_ids):
+        offset = np.clip(to_seconds(time) - self.origin, -1, self.span - 1)
+        return np.searchsorted(
+            self.composite, key_ids * self.span + offset, side="right"
+        )
+
+    def index_as_of(self, time, key_ids=None):
+        """
+        @return index of the latest reading at or before time (to the second)
+            of each of key_ids (default all keys), -1 for keys without one
+        """
+        if key_ids is None:
+            key_ids = np.arange(self.num_keys)
+        idx = self._search(time, key_ids) - 1
+        idx[idx < self.starts[key_ids]] = -1
+        return idx
+
+    def sum_between(self, name, begin, end, key_ids):
+        """
+        @return number and sum of field name of the readings of each of key_ids
+            after begin, at or before end
+        """
+        if name not in self.cumsums:
+            self.cumsums[name] = np.concatenate(
+                [[0], np.cumsum(self.fields[name], dtype=np.float64)]
+            )
+        lo = self._search(begin, key_ids)
+        hi = self._search(end, key_ids)
+        cumsum = self.cumsums[name]
+        return hi - lo, cumsum[hi] - cumsum[lo]
+
+    def gather(self, name, idx, missing):
+        """
+        @return field name ("time" for times) of readings idx, missing for -1
+        """
+        values = self.times if name == "time" else self.fields[name]
+        if len(values) == 0:
+            return np.full(len(idx), missing, dtype=values.dtype)
+        return np.where(idx >= 0, values[np.maximum(idx, 0)], missing)
+
+
+class AsOfMarket(MarketArrays):
+    """
+    MarketArrays of size_prices as of a point in time that moves forward with
+    `advance`.
+    """
+
+    def __init__(self, size_prices):
+        """
+        @param size_prices  {(style_id, size): {venue: {"prices": [...], "transactions": [...]}}},
+            full histories
+        """
+        self.keys = [k for k, v in size_prices.items() if "du" in v and "stockx" in v]
+        num_keys = len(self.keys)
+        self.du_prices = self._index(
+            [size_prices[k]["du"]["prices"] for k in self.keys], ["list_price"]
+        )
+        self.stockx_prices = self._index(
+            [size_prices[k]["stockx"]["prices"] for k in self.keys],
+            ["bid_price", "ask_price"],
+        )
+        self.du_transactions = self._index(
+            [size_prices[k]["du"]["transactions"] for k in self.keys], ["price"]
+        )
+
+        epoch = np.datetime64(0, "us")
+        self.du_list = np.full(num_keys, np.nan)
+        self.stockx_bid = np.full(num_keys, np.nan)
+        self.stockx_ask = np.full(num_keys, np.nan)
+        self.du_last = np.full(num_keys, np.nan)
+        self.du_time = np.full(num_keys, epoch, dtype="datetime64[us]")
+        self.stockx_time = np.full(num_keys, epoch, dtype="datetime64[us]")
+        self.du_transaction_time = np.full(num_keys, epoch, dtype="datetime64[us]")
+        # index of the reading each key is at in each series, -1 for none yet
+        self.cursors = {
+            "du_prices": np.full(num_keys, -1),
+            "stockx_prices": np.full(num_keys, -1),
+            "du_transactions": np.full(num_keys, -1),
+        }
+        return
+
+    def _index(self, readings_of_keys, names):
+        key_ids = []
+        time_strs = []
+        fields = {name: [] for name in names}
+        for key_id, readings in enumerate(readings_of_keys):
+            for r in readings:
+                key_ids.append(key_id)
+                time_strs.append(r["time"])
+                for name in names:
+                    fields[name].append(np.nan if r.get(name) is None else r[name])
+        return AsOfSeries(
+            len(readings_of_keys),
+            key_ids,
+            parse_times(time_strs),
+            {name: np.array(v, dtype=np.float64) for name, v in fields.items()},
+        )
+
+    def _advance(self, name, series, now):
+        idx = series.index_as_of(now)
+        changed = np.flatnonzero(idx != self.cursors[name])
+        self.cursors[name][changed] = idx[changed]
+        return changed, idx[changed]
+
+    def advance(self, now):
+        """
+        Move to now, which is no earlier than where the market was
+        """
+        epoch = np.datetime64(0, "us")
+        changed, idx = self._advance("du_prices", self.du_prices, now)
+        self.du_list[changed] = self.du_prices.gather("list_price", idx, np.nan)
+        self.du_time[changed] = self.du_prices.gather("time", idx, epoch)
+
+        changed, idx = self._advance("stockx_prices", self.stockx_prices, now)
+        self.stockx_bid[changed] = self.stockx_prices.gather("bid_price", idx, np.nan)
+        self.stockx_ask[changed] = self.stockx_prices.gather("ask_price", idx, np.nan)
+        self.stockx_time[changed] = self.stockx_prices.gather("time", idx, epoch)
+
+        changed, idx = self._advance("du_transactions", self.du_transactions, now)
+        self.du_last[changed] = self.du_transactions.gather("price", idx, np.nan)
+        self.du_transaction_time[changed] = self.du_transactions.gather(
+            "time", idx, epoch
+        )
+        return
+
+    def latest_transaction_times(self, indices, since):
+        return self.du_transaction_time
+
+
+class Backtester:
+    def __init__(self, fees_file, fx_rate, dated_fx=False):
+        """
+        @param dated_fx  use the fx rates of each date (fx_rate needs their
+            history) instead of spot
+        """
+        self.fees_file = fees_file
+        self.fx_rate = fx_rate
+        self.dated_fx = dated_fx
+        self.engine = StrategyEngine(Fees(fees_file, fx_rate), fx_rate)
+        return
+
+    def get_engine(self, date):
+        if not self.dated_fx:
+            return self.engine
+        fx_rate = AsOfFxRate(self.fx_rate, date)
+        return StrategyEngine(Fees(self.fees_file, fx_rate), fx_rate)
+
+    def run(self, size_prices, options, dates, horizon_days=7):
+        """
+        @param dates  increasing np.datetime64 to replay the strategy at
+        @return list of a summary of each of dates, and list of every
+            recommendation
+        """
+        begin = time.perf_counter()
+        market = AsOfMarket(size_prices)
+        print(
+            "indexed {} (style_id, size) pairs in {:.2f} s".format(
+                len(market.keys), time.perf_counter() - begin
+            )
+        )
+        horizon = np.timedelta64(int(horizon_days), "D")
+
+        summaries = []
+        recommendations = []
+        for date in dates:
+            market.advance(date)
+            engine = self.get_engine(date)
+            mask, metrics = engine.get_mask(market, options, date, verbose=False)
+            indices = np.flatnonzero(mask)
+
+            num_sales, sales_sum = market.du_transactions.sum_between(
+                "price", date, date + horizon, indices
+            )
+            with np.errstate(invalid="ignore", divide="ignore"):
+                realized_price = sales_sum / num_sales
+            realized = engine.get_profit(
+                market.stockx_ask[indices], realized_price / 100, "ratio"
+            )
+            predicted = metrics.get(options["sort"], np.full(len(market.keys), np.nan))
+            predicted = predicted[indices]
+
+            traded = num_sales > 0
+            summaries.append(
+                {
+                    "date": str(date),
+                    "recommended": len(indices),
+                    "traded": int(traded.sum()),
+                    "predicted": float(np.mean(predicted)) if len(indices) else np.nan,
+                    "realized": (
+                        float(np.mean(realized[traded])) if traded.any() else np.nan
+                    ),
+                    "hit_rate": (
+                        float(np.mean(realized[traded] > 0)) if traded.any() else np.nan
+                    ),
+                }
+            )
+            for i, key_idx in enumerate(indices.tolist()):
+                style_id, size = market.keys[key_idx]
+                recommendations.append(
+                    {
+                        "date": str(date),
+                        "style_id": style_id,
+                        "size": size,
+                        "stockx_ask": float(market.stockx_ask[key_idx]),
+                        "du_list_price": float(market.du_list[key_idx] / 100),
+                        "predicted": float(predicted[i]),
+                        "num_sales": int(num_sales[i]),
+                        "realized_price": float(realized_price[i]),
+                        "realized": float(realized[i]),
+                    }
+                )
+        print(
+            "replayed {} dates in {:.2f} s".format(
+                len(dates), time.perf_counter() - begin
+            )
+        )
+        return summaries, recommendations
+
+
+def report(summaries, sort):
+    print(
+        "{:<12}{:>12}{:>8}{:>12}{:>12}{:>10}".format(
+            "date", "recommended", "traded", "predicted", "realized", "hit rate"
+        )
+    )
+    for s in summaries:
+        print(
+            "{:<12}{:>12}{:>8}{:>12.4f}{:>12.4f}{:>10.2f}".format(
+                s["date"],
+                s["recommended"],
+                s["traded"],
+                s["predicted"],
+                s["realized"],
+                s["hit_rate"],
+            )
+        )
+    print(
+        "predicted is the average {} of recommendations, realized their "
+        "average realized profit ratio".format(sort)
+    )
+    return
+
+
+def write_csv(rows, outfile_path):
+    if len(rows) == 0:
+        return
+    with open(outfile_path, "w") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    return
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("""
+        replay stored time series through the strategy filters.
+
+        example usage:
+          ./backtest.py --start_from ../feed/merged.20191225.csv --data_folder ../data --start_date 2019-06-01 --end_date 2019-12-01
+    """)
+    parser.add_argument(
+        "--start_from",
+        help="the merged static info containing all eligible pairs to ask for",
+    )
+    parser.add_argument(
+        "--data_folder",
+        help="the data folder from where to look for price and transaction readings",
+    )
+    parser.add_argument(
+        "--storage_format",
+        help="how time series in data_folder are stored, one of {} (default json)".format(
+            STORAGE_FORMATS
+        ),
+    )
+    parser.add_argument(
+        "--load_threads",
+        default=1,
+        help="read data_folder with this many threads",
+    )
+    parser.add_argument("--start_date", help="%%Y-%%m-%%d, first date to replay")
+    parser.add_argument("--end_date", help="%%Y-%%m-%%d, last date to replay")
+    parser.add_argument(
+        "--step_days", default=1, type=int, help="replay every this many days"
+    )
+    parser.add_argument(
+        "--horizon_days",
+        default=7,
+        type=int,
+        help="measure recommendations with du transactions of this many days after",
+    )
+    parser.add_argument("--options", default="options.json", help="strategy options")
+    parser.add_argument(
+        "--fx_rates_file",
+        help="local fx rates to use instead of fetching them (see fx_rate.py)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="never fetch fx rates, use the cached or local ones",
+    )
+    parser.add_argument(
+        "--dated_fx",
+        action="store_true",
+        help="use the fx rate of each date, from the history of fx_rates_file",
+    )
+    parser.add_argument("--output", help="write the summary of each date to this csv")
+    parser.add_argument(
+        "--recommendations_output",
+        help="write every recommendation and how it did to this csv",
+    )
+    args = parser.parse_args()
+    if not args.start_from or not args.start_date or not args.end_date:
+        raise RuntimeError(
+            "args.start_from, args.start_date and args.end_date are required in backtest"
+        )
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    fx_rate = FxRate(rates_file=args.fx_rates_file, offline=args.offline)
+    strategy = Strategy("fees.json", fx_rate)
+    strategy.load_static_info(args.start_from)
+    strategy.load_all_size_prices(
+        args.data_folder, args.storage_format, args.load_threads
+    )
+    options = parse_strategy_options(args.options)
+
+    dates = np.arange(
+        np.datetime64(args.start_date, "D"),
+        np.datetime64(args.end_date, "D") + 1,
+        args.step_days,
+    )
+    backtester = Backtester("fees.json", fx_rate, args.dated_fx)
+    summaries, recommendations = backtester.run(
+        strategy.get_size_prices(), options, dates, args.horizon_days
+    )
+    report(summaries, options["sort"])
+    if args.output:
+        write_csv(summaries, args.output)
+    if args.recommendations_output:
+        write_csv(recommendations, args.recommendations_output)
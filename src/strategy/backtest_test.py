@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import datetime
+import json
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from backtest import Backtester
+from fees import Fees
+from fx_rate import FxRate
+from strategy_engine import StrategyEngine
+
+
+def make_size_prices(num_keys, start, days):
+    random.seed(3)
+    size_prices = {}
+    for k in range(num_keys):
+        base = random.uniform(100, 300)
+        du_prices = []
+        stockx_prices = []
+        transactions = []
+        for d in range(days):
+            time = start + datetime.timedelta(days=d, hours=random.uniform(0, 24))
+            du_prices.append(
+                {
+                    "time": time.isoformat() + "Z",
+                    "list_price": round(base * 7 * 100 * random.uniform(1.0, 1.6)),
+                }
+            )
+            bid = round(base * random.uniform(0.8, 1.0))
+            stockx_prices.append(
+                {
+                    "time": time.isoformat(timespec="milliseconds") + "Z",
+                    "bid_price": bid,
+                    "ask_price": bid + random.randint(1, 40),
+                }
+            )
+            if random.random() < 0.3:
+                transactions.append(
+                    {
+                        "time": time.isoformat() + "Z",
+                        "price": round(base * 7 * 100 * random.uniform(0.9, 1.7)),
+                        "id": "{}-{}".format(k, d),
+                    }
+                )
+        # newest first, as stored
+        size_prices[("S{}".format(k), "9.5")] = {
+            "du": {"prices": du_prices[::-1], "transactions": transactions[::-1]},
+            "stockx": {"prices": stockx_prices[::-1], "transactions": []},
+        }
+    return size_prices
+
+
+def as_of(size_prices, date):
+    """
+    size_prices with only the readings at or before date
+    """
+    cutoff = date.isoformat()
+    return {
+        k: {
+            venue: {
+                "prices": [p for p in v["prices"] if p["time"] <= cutoff],
+                "transactions": [t for t in v["transactions"] if t["time"] <= cutoff],
+            }
+            for venue, v in data.items()
+        }
+        for k, data in size_prices.items()
+    }
+
+
+class TestBacktest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        rates_file = os.path.join(self.folder.name, "fx_rates.json")
+        with open(rates_file, "w") as outfile:
+            outfile.write(json.dumps({"CNY/USD": {"2019-12-01": 0.14}}))
+        self.fx_rate = FxRate(cache_file=None, rates_file=rates_file)
+        self.fees_file = os.path.join(os.path.dirname(__file__), "fees.json")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_same_as_filtering_history_as_of(self):
+        start = datetime.datetime(2019, 11, 1)
+        size_prices = make_size_prices(40, start, 30)
+        options = {
+            "cutoff_net_profit_ratio_mid_to_last": 0.1,
+            "cutoff_net_profit_value_bid_to_listing": 10.0,
+            "transaction_lifetime_seconds": 5 * 86400,
+            "sort": "profit_ratio_mid_to_last",
+        }
+        dates = np.arange(
+            np.datetime64("2019-11-03"), np.datetime64("2019-11-28"), 2
+        ).astype("datetime64[D]")
+        backtester = Backtester(self.fees_file, self.fx_rate)
+        _, recommendations = backtester.run(size_prices, options, dates, 3)
+
+        engine = StrategyEngine(Fees(self.fees_file, self.fx_rate), self.fx_rate)
+        expected = []
+        for date in dates:
+            now = date.astype(datetime.datetime)
+            matched = engine.filter(as_of(size_prices, now), options, now)
+            expected += [(str(date), k[0]) for k in matched]
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(
+            [(r["date"], r["style_id"]) for r in recommendations], expected
+        )
+
+        r = recommendations[0]
+        date = np.datetime64(r["date"])
+        later = [
+            t["price"]
+            for t in size_prices[(r["style_id"], r["size"])]["du"]["transactions"]
+            if date < np.datetime64(t["time"][:-1]) <= date + np.timedelta64(3, "D")
+        ]
+        self.assertEqual(r["num_sales"], len(later))
+        if later:
+            self.assertAlmostEqual(r["realized_price"], np.mean(later))
+
+
+if __name__ == "__main__":
+    unittest.main()
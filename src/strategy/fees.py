@@ -1,53 +1,168 @@
 #!/usr/bin/env python3
 
 import json
+
+import numpy as np
+
 from fx_rate import FxRate
 
 
+class FeeModel:
+    """
+    Fees of buying on buy_venue and selling on sell_venue, compiled from the
+    fees conf once. All in USD:
+        total_expenditure = buy_price + (buy_price * buy_percent / 100 + buy_fixed)
+                            + shipping
+        total_income = sell_price - (sell_price * sell_percent / 100 + sell_fixed)
+
+    Methods take scalars or numpy arrays alike.
+    """
+
+    def __init__(
+        self, buy_percent, buy_fixed_usd, shipping_usd, sell_percent, sell_fixed_usd
+    ):
+        self.buy_percent = buy_percent
+        self.buy_fixed_usd = buy_fixed_usd
+        self.shipping_usd = shipping_usd
+        self.sell_percent = sell_percent
+        self.sell_fixed_usd = sell_fixed_usd
+        return
+
+    def get_buy_side_fees(self, buy_price_usd):
+        return buy_price_usd * self.buy_percent / 100 + self.buy_fixed_usd
+
+    def get_total_expenditure(self, buy_price_usd):
+        return buy_price_usd + self.get_buy_side_fees(buy_price_usd) + self.shipping_usd
+
+    def get_sell_side_fees(self, sell_price_usd):
+        return sell_price_usd * self.sell_percent / 100 + self.sell_fixed_usd
+
+    def get_total_income(self, sell_price_usd):
+        return sell_price_usd - self.get_sell_side_fees(sell_price_usd)
+
+    def get_sell_price_for_income(self, total_income_usd):
+        """
+        The reverse of `get_total_income`
+        """
+        return (total_income_usd + self.sell_fixed_usd) / (
+            1 - (self.sell_percent / 100)
+        )
+
+    def get_profit_percent(self, buy_price_usd, sell_price_usd):
+        total_expenditure = self.get_total_expenditure(buy_price_usd)
+        total_income = self.get_total_income(sell_price_usd)
+        return (total_income - total_expenditure) / total_expenditure
+
+    def get_profit_value(self, buy_price_usd, sell_price_usd):
+        return self.get_total_income(sell_price_usd) - self.get_total_expenditure(
+            buy_price_usd
+        )
+
+    def get_sell_price_for_target_ratio(self, target_ratio, buy_price_usd):
+        """
+        The reverse of `get_profit_percent`
+        """
+        total_income = self.get_total_expenditure(buy_price_usd) * (1 + target_ratio)
+        return self.get_sell_price_for_income(total_income)
+
+
 class Fees:
     def __init__(self, conf_file, fx_rate):
         with open(conf_file, "r") as infile:
             self.conf = json.loads(infile.read())
         self.fx_rate = fx_rate
+        # (buy_venue, sell_venue) => FeeModel, compiled on first use
+        self.models = {}
+        # (venue, side) => (percent, fixed USD), compiled on first use
+        self.sides = {}
         return
 
+    def get_venues(self):
+        return list(self.conf["venues"])
+
+    def get_venue_conf(self, venue):
+        if venue not in self.conf["venues"]:
+            raise RuntimeError(
+                "fees: unsupported venue / unimplemented {}".format(venue)
+            )
+        return self.conf["venues"][venue]
+
+    def _get_side_coefficients(self, venue, side):
+        """
+        @param side  "buy" or "sell"
+        @return (percent of the price, fixed USD) taken on venue on side.
+            Fixed amounts are summed in their currency before conversion.
+        """
+        if (venue, side) not in self.sides:
+            self.sides[(venue, side)] = self._compile_side(venue, side)
+        return self.sides[(venue, side)]
+
+    def _compile_side(self, venue, side):
+        fees = self.get_venue_conf(venue)[side]
+        percent = 0
+        fixed = {}
+        for name, amount in fees.items():
+            unit = name.split("_")[-1]
+            if unit == "percent":
+                percent += amount
+            else:
+                fixed[unit.upper()] = fixed.get(unit.upper(), 0) + amount
+        fixed_usd = 0
+        for ccy, amount in fixed.items():
+            fixed_usd += self.fx_rate.get_spot_fx(amount, ccy, "USD")
+        return percent, fixed_usd
+
+    def get_model(self, buy_venue, sell_venue):
+        """
+        The compiled FeeModel of buying on buy_venue and selling on sell_venue
+        """
+        if (buy_venue, sell_venue) not in self.models:
+            buy_percent, buy_fixed_usd = self._get_side_coefficients(buy_venue, "buy")
+            sell_percent, sell_fixed_usd = self._get_side_coefficients(
+                sell_venue, "sell"
+            )
+            self.models[(buy_venue, sell_venue)] = FeeModel(
+                buy_percent,
+                buy_fixed_usd,
+                self.get_shipping_cost(buy_venue, sell_venue),
+                sell_percent,
+                sell_fixed_usd,
+            )
+        return self.models[(buy_venue, sell_venue)]
+
     def get_total_buy_side_fees(self, venue, buy_price_usd=None):
         """
         Buy side fees. All fees are denominated in USD.
         """
-        if venue == "stockx":
-            return self.conf[venue]["buy_shipping_usd"]
-        raise RuntimeError("fees: unsupported venue / unimplemented {}".format(venue))
+        buy_percent, buy_fixed_usd = self._get_side_coefficients(venue, "buy")
+        if buy_percent and not buy_price_usd:
+            raise RuntimeError(
+                "buy_price_usd is required to get fees on {}".format(venue)
+            )
+        if not buy_percent:
+            return buy_fixed_usd
+        return buy_price_usd * buy_percent / 100 + buy_fixed_usd
 
     def get_total_sell_side_fees(self, venue, sell_price_usd=None):
         """
         Sell side fees. All fees are denominated in USD.
         """
-        if venue == "du":
-            if not sell_price_usd:
-                raise RuntimeError(
-                    "sell_price_usd is required to get fees on {}".format(venue)
-                )
-            return sell_price_usd * (
-                self.conf[venue]["commission_percent"]
-                + self.conf[venue]["tech_service_percent"]
-                + self.conf[venue]["transfer_percent"]
-            ) / 100 + self.fx_rate.get_spot_fx(
-                self.conf[venue]["packaging_cny"]
-                + self.conf[venue]["verification_cny"]
-                + self.conf[venue]["service_cny"],
-                "CNY",
-                "USD",
+        if not sell_price_usd:
+            raise RuntimeError(
+                "sell_price_usd is required to get fees on {}".format(venue)
             )
-        raise RuntimeError("fees: unsupported venue / unimplemented {}".format(venue))
+        sell_percent, sell_fixed_usd = self._get_side_coefficients(venue, "sell")
+        return sell_price_usd * sell_percent / 100 + sell_fixed_usd
 
     def get_shipping_cost(self, buy_venue, sell_venue):
         """
         Cost of transfers the item from buy side to sell side: shipping, etc.
         All fees are denominated in USD.
         """
-        if buy_venue == "stockx" and sell_venue == "du":
-            return self.conf["shipping"]["stockx_du_usd"]
+        shipping = self.conf["shipping"]
+        name = "{}_{}_usd".format(buy_venue, sell_venue)
+        if name in shipping:
+            return shipping[name]
         raise RuntimeError(
             "fees: unsupported venue / unimplemented {} {}".format(
                 buy_venue, sell_venue
@@ -59,49 +174,14 @@ class Fees:
         The reverse of `get_total_sell_side_fees`.
         All fees are denominated in USD unless specified otherwise.
         """
-        if venue == "du":
-            list_price_usd = (
-                target_value_usd
-                + self.fx_rate.get_spot_fx(
-                    self.conf[venue]["packaging_cny"]
-                    + self.conf[venue]["verification_cny"]
-                    + self.conf[venue]["service_cny"],
-                    "CNY",
-                    "USD",
-                )
-            ) / (
-                1
-                - (
-                    (
-                        self.conf[venue]["commission_percent"]
-                        + self.conf[venue]["tech_service_percent"]
-                        + self.conf[venue]["transfer_percent"]
-                    )
-                    / 100
-                )
-            )
-            if not out_ccy or out_ccy == "USD":
-                return list_price_usd
-            else:
-                return self.fx_rate.get_spot_fx(list_price_usd, "USD", "CNY")
-        raise RuntimeError("fees: unsupported venue / unimplemented {}".format(venue))
-
-    def _get_income_expenditure(
-        self, buy_venue, sell_venue, buy_price_usd, sell_price, sell_price_ccy=None
-    ):
-        if not sell_price_ccy:
-            sell_price_usd = sell_price
-        else:
-            sell_price_usd = self.fx_rate.get_spot_fx(sell_price, sell_price_ccy, "USD")
-        total_expenditure = (
-            buy_price_usd
-            + self.get_total_buy_side_fees(buy_venue, buy_price_usd=buy_price_usd)
-            + self.get_shipping_cost(buy_venue, sell_venue)
+        sell_percent, sell_fixed_usd = self._get_side_coefficients(venue, "sell")
+        list_price_usd = (target_value_usd + sell_fixed_usd) / (
+            1 - (sell_percent / 100)
         )
-        total_income = sell_price_usd - self.get_total_sell_side_fees(
-            sell_venue, sell_price_usd=sell_price_usd
-        )
-        return total_income, total_expenditure
+        if not out_ccy or out_ccy == "USD":
+            return list_price_usd
+        else:
+            return self.fx_rate.get_spot_fx(list_price_usd, "USD", out_ccy)
 
     def get_profit_percent(
         self, buy_venue, sell_venue, buy_price_usd, sell_price, sell_price_ccy=None
@@ -113,14 +193,14 @@ class Fees:
             total_expenditure = buy_price + buy_fees + shipping_buy_to_sell
             total_income = sell_price - sell_fees
             ratio = (total_income - total_expenditure) / total_expenditure
-        
+
         All fees are denominated in USD unless specified otherwise.
         """
-        total_income, total_expenditure = self._get_income_expenditure(
-            buy_venue, sell_venue, buy_price_usd, sell_price, sell_price_ccy
+        if sell_price_ccy:
+            sell_price = self.fx_rate.get_spot_fx(sell_price, sell_price_ccy, "USD")
+        return self.get_model(buy_venue, sell_venue).get_profit_percent(
+            buy_price_usd, sell_price
         )
-        profit_ratio = (total_income - total_expenditure) / total_expenditure
-        return profit_ratio
 
     def get_profit_value(
         self, buy_venue, sell_venue, buy_price_usd, sell_price, sell_price_ccy=None
@@ -128,10 +208,11 @@ class Fees:
         """
         Similar as `get_profit_percent` but in value
         """
-        total_income, total_expenditure = self._get_income_expenditure(
-            buy_venue, sell_venue, buy_price_usd, sell_price, sell_price_ccy
+        if sell_price_ccy:
+            sell_price = self.fx_rate.get_spot_fx(sell_price, sell_price_ccy, "USD")
+        return self.get_model(buy_venue, sell_venue).get_profit_value(
+            buy_price_usd, sell_price
         )
-        return total_income - total_expenditure
 
     def get_target_list_price_for_target_ratio(
         self, buy_venue, sell_venue, target_ratio, buy_price_usd, out_ccy=None
@@ -140,16 +221,53 @@ class Fees:
         The reverse of `get_profit_percent`.
         All fees are denominated in USD unless specified otherwise.
         """
-        total_expenditure = (
-            buy_price_usd
-            + self.get_total_buy_side_fees(buy_venue, buy_price_usd=buy_price_usd)
-            + self.get_shipping_cost(buy_venue, sell_venue)
+        list_price = self.get_model(
+            buy_venue, sell_venue
+        ).get_sell_price_for_target_ratio(target_ratio, buy_price_usd)
+        if not out_ccy or out_ccy == "USD":
+            return list_price
+        return self.fx_rate.get_spot_fx(list_price, "USD", out_ccy)
+
+    def get_profit_percent_array(
+        self, buy_venue, sell_venue, buy_prices_usd, sell_prices, sell_price_ccy=None
+    ):
+        """
+        `get_profit_percent` of arrays of prices
+        """
+        sell_prices_usd = self.fx_rate.convert(
+            sell_prices, sell_price_ccy or "USD", "USD"
         )
-        total_income = total_expenditure * (1 + target_ratio)
-        list_price = self.get_list_price_for_sell_value(
-            sell_venue, total_income, out_ccy=out_ccy
+        return self.get_model(buy_venue, sell_venue).get_profit_percent(
+            np.asarray(buy_prices_usd, dtype=np.float64), sell_prices_usd
+        )
+
+    def get_profit_value_array(
+        self, buy_venue, sell_venue, buy_prices_usd, sell_prices, sell_price_ccy=None
+    ):
+        """
+        `get_profit_value` of arrays of prices
+        """
+        sell_prices_usd = self.fx_rate.convert(
+            sell_prices, sell_price_ccy or "USD", "USD"
+        )
+        return self.get_model(buy_venue, sell_venue).get_profit_value(
+            np.asarray(buy_prices_usd, dtype=np.float64), sell_prices_usd
+        )
+
+    def get_target_list_price_for_target_ratio_array(
+        self, buy_venue, sell_venue, target_ratios, buy_prices_usd, out_ccy=None
+    ):
+        """
+        `get_target_list_price_for_target_ratio` of arrays of target ratios and
+        / or buy prices
+        """
+        list_prices_usd = self.get_model(
+            buy_venue, sell_venue
+        ).get_sell_price_for_target_ratio(
+            np.asarray(target_ratios, dtype=np.float64),
+            np.asarray(buy_prices_usd, dtype=np.float64),
         )
-        return list_price
+        return self.fx_rate.convert(list_prices_usd, "USD", out_ccy or "USD")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from fees import Fees
+from fx_rate import FxRate
+
+
+class TestFees(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        rates_file = os.path.join(self.folder.name, "fx_rates.json")
+        with open(rates_file, "w") as outfile:
+            outfile.write(json.dumps({"CNY/USD": {"2019-12-01": 0.14}}))
+        fx_rate = FxRate(cache_file=None, rates_file=rates_file)
+        self.fees = Fees(os.path.join(os.path.dirname(__file__), "fees.json"), fx_rate)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_arrays_match_scalars(self):
+        buy_prices = np.array([100.0, 150.0, 220.0])
+        sell_prices = np.array([1200.0, 1500.0, 1300.0])
+        np.testing.assert_array_equal(
+            self.fees.get_profit_percent_array(
+                "stockx", "du", buy_prices, sell_prices, "CNY"
+            ),
+            [
+                self.fees.get_profit_percent("stockx", "du", b, s, "CNY")
+                for b, s in zip(buy_prices, sell_prices)
+            ],
+        )
+        np.testing.assert_array_equal(
+            self.fees.get_profit_value_array(
+                "stockx", "du", buy_prices, sell_prices, "CNY"
+            ),
+            [
+                self.fees.get_profit_value("stockx", "du", b, s, "CNY")
+                for b, s in zip(buy_prices, sell_prices)
+            ],
+        )
+
+    def test_target_list_price(self):
+        buy_prices = np.array([100.0, 150.0, 220.0])
+        list_prices = self.fees.get_target_list_price_for_target_ratio_array(
+            "stockx", "du", 0.2, buy_prices, "CNY"
+        )
+        self.assertAlmostEqual(
+            list_prices[1],
+            self.fees.get_target_list_price_for_target_ratio(
+                "stockx", "du", 0.2, 150.0, "CNY"
+            ),
+        )
+        np.testing.assert_allclose(
+            self.fees.get_profit_percent_array(
+                "stockx", "du", buy_prices, list_prices, "CNY"
+            ),
+            0.2,
+        )
+
+    def test_scalars_share_model_coefficients(self):
+        model = self.fees.get_model("stockx", "du")
+        self.assertAlmostEqual(
+            self.fees.get_total_sell_side_fees("du", 210.0),
+            model.get_sell_side_fees(210.0),
+        )
+        self.assertAlmostEqual(
+            self.fees.get_total_buy_side_fees("stockx"), model.get_buy_side_fees(0.0)
+        )
+        self.assertAlmostEqual(
+            self.fees.get_list_price_for_sell_value("du", 175.98),
+            model.get_sell_price_for_income(175.98),
+        )
+        # compiled once per (venue, side)
+        self.assertEqual(sorted(self.fees.sides), [("du", "sell"), ("stockx", "buy")])
+
+    def test_unsupported_venue(self):
+        with self.assertRaises(RuntimeError):
+            self.fees.get_model("goat", "du")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,248 @@
+#!/usr/bin/env python3
+
+import argparse
+import bisect
+import datetime
+import json
+import os
+import time
+
+import numpy as np
 import requests
 
+"""
+FX rates for converting prices between currencies.
+
+Rates of a pair, e.g. "CNY/USD" (1 CNY in USD), are kept as a dated history
+{"CNY/USD": {"2019-12-01": 0.1421, ...}}. The reverse of a known pair is
+derived. Spot rates come from, in order:
+  - what this process already looked up,
+  - the on-disk cache, if fetched within ttl_seconds,
+  - the source: a local rates file if given, otherwise
+    rate-exchange-1.appspot.com unless offline,
+  - the on-disk cache regardless of age, as a last resort.
+Dated rates (for backtests) are as of the latest date on or before the one
+asked for, from the rates file and everything cached.
+
+A rates file has the same format as the history, e.g.
+  {"CNY/USD": {"2019-12-01": 0.1421, "2019-12-02": 0.1423}}
+"""
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(__file__), "fx_rate_cache.json")
+
+
+def to_date_str(date):
+    """
+    @param date  datetime.date / datetime.datetime / np.datetime64 / "%Y-%m-%d"
+    """
+    if isinstance(date, str):
+        return date
+    if isinstance(date, np.datetime64):
+        return str(date.astype("datetime64[D]"))
+    return date.strftime("%Y-%m-%d")
+
 
 class FxRate:
-    def __init__(self):
+    def __init__(
+        self,
+        cache_file=DEFAULT_CACHE_FILE,
+        ttl_seconds=86400,
+        rates_file=None,
+        offline=False,
+    ):
+        """
+        @param cache_file  where fetched rates are kept between runs, None to
+            not keep them
+        @param rates_file  local rates to use instead of fetching
+        @param offline     never fetch
+        """
+        self.cache_file = cache_file
+        self.ttl_seconds = float(ttl_seconds)
+        self.offline = offline
+        # (in_ccy, out_ccy) => rate
         self.fx_rates = {}
 
-    def get_spot_fx(self, in_amount, in_ccy, out_ccy):
-        if not (in_ccy, out_ccy) in self.fx_rates:
-            r = requests.get(
-                "http://rate-exchange-1.appspot.com/currency?from={}&to={}".format(
-                    in_ccy, out_ccy
+        # pair => {date_str : rate}, pair => epoch seconds last fetched
+        self.cached = {}
+        self.fetched = {}
+        if cache_file and os.path.isfile(cache_file):
+            with open(cache_file, "r") as infile:
+                cache = json.loads(infile.read())
+            self.cached = cache["rates"]
+            self.fetched = cache["fetched"]
+
+        self.local = {}
+        if rates_file:
+            with open(rates_file, "r") as infile:
+                self.local = json.loads(infile.read())
+        return
+
+    @staticmethod
+    def _pair(in_ccy, out_ccy):
+        return "{}/{}".format(in_ccy, out_ccy)
+
+    @classmethod
+    def _lookup(cls, rates, in_ccy, out_ccy):
+        """
+        {date_str : rate} of in_ccy to out_ccy in rates, derived from the
+        reverse pair if needed
+        """
+        pair = cls._pair(in_ccy, out_ccy)
+        if pair in rates:
+            return rates[pair]
+        reverse = cls._pair(out_ccy, in_ccy)
+        if reverse in rates:
+            return {d: 1 / r for d, r in rates[reverse].items()}
+        return {}
+
+    @staticmethod
+    def _latest(history):
+        return history[max(history)] if len(history) > 0 else None
+
+    def _history(self, in_ccy, out_ccy):
+        history = dict(self._lookup(self.cached, in_ccy, out_ccy))
+        history.update(self._lookup(self.local, in_ccy, out_ccy))
+        return history
+
+    def _fetch(self, in_ccy, out_ccy):
+        r = requests.get(
+            "http://rate-exchange-1.appspot.com/currency?from={}&to={}".format(
+                in_ccy, out_ccy
+            ),
+            timeout=10,
+        )
+        rate = r.json()["rate"]
+        pair = self._pair(in_ccy, out_ccy)
+        today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+        self.cached.setdefault(pair, {})[today] = rate
+        self.fetched[pair] = time.time()
+        self._save_cache()
+        return rate
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+        with open(self.cache_file + ".tmp", "w") as outfile:
+            outfile.write(json.dumps({"rates": self.cached, "fetched": self.fetched}))
+        os.replace(self.cache_file + ".tmp", self.cache_file)
+        return
+
+    def get_rate(self, in_ccy, out_ccy, date=None):
+        """
+        How much 1 in_ccy is in out_ccy, at spot or as of date.
+        Throws RuntimeError if no rate can be found.
+        """
+        if in_ccy == out_ccy:
+            return 1.0
+        if date is not None:
+            return self.get_rates(in_ccy, out_ccy, [date])[0]
+        if (in_ccy, out_ccy) in self.fx_rates:
+            return self.fx_rates[(in_ccy, out_ccy)]
+
+        rate = None
+        pair = self._pair(in_ccy, out_ccy)
+        reverse = self._pair(out_ccy, in_ccy)
+        last_fetched = max(self.fetched.get(pair, 0), self.fetched.get(reverse, 0))
+        if time.time() - last_fetched < self.ttl_seconds:
+            rate = self._latest(self._lookup(self.cached, in_ccy, out_ccy))
+        if rate is None and self.local:
+            rate = self._latest(self._lookup(self.local, in_ccy, out_ccy))
+        elif rate is None and not self.offline:
+            try:
+                rate = self._fetch(in_ccy, out_ccy)
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                print("failed to fetch fx rate {}: {}".format(pair, e))
+        if rate is None:
+            rate = self._latest(self._lookup(self.cached, in_ccy, out_ccy))
+            if rate is not None:
+                print("using stale cached fx rate {} {}".format(pair, rate))
+        if rate is None:
+            raise RuntimeError("no fx rate found for {}".format(pair))
+        self.fx_rates[(in_ccy, out_ccy)] = rate
+        return rate
+
+    def get_rates(self, in_ccy, out_ccy, dates):
+        """
+        Rates as of each of dates (see to_date_str), as an array
+        """
+        if in_ccy == out_ccy:
+            return np.ones(len(dates))
+        history = self._history(in_ccy, out_ccy)
+        known = sorted(history)
+        rates = np.empty(len(dates))
+        for i, date in enumerate(dates):
+            idx = bisect.bisect_right(known, to_date_str(date)) - 1
+            if idx < 0:
+                raise RuntimeError(
+                    "no fx rate {} as of {}".format(self._pair(in_ccy, out_ccy), date)
                 )
+            rates[i] = history[known[idx]]
+        return rates
+
+    def get_spot_fx(self, in_amount, in_ccy, out_ccy, date=None):
+        return in_amount * self.get_rate(in_ccy, out_ccy, date)
+
+    def convert(self, amounts, in_ccy, out_ccy, dates=None):
+        """
+        Vectorized get_spot_fx.
+        @param amounts  array like
+        @param dates    None for spot, one date, or one date per amount
+        @return float array
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if dates is None or np.ndim(dates) == 0:
+            return amounts * self.get_rate(in_ccy, out_ccy, dates)
+        if isinstance(dates, np.ndarray) and np.issubdtype(dates.dtype, np.datetime64):
+            # one lookup per distinct day
+            days, inverse = np.unique(
+                dates.astype("datetime64[D]"), return_inverse=True
             )
-            self.fx_rates[(in_ccy, out_ccy)] = r.json()["rate"]
-        return in_amount * self.fx_rates[(in_ccy, out_ccy)]
+            return amounts * self.get_rates(in_ccy, out_ccy, days)[inverse]
+        return amounts * self.get_rates(in_ccy, out_ccy, dates)
+
+
+class AsOfFxRate:
+    """
+    FxRate as it was on a past date: spot lookups are that date's rates.
+    For fees and profits of a backtest (see backtest.py).
+    """
+
+    def __init__(self, fx_rate, date):
+        self.fx_rate = fx_rate
+        self.date = date
+        return
+
+    def get_rate(self, in_ccy, out_ccy, date=None):
+        return self.fx_rate.get_rate(
+            in_ccy, out_ccy, date if date is not None else self.date
+        )
+
+    def get_spot_fx(self, in_amount, in_ccy, out_ccy, date=None):
+        return in_amount * self.get_rate(in_ccy, out_ccy, date)
+
+    def convert(self, amounts, in_ccy, out_ccy, dates=None):
+        return self.fx_rate.convert(
+            amounts, in_ccy, out_ccy, dates if dates is not None else self.date
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("""
+        look up fx rates.
+
+        example usage:
+          ./fx_rate.py --in_ccy CNY --out_ccy USD
+          ./fx_rate.py --in_ccy CNY --out_ccy USD --date 2019-12-01 --rates_file fx_rates.json
+    """)
+    parser.add_argument("--in_ccy", default="CNY")
+    parser.add_argument("--out_ccy", default="USD")
+    parser.add_argument("--date", help="%%Y-%%m-%%d, spot if not given")
+    parser.add_argument("--rates_file", help="local rates to use instead of fetching")
+    parser.add_argument("--offline", action="store_true", help="never fetch")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    fx_rate = FxRate(rates_file=args.rates_file, offline=args.offline)
+    print(fx_rate.get_rate(args.in_ccy, args.out_ccy, args.date))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import datetime
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from fx_rate import FxRate
+
+
+class TestFxRate(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.rates_file = os.path.join(self.folder.name, "fx_rates.json")
+        with open(self.rates_file, "w") as outfile:
+            outfile.write(
+                json.dumps({"CNY/USD": {"2019-12-01": 0.14, "2019-12-03": 0.15}})
+            )
+        self.cache_file = os.path.join(self.folder.name, "fx_rate_cache.json")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write_cache(self, rate, fetched):
+        with open(self.cache_file, "w") as outfile:
+            outfile.write(
+                json.dumps(
+                    {
+                        "rates": {"CNY/USD": {"2019-12-05": rate}},
+                        "fetched": {"CNY/USD": fetched},
+                    }
+                )
+            )
+
+    def test_rates_file(self):
+        fx_rate = FxRate(cache_file=None, rates_file=self.rates_file)
+        self.assertEqual(fx_rate.get_rate("CNY", "USD"), 0.15)
+        self.assertAlmostEqual(fx_rate.get_spot_fx(15, "USD", "CNY"), 100)
+        self.assertEqual(fx_rate.get_spot_fx(3, "USD", "USD"), 3)
+        self.assertEqual(fx_rate.get_rate("CNY", "USD", "2019-12-02"), 0.14)
+        self.assertEqual(
+            fx_rate.get_rate("CNY", "USD", datetime.date(2019, 12, 3)), 0.15
+        )
+        with self.assertRaises(RuntimeError):
+            fx_rate.get_rate("CNY", "USD", "2019-11-30")
+        with self.assertRaises(RuntimeError):
+            fx_rate.get_rate("CNY", "EUR")
+
+    def test_convert(self):
+        fx_rate = FxRate(cache_file=None, rates_file=self.rates_file)
+        np.testing.assert_allclose(fx_rate.convert([100, 200], "CNY", "USD"), [15, 30])
+        np.testing.assert_allclose(
+            fx_rate.convert(
+                [100, 100, 100],
+                "CNY",
+                "USD",
+                np.array(
+                    ["2019-12-01T10:00", "2019-12-02T23:00", "2019-12-04T00:00"],
+                    dtype="datetime64[us]",
+                ),
+            ),
+            [14, 14, 15],
+        )
+
+    def test_cache(self):
+        # fresh cache is used before the rates file, stale cache after it
+        self.write_cache(0.2, time.time())
+        fx_rate = FxRate(self.cache_file, rates_file=self.rates_file)
+        self.assertEqual(fx_rate.get_rate("CNY", "USD"), 0.2)
+        self.write_cache(0.2, time.time() - 2 * 86400)
+        fx_rate = FxRate(self.cache_file, rates_file=self.rates_file)
+        self.assertEqual(fx_rate.get_rate("CNY", "USD"), 0.15)
+        # cached rates are history too
+        self.assertEqual(fx_rate.get_rate("CNY", "USD", "2019-12-06"), 0.2)
+
+        offline = FxRate(self.cache_file, offline=True)
+        self.assertEqual(offline.get_rate("CNY", "USD"), 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
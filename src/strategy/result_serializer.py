@@ -31,6 +31,11 @@ class ResultSerializer:
                     )
         if "du_analyzer" in annotation:
             stats = annotation["du_analyzer"]
+            stats_usd = self.fx_rate.convert(
+                [stats[k] for k in ["high", "low", "first", "last", "avg", "stdev"]],
+                "CNY",
+                "USD",
+            )
             return_str += "  Du Transactions:\n" \
                           "    First Date:       {}\n" \
                           "    Number of Sales:  {}\n" \
@@ -45,26 +50,34 @@ class ResultSerializer:
                             stats["first_date"].isoformat(),
                             stats["num_sales"],
                             stats["sales_per_day"],
-                            stats["high"], self.fx_rate.get_spot_fx(stats["high"], "CNY", "USD"),
-                            stats["low"], self.fx_rate.get_spot_fx(stats["low"], "CNY", "USD"),
-                            stats["first"], self.fx_rate.get_spot_fx(stats["first"], "CNY", "USD"),
-                            stats["last"], self.fx_rate.get_spot_fx(stats["last"], "CNY", "USD"),
-                            stats["avg"], self.fx_rate.get_spot_fx(stats["avg"], "CNY", "USD"),
-                            stats["stdev"], self.fx_rate.get_spot_fx(stats["stdev"], "CNY", "USD"),
+                            stats["high"], stats_usd[0],
+                            stats["low"], stats_usd[1],
+                            stats["first"], stats_usd[2],
+                            stats["last"], stats_usd[3],
+                            stats["avg"], stats_usd[4],
+                            stats["stdev"], stats_usd[5],
                             "./du_analyzer.py --style_id {} --size {} --mode plot".format(style_id, size))
         return return_str
 
     def to_str(self, sorted_size_prices, static_info, static_info_extras):
-        for i in sorted_size_prices:
+        du_prices_usd = self.fx_rate.convert(
+            [i["data"]["du"]["prices"][0]["list_price"] / 100 for i in sorted_size_prices],
+            "CNY",
+            "USD",
+        )
+        du_last_transactions_usd = self.fx_rate.convert(
+            [i["data"]["du"]["transactions"][0]["price"] / 100 for i in sorted_size_prices],
+            "CNY",
+            "USD",
+        )
+        for idx, i in enumerate(sorted_size_prices):
             style_id, size = i["identifier"]
             item = static_info[style_id]
             item_extras = static_info_extras[style_id]
             data = i["data"]
-            data["annotation"]["du_price_usd"] = self.fx_rate.get_spot_fx(
-                data["du"]["prices"][0]["list_price"] / 100, "CNY", "USD"
-            )
-            data["annotation"]["du_last_transaction_usd"] = self.fx_rate.get_spot_fx(
-                data["du"]["transactions"][0]["price"] / 100, "CNY", "USD"
+            data["annotation"]["du_price_usd"] = float(du_prices_usd[idx])
+            data["annotation"]["du_last_transaction_usd"] = float(
+                du_last_transactions_usd[idx]
             )
 
             # TODO: until merged has the right sizing, this reverse translation may
@@ -6,23 +6,50 @@ import sys
 sys.path.append("../feed/")
 
 import argparse
+import concurrent.futures
 import json
 import datetime
+import heapq
 
 from static_info_serializer import StaticInfoSerializer
-from time_series_serializer import TimeSeriesSerializer
+from time_series_serializer import TimeSeriesSerializer, STORAGE_FORMATS
+from time_series_json import parse_time
+from time_series_columnar import ColumnarTimeSeriesReader
+from time_series_loader import TimeSeriesLoader
+from latest_snapshot import LatestSnapshot
 from fees import Fees
 from fx_rate import FxRate
 from result_serializer import ResultSerializer
-from du_analyzer import ItemAnalyzer
+from du_analyzer import ItemAnalyzer, render_charts
+from analytics_cache import AnalyticsCache, cache_file
+from analytics_table import AnalyticsTable
+from strategy_engine import StrategyEngine
+from arbitrage_matrix import ArbitrageMatrix
+from strategy_state import StrategyState, load_last_updated, make_compact
+from strategy_sweep import StrategySweep, expand_grid, load_grid
+from strategy_sweep import report as report_sweep
+
+# option name => (rolling stat, whether the option is its minimum or maximum)
+ROLLING_CUTOFFS = {
+    "cutoff_min_rolling_sales": ("rolling_sales", True),
+    "cutoff_max_rolling_std": ("rolling_std", False),
+    "cutoff_max_realized_volatility": ("realized_volatility", False),
+    "cutoff_max_ewma_volatility": ("ewma_volatility", False),
+}
+
 
 class Strategy:
     def __init__(self, fees_file, fx_rate):
         self.static_info = {}
+        self.fees_file = fees_file
         self.fees = Fees(fees_file, fx_rate)
         self.fx_rate = fx_rate
         self.serializer = ResultSerializer(self.fees, self.fx_rate)
         self.analyzer = ItemAnalyzer()
+        # AnalyticsCache of du stats, if given
+        self.analytics_cache = None
+        # AnalyticsTable of du stats built in batch, if given
+        self.analytics_table = None
         return
 
     def load_static_info(self, static_info_file):
@@ -35,22 +62,272 @@ class Strategy:
         )
         return
 
-    def load_all_size_prices(self, data_folder):
-        serializer = TimeSeriesSerializer(data_folder)
+    def load_all_size_prices(
+        self,
+        data_folder,
+        storage_format=None,
+        threads=1,
+        decode_processes=0,
+        style_ids=None,
+    ):
+        """
+        @param style_ids  load only these, default all of the static info
+        """
+        if style_ids is None:
+            style_ids = list(self.static_info)
+        self.time_series = TimeSeriesSerializer(data_folder, storage_format)
+        if int(threads) > 1 or int(decode_processes) > 0:
+            loader = TimeSeriesLoader(
+                data_folder, storage_format, threads, decode_processes
+            )
+            self.all_size_prices = loader.load(style_ids)
+            loader.report()
+            return
+
         self.all_size_prices = {}
-        for style_id in self.static_info:
-            size_prices = serializer.get(style_id)
+        for style_id in style_ids:
+            size_prices = self.time_series.get(style_id)
             self.all_size_prices[style_id] = size_prices
         return
 
-    def run(self, options):
+    def load_all_size_prices_columnar(self, columnar_folder):
+        """
+        Load from a columnar copy of the data folder (see time_series_columnar.py).
+        Each venue holds only its newest price and transaction, which is all
+        the filters look at, and du transaction history as memory-mapped arrays.
+        """
+        reader = ColumnarTimeSeriesReader(columnar_folder)
+        self.all_size_prices = {}
+        for style_id in self.static_info:
+            self.all_size_prices[style_id] = reader.get_compact(style_id)
+        return
+
+    def load_all_size_prices_snapshot(
+        self, data_folder, storage_format=None, style_ids=None
+    ):
+        """
+        Load only the latest snapshot of the data folder (latest_snapshot.py).
+        Each venue holds its newest price and transaction; du transaction
+        history is read later for the items that pass the filters.
+
+        @param style_ids  load only these, default all of the static info
+        """
+        if style_ids is None:
+            style_ids = list(self.static_info)
+        snapshot = LatestSnapshot(data_folder)
+        self.time_series = TimeSeriesSerializer(data_folder, storage_format)
+        self.all_size_prices = {}
+        for style_id in style_ids:
+            self.all_size_prices[style_id] = snapshot.get(style_id)
+        return
+
+    def get_size_prices(self):
+        size_prices = {}
+        for style_id in self.all_size_prices:
+            for size in self.all_size_prices[style_id]:
+                size_prices[(style_id, size)] = self.all_size_prices[style_id][size]
+        return size_prices
+
+    def run_vectorized(self, options, top_k=None):
+        """
+        Same as `run`, with filters evaluated on arrays of all items at once
+        (strategy_engine.py)
+        """
+        engine = StrategyEngine(self.fees, self.fx_rate)
+        size_prices_profit_cutoff = engine.filter(self.get_size_prices(), options)
+        return self.rank(size_prices_profit_cutoff, options, top_k)
+
+    def run_incremental(self, options, state, last_updated, load, top_k=None):
+        """
+        Same as `run_vectorized`, recomputing only styles whose last_updated
+        changed since the run that left state (strategy_state.py), and reusing
+        the results of the others.
+
+        @param state         StrategyState, updated with this run's results
+        @param last_updated  {style_id: {venue: time}}, see load_last_updated
+        @param load          function loading the given style_ids into
+            all_size_prices, e.g. load_all_size_prices
+        """
+        state.reset_if_changed(options, self.fx_rate.get_rate("CNY", "USD"))
+        changed = state.get_changed_style_ids(list(self.static_info), last_updated)
+        print(
+            "total styles {}, {} changed since last run".format(
+                len(self.static_info), len(changed)
+            )
+        )
+        load(changed)
+        engine = StrategyEngine(self.fees, self.fx_rate)
+        recomputed = engine.filter(self.get_size_prices(), options)
+        state.update(changed, last_updated, recomputed)
+
+        changed_set = set(changed)
+        size_prices_profit_cutoff = state.get_matched(
+            [style_id for style_id in self.static_info if style_id not in changed_set]
+        )
+        size_prices_profit_cutoff.update(recomputed)
+        print(
+            "total (style_id, size) pairs {} satisfying all filters".format(
+                len(size_prices_profit_cutoff)
+            )
+        )
+        size_prices_profit_cutoff = self.filter_rolling_stats(
+            size_prices_profit_cutoff, options
+        )
+
+        if top_k:
+            ranked = self.select_top_k(size_prices_profit_cutoff, options, top_k)
+        else:
+            ranked = self.sort_results(size_prices_profit_cutoff, options)
+        entered, left = state.update_top([i["identifier"] for i in ranked])
+        for k in entered:
+            print("entered top results: {} {}".format(*k))
+        for k in left:
+            print("left top results: {} {}".format(*k))
+        state.save()
+        return self.annotate_in_order(ranked, options)
+
+    def run_sharded(
+        self,
+        options,
+        data_folder,
+        storage_format=None,
+        processes=2,
+        snapshot=False,
+        top_k=None,
+    ):
+        """
+        Same as `run_vectorized`, with styles sharded over a pool of processes.
+        Each process loads its shard from data_folder, filters it and
+        annotates what passes (with top_k, its own top_k, which the overall
+        top_k is among), and sends back only the newest readings of those;
+        they are ranked here.
+        """
+        style_ids = list(self.static_info)
+        processes = int(processes)
+        shards = [style_ids[i::processes] for i in range(processes)]
+        # looked up once here, so that workers don't each fetch it
+        self.fx_rate.get_rate("CNY", "USD")
+
+        analytics_cache_file = (
+            self.analytics_cache.cache_file if self.analytics_cache else None
+        )
+        analytics_table_file = (
+            self.analytics_table.path if self.analytics_table else None
+        )
+        results = {}
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            futures = [
+                pool.submit(
+                    run_shard,
+                    self.fees_file,
+                    self.fx_rate,
+                    shard,
+                    options,
+                    data_folder,
+                    storage_format,
+                    snapshot,
+                    top_k,
+                    analytics_cache_file,
+                    analytics_table_file,
+                )
+                for shard in shards
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                for i in future.result():
+                    results.setdefault(i["identifier"][0], []).append(i)
+
+        # in the order of the static info, as `run_vectorized` has them
+        size_prices = {}
+        for style_id in style_ids:
+            for i in results.get(style_id, []):
+                size_prices[i["identifier"]] = i["data"]
+                # workers only read the cache, the stats they computed are kept here
+                if analytics_cache_file and "du_analyzer" in i["data"]["annotation"]:
+                    self.analytics_cache.put(
+                        style_id,
+                        i["identifier"][1],
+                        i["data"]["du"]["transactions"][0]["id"],
+                        i["data"]["annotation"]["du_analyzer"],
+                    )
+        if top_k:
+            return self.select_top_k(size_prices, options, top_k)
+        return self.sort_results(size_prices, options)
+
+    def run_sweep(self, option_sets, top_n=5):
+        """
+        Evaluate each of option_sets on the loaded data (strategy_sweep.py)
+        """
+        sweep = StrategySweep(self.fees, self.fx_rate)
+        rolling_cache = {}
+        return sweep.run(
+            self.get_size_prices(),
+            option_sets,
+            top_n,
+            post_filter=lambda size_prices, options, now: self.filter_rolling_stats(
+                size_prices, options, now, rolling_cache
+            ),
+        )
+
+    def run_matrix(self, options):
+        """
+        Best route among all buy venue x sell venue pairs of the fees registry
+        for each (style_id, size) (arbitrage_matrix.py), of those with a profit
+        ratio above options["cutoff_best_route_profit_ratio"] (default 0).
+
+        @return list of {"data", "identifier"} sorted by best route profit ratio,
+            data annotated with "best_route"
+        """
+        matrix = ArbitrageMatrix(self.fees, self.fx_rate)
+        size_prices = self.get_size_prices()
+        print("total (style_id, size) pairs {}".format(len(size_prices)))
+        routes = matrix.get_best_routes(size_prices)
+        print("total (style_id, size) pairs {} with a route".format(len(routes)))
+
+        cutoff = options.get("cutoff_best_route_profit_ratio", 0)
+        matched = {}
+        for k, route in routes.items():
+            if route["profit_ratio"] > cutoff:
+                v = size_prices[k]
+                if "annotation" not in v:
+                    v["annotation"] = {}
+                v["annotation"]["best_route"] = route
+                v["annotation"]["profit_ratio_best_route"] = route["profit_ratio"]
+                matched[k] = v
+        print(
+            "total (style_id, size) pairs {} satisfying best route profit ratio cutoff of {}".format(
+                len(matched), cutoff
+            )
+        )
+        return self.sort_results(matched, dict(options, sort="profit_ratio_best_route"))
+
+    def report_matrix(self, sorted_size_prices):
+        for i in sorted_size_prices:
+            style_id, size = i["identifier"]
+            route = i["data"]["annotation"]["best_route"]
+            print(
+                "{} {}: buy on {} at {:.2f} USD, sell on {} at {:.2f} USD, "
+                "profit {:.2f} % {:.2f} USD".format(
+                    style_id,
+                    size,
+                    route["buy_venue"],
+                    route["buy_price_usd"],
+                    route["sell_venue"],
+                    route["sell_price_usd"],
+                    route["profit_ratio"] * 100,
+                    route["profit_value"],
+                )
+            )
+        return
+
+    def run(self, options, top_k=None):
         """
         Strategy execution.
         Steps:
           - load data (done at this point),
           - filter (configurable options),
           - rank (configurable method)
-        
+
+        @param top_k  keep only the best top_k items, see `rank`
         @return sorted list of
           {(style_id, size_str): { mkt_data, annotation }}
         """
@@ -58,10 +335,7 @@ class Strategy:
         matched_items = []
 
         # transform the input into {(style_id, size): data} format
-        size_prices = {}
-        for style_id in self.all_size_prices:
-            for size in self.all_size_prices[style_id]:
-                size_prices[(style_id, size)] = self.all_size_prices[style_id][size]
+        size_prices = self.get_size_prices()
         print("total (style_id, size) pairs {}".format(len(size_prices)))
 
         # filter items by having last valid 'du' and 'stockx' data
@@ -69,6 +343,9 @@ class Strategy:
             # TODO: here we want last reading to be valid, not necessarily
             if not ("du" in v and "stockx" in v):
                 return False
+            # compact loaders keep venues with transactions but no prices
+            if len(v["du"]["prices"]) == 0 or len(v["stockx"]["prices"]) == 0:
+                return False
             if (
                 not "list_price" in v["du"]["prices"][0]
                 or not "ask_price" in v["stockx"]["prices"][0]
@@ -115,7 +392,9 @@ class Strategy:
             return True
 
         size_prices_has_fresh_data = {
-            k: v for k, v in size_prices_has_data.items() if has_fresh_data(v)
+            k: v
+            for k, v in size_prices_has_data.items()
+            if has_fresh_data(v, options.get("price_lifetime_seconds", 259200))
         }
         print(
             "total (style_id, size) pairs {} with fresh data".format(
@@ -128,6 +407,11 @@ class Strategy:
             # 2 weeks
             if len(v["du"]["transactions"]) == 0:
                 return False
+            if "snapshot" in v["du"]:
+                transaction_time = parse_time(v["du"]["snapshot"]["transaction_time"])
+                return (
+                    datetime.datetime.utcnow() - transaction_time
+                ).total_seconds() < data_lifetime_seconds
             for i in v["du"]["transactions"]:
                 try:
                     transaction_time = datetime.datetime.strptime(
@@ -146,7 +430,9 @@ class Strategy:
         size_prices_has_fresh_transactions = {
             k: v
             for k, v in size_prices_has_fresh_data.items()
-            if has_fresh_recent_transactions(v)
+            if has_fresh_recent_transactions(
+                v, options.get("transaction_lifetime_seconds", 1.21e6)
+            )
         }
         print(
             "total (style_id, size) pairs {} with fresh transactions".format(
@@ -222,17 +508,156 @@ class Strategy:
                             )
                         )
 
+        return self.rank(size_prices_profit_cutoff, options, top_k)
+
+    def rank(self, size_prices, options, top_k=None):
+        """
+        Attach analytics to the filtered {(style_id, size): data} and sort them
+        by options["sort"].
+
+        With top_k, only the best top_k items are selected, with a heap of
+        top_k items rather than a sort of all of them, and analytics are
+        computed for those only. The selected items are returned as a
+        generator that annotates each one as it is consumed, in rank order,
+        so that reporting can start with the first.
+        """
+        size_prices = self.filter_rolling_stats(size_prices, options)
+        if top_k:
+            return self.annotate_in_order(
+                self.select_top_k(size_prices, options, top_k), options
+            )
         # attach analytics
         if options["generate_du_historical_stats"]:
-            for k in size_prices_profit_cutoff:
-                transactions = ItemAnalyzer.to_ordered_sale_record(size_prices_profit_cutoff[k]["du"]["transactions"])
-                size_prices_profit_cutoff[k]["annotation"]["du_analyzer"] = self.analyzer.get_historical_transactions_stats(transactions)
-
-        # sort
-        result_array = [
-            {"data": size_prices_profit_cutoff[k], "identifier": k}
-            for k in size_prices_profit_cutoff
+            self.attach_du_historical_stats(size_prices)
+        return self.sort_results(size_prices, options)
+
+    def select_top_k(self, size_prices, options, top_k):
+        """
+        The top_k items of the highest options["sort"] annotation, in the same
+        order as `sort_results` would put them (ties keep their original order)
+        """
+        heap = []
+        for idx, (k, v) in enumerate(size_prices.items()):
+            # -idx: of equal values, the earlier item ranks higher
+            entry = (v["annotation"][options["sort"]], -idx, k)
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+        heap.sort(reverse=True)
+        print("total results {}, reporting top {}".format(len(size_prices), len(heap)))
+        return [{"data": size_prices[k], "identifier": k} for _, _, k in heap]
+
+    def annotate_in_order(self, sorted_size_prices, options):
+        for i in sorted_size_prices:
+            if options["generate_du_historical_stats"]:
+                self.attach_du_historical_stats({i["identifier"]: i["data"]})
+            yield i
+        return
+
+    def attach_du_historical_stats(self, size_prices):
+        """
+        Annotate each of {(style_id, size): data} with du transaction stats
+        """
+        for k in size_prices:
+            du = size_prices[k]["du"]
+            if "transaction_arrays" in du:
+                stats = self.analyzer.get_historical_transactions_stats_from_arrays(
+                    du["transaction_arrays"]["time"], du["transaction_arrays"]["price"]
+                )
+            else:
+                newest_id = du["transactions"][0].get("id")
+                stats = None
+                if self.analytics_table is not None and newest_id is not None:
+                    stats = self.analytics_table.get(k[0], k[1], newest_id)
+                if (
+                    stats is None
+                    and self.analytics_cache is not None
+                    and newest_id is not None
+                ):
+                    stats = self.analytics_cache.get(k[0], k[1], newest_id)
+                if stats is None:
+                    self.load_du_history(k, du)
+                    stats = self.analyzer.get_historical_transactions_stats_from_arrays(
+                        *ItemAnalyzer.to_arrays(du["transactions"])
+                    )
+                    if self.analytics_cache is not None and newest_id is not None:
+                        self.analytics_cache.put(k[0], k[1], newest_id, stats)
+            size_prices[k]["annotation"]["du_analyzer"] = stats
+        return
+
+    def load_du_history(self, k, du):
+        """
+        Read the whole du transaction history of k into du, if only the newest
+        transaction was loaded (from the latest snapshot)
+        """
+        if "snapshot" in du and len(du["transactions"]) < du["snapshot"].get(
+            "num_transactions", len(du["transactions"]) + 1
+        ):
+            du["transactions"] = self.time_series.get_all_transactions(k[0], k[1], "du")
+        return
+
+    def filter_rolling_stats(self, size_prices, options, now=None, cache=None):
+        """
+        Keep the {(style_id, size): data} whose du rolling-window stats
+        (ItemAnalyzer.get_rolling_stats over options["rolling_window_days"],
+        default 7, up to now) satisfy the rolling cutoffs in options, see
+        ROLLING_CUTOFFS. Those kept are annotated with the stats as
+        "du_rolling". Without rolling cutoffs, size_prices is returned as is.
+
+        @param cache  dict to keep the stats in across calls with the same now,
+            e.g. for each option set of a sweep
+        """
+        cutoffs = [
+            (option_name, field, is_min)
+            for option_name, (field, is_min) in ROLLING_CUTOFFS.items()
+            if option_name in options
         ]
+        if not cutoffs:
+            return size_prices
+        if now is None:
+            now = datetime.datetime.utcnow()
+        window_days = options.get("rolling_window_days", 7)
+        ewma_decay = options.get("rolling_ewma_decay", 0.94)
+
+        result = {}
+        for k, v in size_prices.items():
+            cache_key = (k, window_days, ewma_decay)
+            if cache is not None and cache_key in cache:
+                rolling = cache[cache_key]
+            else:
+                du = v["du"]
+                if "transaction_arrays" in du:
+                    times = du["transaction_arrays"]["time"]
+                    prices = du["transaction_arrays"]["price"]
+                else:
+                    self.load_du_history(k, du)
+                    times, prices = ItemAnalyzer.to_arrays(du["transactions"])
+                rolling = self.analyzer.get_rolling_summary(
+                    times, prices, window_days, ewma_decay, now
+                )
+                if cache is not None:
+                    cache[cache_key] = rolling
+            # nan stats satisfy no cutoff
+            if all(
+                (
+                    rolling[field] >= options[option_name]
+                    if is_min
+                    else rolling[field] <= options[option_name]
+                )
+                for option_name, field, is_min in cutoffs
+            ):
+                v.setdefault("annotation", {})["du_rolling"] = rolling
+                result[k] = v
+        print(
+            "total (style_id, size) pairs {} satisfying rolling cutoffs {}".format(
+                len(result), {c[0]: options[c[0]] for c in cutoffs}
+            )
+        )
+        return result
+
+    def sort_results(self, size_prices, options):
+        result_array = [{"data": size_prices[k], "identifier": k} for k in size_prices]
 
         result_array.sort(
             key=lambda x: x["data"]["annotation"][options["sort"]], reverse=True
@@ -241,12 +666,57 @@ class Strategy:
         return result_array
 
     def report(self, sorted_size_prices):
-        self.serializer.to_str(
-            sorted_size_prices, self.static_info, self.static_info_extras
-        )
+        """
+        @param sorted_size_prices  list, or generator of `rank` with top_k,
+            in which case each item is printed as soon as it's annotated
+        """
+        if isinstance(sorted_size_prices, list):
+            self.serializer.to_str(
+                sorted_size_prices, self.static_info, self.static_info_extras
+            )
+            return
+        for i in sorted_size_prices:
+            self.serializer.to_str([i], self.static_info, self.static_info_extras)
+            sys.stdout.flush()
         return
 
 
+def run_shard(
+    fees_file,
+    fx_rate,
+    style_ids,
+    options,
+    data_folder,
+    storage_format,
+    snapshot,
+    top_k,
+    analytics_cache_file=None,
+    analytics_table_file=None,
+):
+    """
+    Strategy.run_vectorized of style_ids, in a worker process of
+    Strategy.run_sharded.
+    @param analytics_cache_file  AnalyticsCache to look du stats up in, not
+        written to
+    @param analytics_table_file  AnalyticsTable to look du stats up in first
+    @return list of {"identifier", "data"}, data with the newest readings only
+    """
+    strategy = Strategy(fees_file, fx_rate)
+    if analytics_cache_file:
+        strategy.analytics_cache = AnalyticsCache(analytics_cache_file)
+    if analytics_table_file:
+        strategy.analytics_table = AnalyticsTable(analytics_table_file)
+    strategy.static_info = {style_id: None for style_id in style_ids}
+    if snapshot:
+        strategy.load_all_size_prices_snapshot(data_folder, storage_format, style_ids)
+    else:
+        strategy.load_all_size_prices(data_folder, storage_format, style_ids=style_ids)
+    return [
+        {"identifier": i["identifier"], "data": make_compact(i["data"])}
+        for i in strategy.run_vectorized(options, top_k)
+    ]
+
+
 def parse_args():
     parser = argparse.ArgumentParser(
         """
@@ -263,9 +733,103 @@ def parse_args():
         "--data_folder",
         help="the data folder from where to look for price and transaction readings",
     )
+    parser.add_argument(
+        "--columnar_folder",
+        help="load from this columnar copy of the data folder (time_series_columnar.py) instead of data_folder",
+    )
+    parser.add_argument(
+        "--load_threads",
+        default=1,
+        help="read data_folder with this many threads",
+    )
+    parser.add_argument(
+        "--decode_processes",
+        default=0,
+        help="decode json readings in this many processes (json storage format only)",
+    )
+    parser.add_argument(
+        "--fx_rates_file",
+        help="local fx rates to use instead of fetching them (see fx_rate.py)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="never fetch fx rates, use the cached or local ones",
+    )
+    parser.add_argument(
+        "--matrix",
+        action="store_true",
+        help="report the best route of every buy venue x sell venue pair in fees.json (arbitrage_matrix.py)",
+    )
+    parser.add_argument(
+        "--vectorized",
+        action="store_true",
+        help="evaluate filters on arrays of all items at once (strategy_engine.py)",
+    )
+    parser.add_argument(
+        "--top_k",
+        type=int,
+        help="report only the best top_k results, printing each as it is ranked",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="load only the latest snapshot of data_folder (latest_snapshot.py), reading du transaction history for matched items only",
+    )
+    parser.add_argument(
+        "--no_analytics_cache",
+        action="store_true",
+        help="always recompute du stats rather than reuse those of unchanged histories (analytics_cache.py)",
+    )
+    parser.add_argument(
+        "--analytics_cache_size",
+        default=100000,
+        type=int,
+        help="keep du stats of at most this many (style_id, size)",
+    )
+    parser.add_argument(
+        "--analytics_table",
+        help="look du stats up in this table built by analytics_table.py before computing them",
+    )
+    parser.add_argument(
+        "--processes",
+        default=1,
+        type=int,
+        help="shard styles over this many processes, each loading and filtering its shard",
+    )
+    parser.add_argument(
+        "--plot_folder",
+        help="also plot du transaction prices of each reported result into this folder, see du_analyzer.render_charts",
+    )
+    parser.add_argument(
+        "--sweep",
+        help="evaluate every combination of the option values in this file (see strategy_sweep.py), reporting counts and the top_k (default 5) of each",
+    )
+    parser.add_argument(
+        "--sweep_output",
+        help="with --sweep, also write the results to this csv",
+    )
+    parser.add_argument(
+        "--state_file",
+        help="recompute only styles updated since the run that left this file, see strategy_state.py",
+    )
+    parser.add_argument(
+        "--last_updated",
+        nargs="+",
+        default=["../feed/last_updated.log", "../feed/last_updated_stockx.log"],
+        help="last_updated files of the feeds, telling which styles were updated (with --state_file)",
+    )
+    parser.add_argument(
+        "--storage_format",
+        help="how time series in data_folder are stored, one of {} (default json)".format(
+            STORAGE_FORMATS
+        ),
+    )
     args = parser.parse_args()
     if not args.start_from:
         raise RuntimeError("args.start_from is required in strategy")
+    if args.processes > 1 and (args.sweep or args.matrix):
+        raise RuntimeError("args.processes is not supported with --sweep or --matrix")
     return args
 
 
@@ -278,9 +842,84 @@ def parse_strategy_options(options_file):
 
 if __name__ == "__main__":
     args = parse_args()
-    fx_rate = FxRate()
+    fx_rate = FxRate(rates_file=args.fx_rates_file, offline=args.offline)
     strategy = Strategy("fees.json", fx_rate)
     strategy.load_static_info(args.start_from)
-    strategy.load_all_size_prices(args.data_folder)
-    result = strategy.run(parse_strategy_options("options.json"))
-    strategy.report(result)
+    if args.data_folder and not args.no_analytics_cache:
+        strategy.analytics_cache = AnalyticsCache(
+            cache_file(args.data_folder), args.analytics_cache_size
+        )
+    if args.analytics_table:
+        strategy.analytics_table = AnalyticsTable(args.analytics_table)
+    if args.state_file or args.processes > 1:
+        # loaded by run_incremental / run_sharded
+        pass
+    elif args.columnar_folder:
+        strategy.load_all_size_prices_columnar(args.columnar_folder)
+    elif args.snapshot:
+        strategy.load_all_size_prices_snapshot(args.data_folder, args.storage_format)
+    else:
+        strategy.load_all_size_prices(
+            args.data_folder,
+            args.storage_format,
+            args.load_threads,
+            args.decode_processes,
+        )
+    options = parse_strategy_options("options.json")
+    # ranked results to report, if any
+    result = None
+    if args.state_file:
+        if args.snapshot:
+            load = lambda style_ids: strategy.load_all_size_prices_snapshot(
+                args.data_folder, args.storage_format, style_ids
+            )
+        else:
+            load = lambda style_ids: strategy.load_all_size_prices(
+                args.data_folder,
+                args.storage_format,
+                args.load_threads,
+                args.decode_processes,
+                style_ids,
+            )
+        result = strategy.run_incremental(
+            options,
+            StrategyState(args.state_file),
+            load_last_updated(args.last_updated),
+            load,
+            args.top_k,
+        )
+    elif args.processes > 1:
+        result = strategy.run_sharded(
+            options,
+            args.data_folder,
+            args.storage_format,
+            args.processes,
+            args.snapshot,
+            args.top_k,
+        )
+    elif args.sweep:
+        option_sets, combinations = expand_grid(options, load_grid(args.sweep))
+        results = strategy.run_sweep(option_sets, args.top_k if args.top_k else 5)
+        report_sweep(combinations, results, args.sweep_output)
+    elif args.matrix:
+        strategy.report_matrix(strategy.run_matrix(options))
+    elif args.vectorized:
+        result = strategy.run_vectorized(options, args.top_k)
+    else:
+        result = strategy.run(options, args.top_k)
+    if result is not None:
+        if args.plot_folder:
+            # reported one by one with top_k, kept for plotting after
+            result = list(result)
+        strategy.report(result)
+        if args.plot_folder:
+            render_charts(
+                [i["identifier"] for i in result],
+                args.data_folder,
+                args.plot_folder,
+                args.storage_format,
+                args.processes,
+            )
+    if strategy.analytics_cache is not None:
+        strategy.analytics_cache.report()
+        strategy.analytics_cache.save()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+
+import sys
+
+# hack for import
+sys.path.append("../feed/")
+
+import argparse
+import datetime
+import http.server
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from latest_snapshot import LatestSnapshot, snapshot_file
+from time_series_serializer import TimeSeriesSerializer, STORAGE_FORMATS
+from analytics_cache import AnalyticsCache, cache_file
+from fx_rate import FxRate
+from strategy import Strategy, parse_strategy_options
+from strategy_engine import StrategyEngine
+from strategy_state import get_expiry
+
+"""
+Long-running strategy: static info, fx rates and the latest readings are
+loaded once, and the ranking is kept current as feeds write.
+
+The in-memory index is the latest snapshot of the data folder
+(latest_snapshot.py), which du_feed.py and stockx_feed.js keep up to date
+whatever the storage format. Its files are polled for mtime changes; a
+changed venue file is read again and diffed with what was loaded, and only
+the styles whose entries differ are filtered again. Matched keys are dropped
+as their readings expire.
+
+The current ranking is served over http, as json rendered on every update so
+that reads only hand out bytes:
+  GET /top                              ranked keys and their annotations
+  GET /key?style_id=BQ6623-800&size=9.5 newest readings and annotations of a
+                                        matched key, 404 otherwise
+"""
+
+
+def to_json(value):
+    return json.dumps(value, default=str).encode()
+
+
+class StrategyDaemon:
+    def __init__(self, strategy, options, data_folder, storage_format=None, top_k=50):
+        """
+        @param top_k  annotate the top_k with du stats
+        """
+        self.strategy = strategy
+        self.options = options
+        self.data_folder = data_folder
+        self.storage_format = storage_format
+        self.top_k = top_k
+        self.engine = StrategyEngine(strategy.fees, strategy.fx_rate)
+        # venue => mtime of its snapshot file when last read
+        self.mtimes = {}
+        # (style_id, size) => data of keys passing the filters, and when their
+        # readings stop being fresh enough
+        self.matched = {}
+        self.expires = {}
+        # ties are ranked in the order of the static info, as in Strategy.run
+        self.order = {s: i for i, s in enumerate(strategy.static_info)}
+        self.top_response = to_json({"updated": None, "top": []})
+        # (style_id, size) => json response
+        self.details = {}
+        self.updated = None
+        return
+
+    def _get_mtimes(self):
+        mtimes = {}
+        for venue in self.snapshot.get_venues():
+            path = snapshot_file(self.data_folder, venue)
+            if os.path.isfile(path):
+                mtimes[venue] = os.stat(path).st_mtime_ns
+        return mtimes
+
+    def load(self):
+        self.snapshot = LatestSnapshot(self.data_folder)
+        # du transaction history, for stats
+        self.strategy.time_series = TimeSeriesSerializer(
+            self.data_folder, self.storage_format
+        )
+        self.mtimes = self._get_mtimes()
+        self.refresh(list(self.strategy.static_info))
+        return
+
+    def poll(self):
+        """
+        Apply what feeds wrote since the last poll
+        @return style_ids updated
+        """
+        self.snapshot.relist()
+        mtimes = self._get_mtimes()
+        changed = set()
+        for venue, mtime in mtimes.items():
+            if self.mtimes.get(venue) == mtime:
+                continue
+            previous = self.snapshot.reload(venue)
+            current = self.snapshot.get_venue(venue)
+            for style_id in set(previous) | set(current):
+                if previous.get(style_id) != current.get(style_id):
+                    changed.add(style_id)
+        self.mtimes = mtimes
+        changed = [s for s in self.strategy.static_info if s in changed]
+        if changed or self._expire():
+            self.refresh(changed)
+        return changed
+
+    def _expire(self, now=None):
+        if now is None:
+            now = datetime.datetime.utcnow()
+        now = np.datetime64(now, "us")
+        expired = [k for k, v in self.expires.items() if v <= now]
+        for k in expired:
+            del self.matched[k]
+            del self.expires[k]
+        return len(expired) > 0
+
+    def refresh(self, style_ids):
+        """
+        Filter style_ids again, and re-rank
+        """
+        begin = time.perf_counter()
+        style_ids_set = set(style_ids)
+        for k in [k for k in self.matched if k[0] in style_ids_set]:
+            del self.matched[k]
+            del self.expires[k]
+        size_prices = {}
+        for style_id in style_ids:
+            for size, data in self.snapshot.get(style_id).items():
+                size_prices[(style_id, size)] = data
+        for k, data in self.engine.filter(size_prices, self.options).items():
+            self.matched[k] = data
+            self.expires[k] = np.datetime64(get_expiry(data, self.options), "us")
+        self.matched = {
+            k: self.matched[k]
+            for k in sorted(self.matched, key=lambda k: self.order[k[0]])
+        }
+        self._expire()
+        self.rank()
+        print(
+            "refreshed {} styles in {:.3f} s".format(
+                len(style_ids), time.perf_counter() - begin
+            )
+        )
+        return
+
+    def rank(self):
+        ranked = self.strategy.sort_results(
+            self.strategy.filter_rolling_stats(self.matched, self.options),
+            self.options,
+        )
+        if self.options["generate_du_historical_stats"]:
+            self.strategy.attach_du_historical_stats(
+                {
+                    i["identifier"]: i["data"]
+                    for i in ranked[: self.top_k]
+                    if "du_analyzer" not in i["data"]["annotation"]
+                }
+            )
+        if self.strategy.analytics_cache is not None:
+            self.strategy.analytics_cache.save()
+
+        self.updated = datetime.datetime.utcnow().isoformat() + "Z"
+        details = {}
+        top = []
+        for rank, i in enumerate(ranked):
+            style_id, size = i["identifier"]
+            summary = {
+                "rank": rank,
+                "style_id": style_id,
+                "size": size,
+                "annotation": i["data"]["annotation"],
+            }
+            top.append(summary)
+            newest = {
+                venue: {
+                    "prices": v["prices"][:1],
+                    "transactions": v["transactions"][:1],
+                }
+                for venue, v in i["data"].items()
+                if venue != "annotation"
+            }
+            details[i["identifier"]] = to_json(dict(summary, data=newest))
+        # swapped in whole, readers see either the old or the new ranking
+        self.top_response = to_json({"updated": self.updated, "top": top})
+        self.details = details
+        return
+
+    def get_top(self):
+        return self.top_response
+
+    def get_detail(self, style_id, size):
+        return self.details.get((style_id, size))
+
+    def watch(self, interval_seconds):
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                self.poll()
+            except (OSError, ValueError) as e:
+                # e.g. a snapshot file being replaced, picked up next time
+                print("failed to poll: {}".format(e))
+
+    def serve(self, host, port, interval_seconds):
+        daemon = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                if url.path == "/top":
+                    body = daemon.get_top()
+                elif url.path == "/key":
+                    query = urllib.parse.parse_qs(url.query)
+                    body = daemon.get_detail(
+                        query.get("style_id", [""])[0], query.get("size", [""])[0]
+                    )
+                else:
+                    body = None
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        watcher = threading.Thread(
+            target=self.watch, args=(interval_seconds,), daemon=True
+        )
+        watcher.start()
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        print("serving on http://{}:{}/top".format(host, port))
+        server.serve_forever()
+        return
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("""
+        long-running strategy, serving the current ranking over http.
+
+        example usage:
+          ./strategy_daemon.py --start_from ../feed/merged.20191225.csv --data_folder ../data --port 8765
+          curl localhost:8765/top
+    """)
+    parser.add_argument(
+        "--start_from",
+        help="the merged static info containing all eligible pairs to ask for",
+    )
+    parser.add_argument(
+        "--data_folder",
+        default="../data",
+        help="the data folder from where to look for price and transaction readings",
+    )
+    parser.add_argument(
+        "--storage_format",
+        help="how time series in data_folder are stored, one of {} (default json)".format(
+            STORAGE_FORMATS
+        ),
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default=8765, type=int)
+    parser.add_argument(
+        "--interval_seconds",
+        default=5.0,
+        type=float,
+        help="poll the latest snapshot files this often",
+    )
+    parser.add_argument(
+        "--top_k", default=50, type=int, help="annotate the top_k with du stats"
+    )
+    parser.add_argument(
+        "--fx_rates_file",
+        help="local fx rates to use instead of fetching them (see fx_rate.py)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="never fetch fx rates, use the cached or local ones",
+    )
+    args = parser.parse_args()
+    if not args.start_from:
+        raise RuntimeError("args.start_from is required in strategy daemon")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    fx_rate = FxRate(rates_file=args.fx_rates_file, offline=args.offline)
+    strategy = Strategy("fees.json", fx_rate)
+    strategy.load_static_info(args.start_from)
+    strategy.analytics_cache = AnalyticsCache(cache_file(args.data_folder))
+    daemon = StrategyDaemon(
+        strategy,
+        parse_strategy_options("options.json"),
+        args.data_folder,
+        args.storage_format,
+        args.top_k,
+    )
+    daemon.load()
+    daemon.serve(args.host, args.port, args.interval_seconds)
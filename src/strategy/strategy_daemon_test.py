@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+from fx_rate import FxRate
+from strategy import Strategy
+from strategy_daemon import StrategyDaemon
+from latest_snapshot import snapshot_file
+from time_series_serializer import TimeSeriesSerializer
+
+OPTIONS = {
+    "cutoff_net_profit_ratio_mid_to_last": 0.1,
+    "generate_du_historical_stats": True,
+    "sort": "profit_ratio_mid_to_last",
+}
+
+
+class TestStrategyDaemon(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.data_folder = os.path.join(self.folder.name, "data")
+        self.now = datetime.datetime.utcnow()
+        self.serializer = TimeSeriesSerializer(self.data_folder, "json")
+        # mid stockx prices: A-1 and C-3 profitable, B-2 not
+        for style_id, mid in [("A-1", 100), ("B-2", 300), ("C-3", 110)]:
+            self.serializer.update(
+                "du",
+                self.now - datetime.timedelta(hours=2),
+                style_id,
+                {"9.5": {"list_price": 160000}},
+                {
+                    "9.5": [
+                        {
+                            "price": 150000 - 2000 * d,
+                            "time": (
+                                self.now - datetime.timedelta(days=d, hours=1)
+                            ).isoformat()
+                            + "Z",
+                            "id": "{}-{}".format(style_id, d),
+                        }
+                        for d in range(3)
+                    ]
+                },
+            )
+            self.update_stockx(style_id, mid)
+
+        rates_file = os.path.join(self.folder.name, "fx_rates.json")
+        with open(rates_file, "w") as outfile:
+            outfile.write(json.dumps({"CNY/USD": {"2019-12-01": 0.14}}))
+        strategy = Strategy(
+            os.path.join(os.path.dirname(__file__), "fees.json"),
+            FxRate(cache_file=None, rates_file=rates_file),
+        )
+        strategy.static_info = {"A-1": None, "B-2": None, "C-3": None}
+        self.daemon = StrategyDaemon(strategy, OPTIONS, self.data_folder, "json")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def update_stockx(self, style_id, mid):
+        self.serializer.update(
+            "stockx",
+            self.now - datetime.timedelta(hours=3),
+            style_id,
+            {"9.5": {"bid_price": mid - 5, "ask_price": mid + 5}},
+            {},
+        )
+
+    def get_ranked(self):
+        top = json.loads(self.daemon.get_top())["top"]
+        return [(i["style_id"], i["size"]) for i in top]
+
+    def test_load_and_poll(self):
+        self.daemon.load()
+        self.assertEqual(self.get_ranked(), [("A-1", "9.5"), ("C-3", "9.5")])
+        top = json.loads(self.daemon.get_top())
+        self.assertEqual(top["updated"], self.daemon.updated)
+        self.assertEqual(top["top"][0]["annotation"]["du_analyzer"]["num_sales"], 3)
+
+        detail = json.loads(self.daemon.get_detail("A-1", "9.5"))
+        self.assertEqual(detail["rank"], 0)
+        self.assertEqual(detail["data"]["du"]["prices"][0]["list_price"], 160000)
+        self.assertEqual(detail["data"]["du"]["transactions"][0]["id"], "A-1-0")
+        self.assertIsNone(self.daemon.get_detail("B-2", "9.5"))
+
+        # nothing written since
+        self.assertEqual(self.daemon.poll(), [])
+
+        refreshed = []
+        refresh = self.daemon.refresh
+
+        def record_refresh(style_ids):
+            refreshed.append(style_ids)
+            refresh(style_ids)
+
+        self.daemon.refresh = record_refresh
+        self.update_stockx("B-2", 90)
+        # the stockx file rewritten within the mtime resolution still counts
+        path = snapshot_file(self.data_folder, "stockx")
+        mtime = os.stat(path).st_mtime_ns + 1000000000
+        os.utime(path, ns=(mtime, mtime))
+        self.assertEqual(self.daemon.poll(), ["B-2"])
+        self.assertEqual(refreshed, [["B-2"]])
+        self.assertEqual(
+            self.get_ranked(), [("B-2", "9.5"), ("A-1", "9.5"), ("C-3", "9.5")]
+        )
+        self.assertEqual(json.loads(self.daemon.get_detail("B-2", "9.5"))["rank"], 0)
+
+    def test_expire(self):
+        self.daemon.load()
+        self.assertFalse(self.daemon._expire(self.now))
+        self.assertEqual(len(self.daemon.matched), 2)
+        # stockx prices, read 3 hours before now, stop being fresh first
+        self.assertFalse(
+            self.daemon._expire(self.now + datetime.timedelta(days=3, hours=-4))
+        )
+        self.assertTrue(
+            self.daemon._expire(self.now + datetime.timedelta(days=3, hours=-2))
+        )
+        self.assertEqual(self.daemon.matched, {})
+        self.assertEqual(self.daemon.expires, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
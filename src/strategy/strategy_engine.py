@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+import sys
+
+# hack for import
+sys.path.append("../feed/")
+
+import datetime
+
+import numpy as np
+
+from time_series_json import parse_times
+
+"""
+Vectorized evaluation of Strategy.run's filters.
+
+The latest stockx and du prices of every (style_id, size) are gathered into
+arrays once, every configured cutoff_net_profit_* metric is then computed for
+all keys at once with the compiled fee model (Fees.get_model), and the filters become
+boolean masks. Results are the same as Strategy.run's.
+"""
+
+SOURCES = ["bid", "mid", "ask"]
+DESTS = ["listing", "last"]
+RATIO_OR_VALUES = ["ratio", "value"]
+
+# 3 days
+PRICE_LIFETIME_SECONDS = 259200
+# 2 weeks
+TRANSACTION_LIFETIME_SECONDS = 1.21e6
+
+
+def to_timedelta(seconds):
+    return np.timedelta64(int(seconds * 1e6), "us")
+
+
+def get_price(prices, field):
+    """
+    The field of the newest price reading, nan if missing
+    """
+    if len(prices) == 0:
+        return np.nan
+    value = prices[0].get(field)
+    return np.nan if value is None else value
+
+
+class MarketArrays:
+    """
+    Latest market data of keys [(style_id, size)] as arrays aligned with keys.
+    Keys without both du and stockx readings are left out.
+    """
+
+    def __init__(self, size_prices):
+        """
+        @param size_prices  {(style_id, size): {venue: {"prices": [...], "transactions": [...]}}}
+        """
+        self.keys = [k for k, v in size_prices.items() if "du" in v and "stockx" in v]
+        du = [size_prices[k]["du"] for k in self.keys]
+        stockx = [size_prices[k]["stockx"] for k in self.keys]
+
+        self.du_list = np.array(
+            [get_price(v["prices"], "list_price") for v in du], dtype=np.float64
+        )
+        self.stockx_bid = np.array(
+            [get_price(v["prices"], "bid_price") for v in stockx], dtype=np.float64
+        )
+        self.stockx_ask = np.array(
+            [get_price(v["prices"], "ask_price") for v in stockx], dtype=np.float64
+        )
+        self.du_last = np.array(
+            [
+                v["transactions"][0]["price"] if len(v["transactions"]) > 0 else np.nan
+                for v in du
+            ],
+            dtype=np.float64,
+        )
+
+        # the first reading of the epoch stands in for missing times
+        self.du_time = self._times(
+            [v["prices"][0]["time"] if len(v["prices"]) > 0 else None for v in du]
+        )
+        self.stockx_time = self._times(
+            [v["prices"][0]["time"] if len(v["prices"]) > 0 else None for v in stockx]
+        )
+        self.du = du
+        return
+
+    @staticmethod
+    def _times(time_strs):
+        missing = np.array([t is None for t in time_strs], dtype=bool)
+        times = parse_times(
+            [t if t is not None else "1970-01-01T00:00:00" for t in time_strs]
+        )
+        times[missing] = np.datetime64(0, "us")
+        return times
+
+    def has_transactions_since(self, indices, since):
+        """
+        Whether each of keys[indices] had a du transaction after since, by time
+        rather than by order. False for other keys.
+        """
+        return self.latest_transaction_times(indices, since) > since
+
+    def latest_transaction_times(self, indices, since):
+        """
+        Time of the latest du transaction of each of keys[indices], by time
+        rather than by order; exact for those not after since, and after since
+        (though not necessarily the latest) for the others. The epoch for keys
+        without transactions and other keys.
+        """
+        latest = np.full(len(self.keys), np.datetime64(0, "us"), dtype="datetime64[us]")
+
+        def fold(owners, time_strs):
+            if len(time_strs) > 0:
+                np.maximum.at(latest, np.array(owners), parse_times(time_strs))
+
+        # transactions are newest first, look at the first of each key, and
+        # at the others only for the few keys where it is not recent enough
+        time_strs = []
+        owners = []
+        listed = []
+        for i in indices.tolist():
+            v = self.du[i]
+            if "snapshot" in v:
+                if v["snapshot"]["transaction_time"]:
+                    time_strs.append(v["snapshot"]["transaction_time"])
+                    owners.append(i)
+            elif "transaction_arrays" in v:
+                if len(v["transaction_arrays"]["time"]) > 0:
+                    latest[i] = v["transaction_arrays"]["time"].max()
+            elif len(v["transactions"]) > 0:
+                time_strs.append(v["transactions"][0]["time"])
+                owners.append(i)
+                listed.append(i)
+        fold(owners, time_strs)
+
+        listed = np.array(listed, dtype=np.int64)
+        time_strs = []
+        owners = []
+        for i in listed[latest[listed] <= since].tolist():
+            for t in self.du[i]["transactions"][1:]:
+                time_strs.append(t["time"])
+                owners.append(i)
+        fold(owners, time_strs)
+        return latest
+
+    def stockx_price(self, source):
+        if source == "mid":
+            return 0.5 * (self.stockx_bid + self.stockx_ask)
+        elif source == "ask":
+            return self.stockx_ask
+        elif source == "bid":
+            return self.stockx_bid
+        raise RuntimeError("unrecognized ratio filter option {}".format(source))
+
+    def du_price(self, dest):
+        if dest == "listing":
+            return self.du_list / 100
+        elif dest == "last":
+            return self.du_last / 100
+        raise RuntimeError("unrecognized ratio filter option {}".format(dest))
+
+
+class StrategyEngine:
+    def __init__(self, fees, fx_rate):
+        self.fees = fees
+        self.fx_rate = fx_rate
+        return
+
+    def get_profit(self, stockx_px, du_price_cny, ratio_or_value):
+        if ratio_or_value == "ratio":
+            return self.fees.get_profit_percent_array(
+                "stockx", "du", stockx_px, du_price_cny, "CNY"
+            )
+        elif ratio_or_value == "value":
+            return self.fees.get_profit_value_array(
+                "stockx", "du", stockx_px, du_price_cny, "CNY"
+            )
+        raise RuntimeError("unrecognizied ratio_or_value {}".format(ratio_or_value))
+
+    def get_mask(self, market, options, now, verbose=True):
+        """
+        Strategy.run's filters on market (MarketArrays) as of now.
+        @return mask of market.keys passing all filters, and
+            {annotation name: array aligned with market.keys} of the profit
+            metrics of the configured cutoffs
+        """
+        log = print if verbose else lambda *args: None
+        now = np.datetime64(now, "us")
+        with np.errstate(invalid="ignore"):
+            mask = (
+                ~np.isnan(market.du_list)
+                & (market.du_list != 0)
+                & ~np.isnan(market.stockx_ask)
+                & (market.stockx_ask != 0)
+            )
+        log("total (style_id, size) pairs {} with data".format(int(mask.sum())))
+
+        price_lifetime = to_timedelta(
+            options.get("price_lifetime_seconds", PRICE_LIFETIME_SECONDS)
+        )
+        mask &= (now - market.du_time <= price_lifetime) & (
+            now - market.stockx_time <= price_lifetime
+        )
+        log("total (style_id, size) pairs {} with fresh data".format(int(mask.sum())))
+
+        transaction_lifetime = to_timedelta(
+            options.get("transaction_lifetime_seconds", TRANSACTION_LIFETIME_SECONDS)
+        )
+        mask &= market.has_transactions_since(
+            np.flatnonzero(mask), now - transaction_lifetime
+        )
+        log(
+            "total (style_id, size) pairs {} with fresh transactions".format(
+                int(mask.sum())
+            )
+        )
+
+        metrics = {}
+        for source in SOURCES:
+            for dest in DESTS:
+                for ratio_or_value in RATIO_OR_VALUES:
+                    option_name = "cutoff_net_profit_{}_{}_to_{}".format(
+                        ratio_or_value, source, dest
+                    )
+                    if option_name not in options:
+                        continue
+                    profit = self.get_profit(
+                        market.stockx_price(source),
+                        market.du_price(dest),
+                        ratio_or_value,
+                    )
+                    with np.errstate(invalid="ignore"):
+                        mask &= profit > options[option_name]
+                    metrics[
+                        "profit_{}_{}_to_{}".format(ratio_or_value, source, dest)
+                    ] = profit
+                    log(
+                        "total (style_id, size) pairs {} satisfying profit cutoff {} ({} to {}) of {}".format(
+                            int(mask.sum()),
+                            ratio_or_value,
+                            source,
+                            dest,
+                            options[option_name],
+                        )
+                    )
+        return mask, metrics
+
+    def filter(self, size_prices, options, now=None):
+        """
+        Strategy.run's filters.
+        @param size_prices  {(style_id, size): data}
+        @return {(style_id, size): data} passing all filters, in the order of
+            size_prices, data annotated with the profit metrics
+        """
+        if now is None:
+            now = datetime.datetime.utcnow()
+        print("total (style_id, size) pairs {}".format(len(size_prices)))
+
+        market = MarketArrays(size_prices)
+        mask, metrics = self.get_mask(market, options, now)
+
+        result = {}
+        for i in np.flatnonzero(mask):
+            k = market.keys[i]
+            v = size_prices[k]
+            if "annotation" not in v:
+                v["annotation"] = {}
+            for name, profit in metrics.items():
+                v["annotation"][name] = float(profit[i])
+            result[k] = v
+        return result
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import sys
+
+# hack for import
+sys.path.append("../feed/")
+
+import argparse
+import datetime
+import json
+import random
+import tempfile
+import time
+
+from fx_rate import FxRate
+from strategy import Strategy
+
+"""
+Time Strategy.run against Strategy.run_vectorized on synthetic latest readings
+of many (style_id, size).
+
+example usage:
+    ./strategy_engine_benchmark.py --keys 100000
+"""
+
+
+def make_size_prices(num_keys, num_transactions, seed=0):
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+    all_size_prices = {}
+    for i in range(num_keys):
+        style_id = "STYLE{:06d}".format(i // 10)
+        size = "{:.1f}".format(4 + (i % 10) * 0.5)
+        stockx_bid = rng.uniform(80, 300)
+        age = datetime.timedelta(hours=rng.uniform(0, 100))
+        transactions = [
+            {
+                "price": rng.uniform(600, 3000) * 100,
+                "time": (now - age - datetime.timedelta(days=j)).isoformat() + "Z",
+                "id": "{}-{}".format(i, j),
+            }
+            for j in range(num_transactions)
+        ]
+        all_size_prices.setdefault(style_id, {})[size] = {
+            "du": {
+                "prices": [
+                    {
+                        "time": (now - age).isoformat() + "Z",
+                        "list_price": rng.uniform(600, 3000) * 100,
+                    }
+                ],
+                "transactions": transactions,
+            },
+            "stockx": {
+                "prices": [
+                    {
+                        "time": (now - age).isoformat()[:-3] + "Z",
+                        "bid_price": stockx_bid,
+                        "ask_price": stockx_bid * rng.uniform(1, 1.3),
+                    }
+                ]
+            },
+        }
+    return all_size_prices
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("benchmark strategy filters")
+    parser.add_argument("--keys", default=100000, help="number of (style_id, size)")
+    parser.add_argument(
+        "--transactions", default=5, help="du transactions of each (style_id, size)"
+    )
+    parser.add_argument("--options", default="options.json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.options, "r") as infile:
+        options = json.loads(infile.read())
+    options["generate_du_historical_stats"] = False
+
+    all_size_prices = make_size_prices(int(args.keys), int(args.transactions))
+    with tempfile.NamedTemporaryFile("w", suffix=".json") as rates_file:
+        rates_file.write(json.dumps({"CNY/USD": {"2019-12-01": 0.143}}))
+        rates_file.flush()
+        fx_rate = FxRate(cache_file=None, rates_file=rates_file.name)
+    strategy = Strategy("fees.json", fx_rate)
+    elapsed = {}
+    results = {}
+    for name, run in [("loop", strategy.run), ("vectorized", strategy.run_vectorized)]:
+        # annotations are written into the readings, start each from a fresh copy
+        strategy.all_size_prices = json.loads(json.dumps(all_size_prices))
+        begin = time.perf_counter()
+        results[name] = run(options)
+        elapsed[name] = time.perf_counter() - begin
+
+    same = [r["identifier"] for r in results["loop"]] == [
+        r["identifier"] for r in results["vectorized"]
+    ]
+    print(
+        "{} keys: loop {:.3f} s, vectorized {:.3f} s ({:.1f}x), same results {}".format(
+            args.keys,
+            elapsed["loop"],
+            elapsed["vectorized"],
+            elapsed["loop"] / elapsed["vectorized"],
+            same,
+        )
+    )
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+import sys
+
+# hack for import
+sys.path.append("../feed/")
+
+import copy
+import datetime
+import json
+import os
+
+import numpy as np
+
+from last_updated import LastUpdatedSerializer
+from latest_snapshot import make_entry, update_entry
+from time_series_json import parse_times
+from strategy_engine import (
+    PRICE_LIFETIME_SECONDS,
+    TRANSACTION_LIFETIME_SECONDS,
+    to_timedelta,
+)
+
+"""
+What the previous strategy run computed, so that the next run only recomputes
+the (style_id, size) of styles whose du or stockx data changed since.
+
+Whether a style changed is told by the feeds' last_updated files
+(LastUpdatedSerializer): the state remembers the last_updated times each
+style's results were computed from. Persisted as json:
+  {
+    "options":      strategy options the results were computed with,
+    "fx_rate":      CNY/USD rate the results were computed with,
+    "last_updated": {style_id: {venue: time}},
+    "matched":      {style_id: {size: {
+        "data":    newest readings of each venue and profit annotations,
+                   in the shape of LatestSnapshot.get
+        "expires": when the newest readings stop being fresh enough
+    }}},
+    "top":          [[style_id, size]] reported last run, in rank order
+  }
+
+Keys that did not pass the filters are not kept: without new readings they
+can only get staler. Keys that passed are dropped once their readings expire.
+A change of options or fx rate discards the whole state.
+"""
+
+
+def load_last_updated(last_updated_files):
+    """
+    @param last_updated_files  last_updated files of the feeds, e.g.
+        du_feed.py's and stockx_feed.js's
+    @return {style_id: {venue: time}}
+    """
+    last_updated = {}
+    for last_updated_file in last_updated_files:
+        if not os.path.isfile(last_updated_file):
+            print(
+                "last_updated file {} not found. continuing".format(last_updated_file)
+            )
+            continue
+        serializer = LastUpdatedSerializer(last_updated_file)
+        for style_id, venues in serializer.last_updated.items():
+            for venue, time in venues.items():
+                last_updated.setdefault(style_id, {})[venue] = time.isoformat() + "Z"
+    return last_updated
+
+
+def make_compact(data):
+    """
+    Only the newest readings of each venue of data, as LatestSnapshot.get has
+    them, and a copy of its annotations
+    """
+    compact = {}
+    for venue, v in data.items():
+        if venue == "annotation":
+            compact[venue] = copy.deepcopy(v)
+            continue
+        if "snapshot" in v:
+            entry = v["snapshot"]
+        else:
+            entry = update_entry(make_entry(), v["prices"], v["transactions"])
+        compact[venue] = {
+            "prices": v["prices"][:1],
+            "transactions": v["transactions"][:1],
+            "snapshot": entry,
+        }
+    return compact
+
+
+def get_expiry(data, options):
+    """
+    When data stops passing the freshness filters of StrategyEngine with
+    options
+    """
+    du_time, stockx_time, transaction_time = parse_times(
+        [
+            data["du"]["prices"][0]["time"],
+            data["stockx"]["prices"][0]["time"],
+            data["du"]["snapshot"]["transaction_time"],
+        ]
+    )
+    price_lifetime = to_timedelta(
+        options.get("price_lifetime_seconds", PRICE_LIFETIME_SECONDS)
+    )
+    transaction_lifetime = to_timedelta(
+        options.get("transaction_lifetime_seconds", TRANSACTION_LIFETIME_SECONDS)
+    )
+    expiry = min(
+        du_time + price_lifetime,
+        stockx_time + price_lifetime,
+        transaction_time + transaction_lifetime,
+    )
+    return str(expiry)
+
+
+class StrategyState:
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self.state = {
+            "options": None,
+            "fx_rate": None,
+            "last_updated": {},
+            "matched": {},
+            "top": [],
+        }
+        if os.path.isfile(state_file):
+            with open(state_file, "r") as infile:
+                self.state = json.loads(infile.read())
+        return
+
+    def reset_if_changed(self, options, fx_rate):
+        """
+        Discard the state if it was computed with other options or fx rate
+        """
+        if self.state["options"] != options or self.state["fx_rate"] != fx_rate:
+            if self.state["options"] is not None:
+                print("strategy options or fx rate changed, recomputing all")
+            self.state["last_updated"] = {}
+            self.state["matched"] = {}
+        self.state["options"] = options
+        self.state["fx_rate"] = fx_rate
+        return
+
+    def get_changed_style_ids(self, style_ids, last_updated):
+        """
+        @return style_ids whose last_updated differ from what the state was
+            computed from
+        """
+        return [
+            style_id
+            for style_id in style_ids
+            if style_id not in self.state["last_updated"]
+            or self.state["last_updated"][style_id] != last_updated.get(style_id, {})
+        ]
+
+    def get_matched(self, style_ids, now=None):
+        """
+        @return {(style_id, size): data} of style_ids that passed the filters
+            last time and are still fresh
+        """
+        if now is None:
+            now = datetime.datetime.utcnow()
+        now = np.datetime64(now, "us")
+        matched = {}
+        for style_id in style_ids:
+            for size, entry in self.state["matched"].get(style_id, {}).items():
+                if now < np.datetime64(entry["expires"], "us"):
+                    matched[(style_id, size)] = copy.deepcopy(entry["data"])
+        return matched
+
+    def update(self, style_ids, last_updated, matched):
+        """
+        @param style_ids     styles recomputed
+        @param last_updated  {style_id: {venue: time}} they were computed from
+        @param matched       {(style_id, size): data} of them passing the filters
+        """
+        for style_id in style_ids:
+            self.state["last_updated"][style_id] = last_updated.get(style_id, {})
+            self.state["matched"].pop(style_id, None)
+        for (style_id, size), data in matched.items():
+            compact = make_compact(data)
+            self.state["matched"].setdefault(style_id, {})[size] = {
+                "data": compact,
+                "expires": get_expiry(compact, self.state["options"]),
+            }
+        return
+
+    def update_top(self, top):
+        """
+        @param top  [(style_id, size)] reported this run, in rank order
+        @return keys of top that entered, and keys of the previous top that left
+        """
+        previous = [tuple(k) for k in self.state["top"]]
+        previous_set = set(previous)
+        top_set = set(top)
+        entered = [k for k in top if k not in previous_set]
+        left = [k for k in previous if k not in top_set]
+        self.state["top"] = [list(k) for k in top]
+        return entered, left
+
+    def save(self):
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w") as outfile:
+            outfile.write(json.dumps(self.state))
+        os.replace(tmp_file, self.state_file)
+        return
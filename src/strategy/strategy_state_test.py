@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import datetime
+import os
+import tempfile
+import unittest
+
+from strategy_state import StrategyState, load_last_updated
+
+
+def make_data(du_time, stockx_time, transaction_time):
+    return {
+        "du": {
+            "prices": [{"time": du_time, "list_price": 150000}],
+            "transactions": [{"time": transaction_time, "price": 140000, "id": "1"}],
+        },
+        "stockx": {
+            "prices": [{"time": stockx_time, "bid_price": 120, "ask_price": 130}],
+            "transactions": [],
+        },
+        "annotation": {"profit_ratio_mid_to_last": 0.3},
+    }
+
+
+class TestStrategyState(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.folder.name, "state.json")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_last_updated(self):
+        du_file = os.path.join(self.folder.name, "last_updated.log")
+        with open(du_file, "w") as outfile:
+            outfile.write("A-1,2019-12-20T10:00:00.000000Z\n")
+        stockx_file = os.path.join(self.folder.name, "last_updated_stockx.log")
+        with open(stockx_file, "w") as outfile:
+            outfile.write("style_id,stockx_last_updated\n")
+            outfile.write("A-1,2019-12-21T10:00:00.000Z\n")
+            outfile.write("B-2,2019-12-21T11:00:00.000Z\n")
+        self.assertEqual(
+            load_last_updated([du_file, stockx_file]),
+            {
+                "A-1": {
+                    "du": "2019-12-20T10:00:00Z",
+                    "stockx": "2019-12-21T10:00:00Z",
+                },
+                "B-2": {"stockx": "2019-12-21T11:00:00Z"},
+            },
+        )
+
+    def test_incremental(self):
+        last_updated = {"A-1": {"du": "2019-12-20T10:00:00Z"}, "B-2": {}}
+        state = StrategyState(self.state_file)
+        state.reset_if_changed({"sort": "profit_ratio_mid_to_last"}, 0.14)
+        self.assertEqual(
+            state.get_changed_style_ids(["A-1", "B-2"], last_updated), ["A-1", "B-2"]
+        )
+        data = make_data(
+            "2019-12-20T10:00:00.000000Z",
+            "2019-12-21T10:00:00.000Z",
+            "2019-12-10T00:00:00.000Z",
+        )
+        state.update(["A-1", "B-2"], last_updated, {("A-1", "9.5"): data})
+        self.assertEqual(state.update_top([("A-1", "9.5")]), ([("A-1", "9.5")], []))
+        state.save()
+
+        state = StrategyState(self.state_file)
+        state.reset_if_changed({"sort": "profit_ratio_mid_to_last"}, 0.14)
+        last_updated["B-2"] = {"stockx": "2019-12-21T11:00:00Z"}
+        self.assertEqual(
+            state.get_changed_style_ids(["A-1", "B-2"], last_updated), ["B-2"]
+        )
+        # the transaction is 2 weeks old first
+        matched = state.get_matched(["A-1"], datetime.datetime(2019, 12, 23))
+        self.assertEqual(matched[("A-1", "9.5")]["annotation"], data["annotation"])
+        self.assertEqual(
+            state.get_matched(["A-1"], datetime.datetime(2019, 12, 24, 1)), {}
+        )
+        self.assertEqual(state.update_top([]), ([], [("A-1", "9.5")]))
+
+        state.reset_if_changed({"sort": "profit_ratio_mid_to_last"}, 0.15)
+        self.assertEqual(
+            state.get_changed_style_ids(["A-1", "B-2"], last_updated), ["A-1", "B-2"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+import sys
+
+# hack for import
+sys.path.append("../feed/")
+
+import csv
+import datetime
+import itertools
+import json
+
+import numpy as np
+
+from strategy_engine import (
+    DESTS,
+    PRICE_LIFETIME_SECONDS,
+    RATIO_OR_VALUES,
+    SOURCES,
+    TRANSACTION_LIFETIME_SECONDS,
+    MarketArrays,
+    StrategyEngine,
+    to_timedelta,
+)
+
+"""
+Evaluate a grid of strategy option sets against data loaded once.
+
+A sweep file holds lists of values of the options to vary, e.g.
+  {
+    "cutoff_net_profit_ratio_bid_to_last": [0.0, 0.05, 0.1],
+    "price_lifetime_seconds": [86400, 259200],
+    "sort": ["profit_ratio_mid_to_last", "profit_value_mid_to_last"]
+  }
+and the other options are taken from options.json. Every combination is one
+option set.
+
+The market arrays and every profit metric any option set refers to are
+computed once for all keys (strategy_engine.py); each option set's filters are
+then a row of a (option set, key) mask, so the whole grid is evaluated with a
+few array comparisons. Filters outside the engine, such as the rolling
+cutoffs of strategy.py, are applied to the keys each option set passes.
+"""
+
+
+def expand_grid(base_options, grid):
+    """
+    @return list of option sets: base_options updated with each combination
+        of the values in grid, and the combinations themselves
+    """
+    names = sorted(grid)
+    option_sets = []
+    combinations = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        combination = dict(zip(names, values))
+        option_sets.append(dict(base_options, **combination))
+        combinations.append(combination)
+    return option_sets, combinations
+
+
+def get_metric_names(options):
+    """
+    @return {metric name: cutoff option name} of the profit cutoffs in options
+    """
+    names = {}
+    for source in SOURCES:
+        for dest in DESTS:
+            for ratio_or_value in RATIO_OR_VALUES:
+                option_name = "cutoff_net_profit_{}_{}_to_{}".format(
+                    ratio_or_value, source, dest
+                )
+                if option_name in options:
+                    names["profit_{}_{}_to_{}".format(ratio_or_value, source, dest)] = (
+                        option_name
+                    )
+    return names
+
+
+class StrategySweep:
+    def __init__(self, fees, fx_rate):
+        self.engine = StrategyEngine(fees, fx_rate)
+        return
+
+    def run(self, size_prices, option_sets, top_n=5, now=None, post_filter=None):
+        """
+        StrategyEngine.filter and Strategy.sort_results of each option set.
+
+        @param post_filter  filters applied after the engine's, as
+            post_filter(size_prices, options, now) returning those of
+            size_prices kept, e.g. Strategy.filter_rolling_stats
+        @return list, in the order of option_sets, of
+            {"count": number of keys passing the filters,
+             "top": [((style_id, size), sort value)] of the top_n of them}
+        """
+        if now is None:
+            now = datetime.datetime.utcnow()
+        now = np.datetime64(now, "us")
+        market = MarketArrays(size_prices)
+        num_keys = len(market.keys)
+        num_sets = len(option_sets)
+
+        # metrics shared by all option sets
+        metric_names = set()
+        for options in option_sets:
+            metric_names.update(get_metric_names(options))
+            metric_names.add(options["sort"])
+        metrics = {}
+        for name in sorted(metric_names):
+            ratio_or_value, source, _, dest = name.split("_", 1)[1].split("_")
+            metrics[name] = self.engine.get_profit(
+                market.stockx_price(source), market.du_price(dest), ratio_or_value
+            )
+
+        with np.errstate(invalid="ignore"):
+            has_data = (
+                ~np.isnan(market.du_list)
+                & (market.du_list != 0)
+                & ~np.isnan(market.stockx_ask)
+                & (market.stockx_ask != 0)
+            )
+        price_age = now - np.minimum(market.du_time, market.stockx_time)
+
+        price_lifetimes = np.array(
+            [
+                to_timedelta(
+                    options.get("price_lifetime_seconds", PRICE_LIFETIME_SECONDS)
+                )
+                for options in option_sets
+            ]
+        )
+        transaction_since = now - np.array(
+            [
+                to_timedelta(
+                    options.get(
+                        "transaction_lifetime_seconds", TRANSACTION_LIFETIME_SECONDS
+                    )
+                )
+                for options in option_sets
+            ]
+        )
+        # latest transaction times exact up to the most recent since of the
+        # grid, enough to compare with all of them
+        latest_transaction = market.latest_transaction_times(
+            np.flatnonzero(has_data), transaction_since.max()
+        )
+
+        mask = (
+            has_data[None, :]
+            & (price_age[None, :] <= price_lifetimes[:, None])
+            & (latest_transaction[None, :] > transaction_since[:, None])
+        )
+        for name, profit in metrics.items():
+            cutoffs = np.full(num_sets, -np.inf)
+            applies = np.zeros(num_sets, dtype=bool)
+            for g, options in enumerate(option_sets):
+                option_name = get_metric_names(options).get(name)
+                if option_name:
+                    cutoffs[g] = options[option_name]
+                    applies[g] = True
+            with np.errstate(invalid="ignore"):
+                passes = profit[None, :] > cutoffs[:, None]
+            mask &= passes | ~applies[:, None]
+
+        results = []
+        for g, options in enumerate(option_sets):
+            indices = np.flatnonzero(mask[g])
+            if post_filter is not None:
+                kept = post_filter(
+                    {market.keys[i]: size_prices[market.keys[i]] for i in indices},
+                    options,
+                    now.astype(datetime.datetime),
+                )
+                indices = np.array(
+                    [i for i in indices.tolist() if market.keys[i] in kept],
+                    dtype=np.int64,
+                )
+            sort_values = metrics[options["sort"]][indices]
+            order = np.argsort(-sort_values, kind="stable")[:top_n]
+            results.append(
+                {
+                    "count": len(indices),
+                    "top": [
+                        (market.keys[indices[i]], float(sort_values[i]))
+                        for i in order.tolist()
+                    ],
+                }
+            )
+        print(
+            "evaluated {} option sets on {} (style_id, size) pairs".format(
+                num_sets, num_keys
+            )
+        )
+        return results
+
+
+def load_grid(sweep_file):
+    with open(sweep_file, "r") as infile:
+        return json.loads(infile.read())
+
+
+def report(combinations, results, outfile_path=None):
+    """
+    Print a row per option set, and write them as csv to outfile_path if given
+    """
+    names = sorted(set(name for c in combinations for name in c))
+    rows = []
+    for combination, result in zip(combinations, results):
+        row = dict(combination)
+        row["count"] = result["count"]
+        row["top"] = " ".join(
+            "{}/{}:{:.4f}".format(k[0], k[1], value) for k, value in result["top"]
+        )
+        rows.append(row)
+        print(
+            "{}\n  count: {}\n  top: {}".format(
+                ", ".join("{}={}".format(n, combination[n]) for n in names),
+                row["count"],
+                row["top"],
+            )
+        )
+    if outfile_path:
+        with open(outfile_path, "w") as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=names + ["count", "top"])
+            writer.writeheader()
+            writer.writerows(rows)
+    return
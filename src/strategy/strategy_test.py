@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from fx_rate import FxRate
+from strategy import Strategy
+from strategy_state import StrategyState
+from latest_snapshot import LatestSnapshot
+from time_series_columnar import ColumnarTimeSeriesReader, build_columnar
+from time_series_serializer import TimeSeriesSerializer
+
+OPTIONS = {
+    "cutoff_net_profit_ratio_mid_to_last": 0.1,
+    "generate_du_historical_stats": True,
+    "sort": "profit_ratio_mid_to_last",
+}
+LONG_ID = "du-transaction-" + "0" * 40
+
+
+def to_time_str(time):
+    return time.isoformat(timespec="milliseconds") + "Z"
+
+
+def write_data_folder(folder, now):
+    """
+    Styles S0..S5 with du and stockx readings fresh as of now, of which
+    S0..S2 profitable; and B-1 whose du venue has transactions but no prices
+    """
+    store = TimeSeriesSerializer(folder, "json").store
+    for i in range(6):
+        transactions = [
+            {
+                "price": 150000 + 1000 * i - 2000 * d,
+                "time": to_time_str(now - datetime.timedelta(days=d, hours=1)),
+                "id": LONG_ID if i == 0 and d == 0 else "{}-{}".format(i, d),
+            }
+            for d in range(4)
+        ]
+        mid = 100 + 10 * i if i < 3 else 300
+        store.write(
+            "S{}".format(i),
+            "9.5",
+            {
+                "du": {
+                    "prices": [
+                        {
+                            "time": to_time_str(now - datetime.timedelta(hours=2)),
+                            "list_price": 160000,
+                        }
+                    ],
+                    "transactions": transactions,
+                },
+                "stockx": {
+                    "prices": [
+                        {
+                            "time": to_time_str(now - datetime.timedelta(hours=3)),
+                            "bid_price": mid - 5,
+                            "ask_price": mid + 5,
+                        }
+                    ],
+                    "transactions": [],
+                },
+            },
+        )
+    store.write(
+        "B-1",
+        "9.5",
+        {
+            "du": {
+                "prices": [],
+                "transactions": [
+                    {
+                        "price": 150000,
+                        "time": to_time_str(now - datetime.timedelta(days=1)),
+                        "id": "b-0",
+                    }
+                ],
+            },
+            "stockx": {
+                "prices": [
+                    {
+                        "time": to_time_str(now - datetime.timedelta(hours=3)),
+                        "bid_price": 95,
+                        "ask_price": 105,
+                    }
+                ],
+                "transactions": [],
+            },
+        },
+    )
+    return ["B-1"] + ["S{}".format(i) for i in range(6)]
+
+
+class TestStrategy(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.data_folder = os.path.join(self.folder.name, "data")
+        self.style_ids = write_data_folder(self.data_folder, datetime.datetime.utcnow())
+        rates_file = os.path.join(self.folder.name, "fx_rates.json")
+        with open(rates_file, "w") as outfile:
+            outfile.write(json.dumps({"CNY/USD": {"2019-12-01": 0.14}}))
+        self.fx_rate = FxRate(cache_file=None, rates_file=rates_file)
+        self.fees_file = os.path.join(os.path.dirname(__file__), "fees.json")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def make_strategy(self):
+        strategy = Strategy(self.fees_file, self.fx_rate)
+        strategy.static_info = {style_id: None for style_id in self.style_ids}
+        return strategy
+
+    def run_full(self):
+        strategy = self.make_strategy()
+        strategy.load_all_size_prices(self.data_folder)
+        return strategy.run(OPTIONS)
+
+    def assert_same_results(self, results, expected):
+        self.assertEqual(
+            [i["identifier"] for i in results], [i["identifier"] for i in expected]
+        )
+        for i, e in zip(results, expected):
+            for name, value in e["data"]["annotation"].items():
+                if name == "du_analyzer":
+                    for field, stat in value.items():
+                        self.assertAlmostEqual(
+                            i["data"]["annotation"][name][field], stat
+                        )
+                else:
+                    self.assertAlmostEqual(i["data"]["annotation"][name], value)
+
+    def test_columnar(self):
+        expected = self.run_full()
+        self.assertEqual(
+            [i["identifier"] for i in expected],
+            [("S0", "9.5"), ("S1", "9.5"), ("S2", "9.5")],
+        )
+
+        columnar_folder = os.path.join(self.folder.name, "columnar")
+        build_columnar(TimeSeriesSerializer(self.data_folder, "json"), columnar_folder)
+        reader = ColumnarTimeSeriesReader(columnar_folder)
+        self.assertEqual(
+            reader.get_latest_transaction("S0", "9.5", "du")["id"], LONG_ID
+        )
+        strategy = self.make_strategy()
+        strategy.load_all_size_prices_columnar(columnar_folder)
+        self.assertEqual(strategy.all_size_prices["B-1"]["9.5"]["du"]["prices"], [])
+        self.assert_same_results(strategy.run(OPTIONS), expected)
+
+    def test_snapshot(self):
+        expected = self.run_full()
+        LatestSnapshot(self.data_folder).build(
+            TimeSeriesSerializer(self.data_folder, "json")
+        )
+        strategy = self.make_strategy()
+        strategy.load_all_size_prices_snapshot(self.data_folder)
+        self.assertEqual(strategy.all_size_prices["B-1"]["9.5"]["du"]["prices"], [])
+        results = strategy.run(OPTIONS)
+        self.assert_same_results(results, expected)
+        # du history read in full for the stats of matched items
+        self.assertEqual(len(results[0]["data"]["du"]["transactions"]), 4)
+
+    def test_sharded(self):
+        strategy = self.make_strategy()
+        strategy.load_all_size_prices(self.data_folder)
+        expected = strategy.run_vectorized(OPTIONS)
+        self.assertEqual(len(expected), 3)
+        results = self.make_strategy().run_sharded(
+            OPTIONS, self.data_folder, "json", processes=2
+        )
+        self.assert_same_results(results, expected)
+
+    def test_top_k(self):
+        # T1 ties S1, and comes first in the static info
+        shutil.copytree(
+            os.path.join(self.data_folder, "S1"), os.path.join(self.data_folder, "T1")
+        )
+        self.style_ids.insert(0, "T1")
+        expected = [i["identifier"] for i in self.run_full()]
+        self.assertEqual(expected[:3], [("S0", "9.5"), ("T1", "9.5"), ("S1", "9.5")])
+
+        for run in ["run", "run_vectorized"]:
+            strategy = self.make_strategy()
+            strategy.load_all_size_prices(self.data_folder)
+            results = getattr(strategy, run)(OPTIONS, top_k=2)
+            first = next(results)
+            self.assertIn("du_analyzer", first["data"]["annotation"])
+            # the others are annotated as they are consumed
+            self.assertNotIn(
+                "du_analyzer",
+                strategy.all_size_prices["T1"]["9.5"].get("annotation", {}),
+            )
+            rest = list(results)
+            self.assertEqual([i["identifier"] for i in [first] + rest], expected[:2])
+            for k in expected[2:]:
+                self.assertNotIn(
+                    "du_analyzer",
+                    strategy.all_size_prices[k[0]][k[1]].get("annotation", {}),
+                )
+
+    def test_incremental(self):
+        state_file = os.path.join(self.folder.name, "state.json")
+        last_updated = {
+            style_id: {"du": "2019-12-20T10:00:00Z", "stockx": "2019-12-20T11:00:00Z"}
+            for style_id in self.style_ids
+        }
+
+        def run_incremental(options):
+            loaded = []
+            strategy = self.make_strategy()
+
+            def load(style_ids):
+                loaded.append(style_ids)
+                strategy.load_all_size_prices(self.data_folder, style_ids=style_ids)
+
+            results = list(
+                strategy.run_incremental(
+                    options, StrategyState(state_file), last_updated, load
+                )
+            )
+            return results, loaded
+
+        def run_vectorized(options):
+            strategy = self.make_strategy()
+            strategy.load_all_size_prices(self.data_folder)
+            return list(strategy.run_vectorized(options))
+
+        results, loaded = run_incremental(OPTIONS)
+        self.assertEqual(loaded, [self.style_ids])
+        self.assert_same_results(results, run_vectorized(OPTIONS))
+
+        # S3 gets cheap on stockx
+        store = TimeSeriesSerializer(self.data_folder, "json").store
+        data = store.get("S3", "9.5")["9.5"]
+        data["stockx"]["prices"][0].update({"bid_price": 85, "ask_price": 95})
+        store.write("S3", "9.5", data)
+        last_updated["S3"]["stockx"] = "2019-12-21T11:00:00Z"
+        results, loaded = run_incremental(OPTIONS)
+        self.assertEqual(loaded, [["S3"]])
+        expected = run_vectorized(OPTIONS)
+        self.assertEqual(expected[0]["identifier"], ("S3", "9.5"))
+        self.assert_same_results(results, expected)
+
+        # other options discard the state
+        options = dict(OPTIONS, cutoff_net_profit_ratio_mid_to_last=0.3)
+        results, loaded = run_incremental(options)
+        self.assertEqual(loaded, [self.style_ids])
+        self.assert_same_results(results, run_vectorized(options))
+
+    def test_sweep_rolling_cutoffs(self):
+        option_sets = [
+            dict(OPTIONS, cutoff_min_rolling_sales=rolling_sales)
+            for rolling_sales in [0, 4, 5]
+        ]
+        strategy = self.make_strategy()
+        strategy.load_all_size_prices(self.data_folder)
+        results = strategy.run_sweep(option_sets)
+        for options, result in zip(option_sets, results):
+            strategy = self.make_strategy()
+            strategy.load_all_size_prices(self.data_folder)
+            expected = list(strategy.run_vectorized(options))
+            self.assertEqual(result["count"], len(expected))
+            self.assertEqual(
+                [k for k, _ in result["top"]], [i["identifier"] for i in expected]
+            )
+        self.assertEqual([r["count"] for r in results], [3, 3, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()